@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+History of a battle with undo, redo and replay.
+
+Every change of a combatant state is recorded as a compact event::
+
+    (SET, state_id, attribute, old_value, new_value)
+    (ROUND, seed, initiative_rolls, pending, old_pending, before, after)
+    (EFFECTS, before, after)
+    (MOVE, state_id, old_location, new_location)
+
+where ``state_id`` is the position of the state in :attr:`CombatLog.states`
+and the locations are the ones of :mod:`pool`, None for a state that is not
+part of it. Moves are recorded when a state joins or leaves the battle.
+The events are grouped into steps, one per action of the GM, so that undoing
+a step costs only as much as the action itself. Snapshots of all states are
+taken every few rounds, jumping to a round restores the nearest snapshot and
+redoes the remaining steps.
+
+The initiative of every round is rolled from a stored seed, so a fight can
+be reproduced exactly. The schedule of the timed effects is saved before
+and after every change, see :meth:`effects.EffectScheduler.snapshot`.
+"""
+import random
+
+import numpy as np
+
+from metrics import metrics
+from pool import ACTIVE
+from state import CombatantState
+
+SET = 0
+ROUND = 1
+EFFECTS = 2
+MOVE = 3
+
+# attributes that make up a snapshot of a state
+ATTRIBUTES = tuple(attribute for attribute in CombatantState.__slots__
+                   if attribute not in ("name", "observers"))
+
+
+def attributes(state):
+    """
+    Attributes of a snapshot of the given state including the ones of its
+    subclass.
+    """
+    return ATTRIBUTES + state.extra_attributes
+
+
+class CombatLog(object):
+    """
+    Append-only log of the changes of all participants of a battle.
+
+    :param participants: :class:`initiative.participants_list`
+    :param int snapshot_interval: number of rounds between snapshots
+    :param effects: :class:`effects.EffectScheduler` of the battle, it is
+        advanced by :meth:`next_round`
+    :param pool: :class:`pool.Pool` whose states join and leave the battle,
+        without it :meth:`join` and :meth:`leave` have to be called
+
+    Changes done through the methods of the states are recorded as they
+    happen. They form one step until :meth:`checkpoint` is called, e.g.
+    once per event loop iteration in the GUI. New rounds have to be started
+    with :meth:`next_round`.
+    """
+    def __init__(self, participants, snapshot_interval=5, effects=None,
+                 pool=None):
+        self.participants = participants
+        self.snapshot_interval = snapshot_interval
+        self.effects = effects
+        self.pool = pool
+
+        self.states = []
+        self.ids = {}
+
+        self.events = []
+        # end of the events of every step
+        self.steps = []
+        # number of steps applied
+        self.cursor = 0
+        self.round_steps = {participants.round: 0}
+        self.snapshots = {}
+
+        self._replaying = False
+
+        for state in participants:
+            self.watch(state)
+        self.snapshots[0] = self._snapshot()
+
+        if effects is not None:
+            self._schedule = effects.snapshot()
+            effects.add_observer(self.on_effects_changed)
+        if pool is not None:
+            pool.add_observer(self.on_moved)
+
+    def __len__(self):
+        return len(self.events)
+
+    def watch(self, state):
+        """
+        Record the changes of a state that joined the battle.
+        """
+        if state in self.ids:
+            return
+
+        self.ids[state] = len(self.states)
+        self.states.append(state)
+        state.add_observer(self.on_changed)
+
+    def on_changed(self, state, attribute, old_value, new_value):
+        if self._replaying:
+            return
+
+        self._truncate()
+        self.events.append((SET, self.ids[state], attribute, old_value,
+                            new_value))
+
+    def on_moved(self, state, old_location, new_location):
+        """
+        Record a state joining or leaving the battle.
+        """
+        if self._replaying or ACTIVE not in (old_location, new_location):
+            return
+
+        self.watch(state)
+        self._truncate()
+        self.events.append((MOVE, self.ids[state], old_location,
+                            new_location))
+
+    def join(self, state):
+        """
+        Let a state join the battle without a pool and record it.
+        """
+        self.participants.add(state)
+        self.on_moved(state, None, ACTIVE)
+
+    def leave(self, state):
+        """
+        Let a state leave the battle without a pool and record it.
+        """
+        self.participants.remove(state)
+        self.on_moved(state, ACTIVE, None)
+
+    def _location(self, state):
+        if self.pool is not None:
+            return self.pool.location.get(state)
+
+        return ACTIVE if state in self.participants.roster else None
+
+    def _relocate(self, state, location):
+        if self._location(state) == location:
+            return
+
+        if self.pool is None:
+            if location == ACTIVE:
+                self.participants.add(state)
+            else:
+                self.participants.remove(state)
+        elif location is None:
+            self.pool.discard(state)
+        elif state in self.pool:
+            self.pool.move(state, location)
+        else:
+            self.pool.add(state, location)
+
+    def on_effects_changed(self, effects):
+        if self._replaying:
+            return
+
+        self._truncate()
+        schedule = effects.snapshot()
+        self.events.append((EFFECTS, self._schedule, schedule))
+        self._schedule = schedule
+
+    def _restore_schedule(self, schedule):
+        if schedule is not None:
+            self.effects.restore(schedule)
+            self._schedule = schedule
+
+    def _start(self, step):
+        return self.steps[step - 1] if step else 0
+
+    def _truncate(self):
+        # a new event discards the steps that have been undone
+        if self.cursor == len(self.steps):
+            return
+
+        del self.events[self._start(self.cursor):]
+        del self.steps[self.cursor:]
+        for cursor in [cursor for cursor in self.snapshots
+                       if cursor > self.cursor]:
+            del self.snapshots[cursor]
+        for round, cursor in list(self.round_steps.items()):
+            if cursor > self.cursor:
+                del self.round_steps[round]
+
+    def checkpoint(self):
+        """
+        Close the current step.
+        """
+        if len(self.events) > self._start(len(self.steps)):
+            self.steps.append(len(self.events))
+            self.cursor = len(self.steps)
+
+    def _round_values(self):
+        return tuple((state.order, state.temporary_defense_modifier)
+                     for state in self.states)
+
+    def _pending(self):
+        return tuple(sorted(self.ids[state]
+                            for state in self.participants.pending))
+
+    def next_round(self, initiative_rolls=None, pending=(), seed=None,
+                   reshuffle=None):
+        """
+        Start a new round and record it.
+
+        :param dict initiative_rolls: see
+            :meth:`initiative.participants_list.reshuffle`
+        :param pending: see :meth:`initiative.participants_list.reshuffle`
+        :param int seed: seed of the initiative rolls, random if not given
+        :param reshuffle: function called instead of
+            :meth:`initiative.participants_list.reshuffle` with the same
+            arguments, e.g. :meth:`widgets.BattleModel.advance_round`
+
+        The effects are advanced to the new round within the same step.
+        Returns the seed.
+        """
+        self.checkpoint()
+        self._truncate()
+
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        if reshuffle is None:
+            reshuffle = self.participants.reshuffle
+        initiative_rolls = initiative_rolls or {}
+
+        for state in self.participants:
+            self.watch(state)
+        before = self._round_values()
+        old_pending = self._pending()
+
+        self._replaying = True
+        try:
+            reshuffle(initiative_rolls, pending, np.random.RandomState(seed))
+        finally:
+            self._replaying = False
+
+        self.events.append(
+            (ROUND, seed,
+             tuple(sorted((self.ids[state], roll)
+                          for state, roll in initiative_rolls.items())),
+             self._pending(), old_pending, before, self._round_values()))
+        if self.effects is not None:
+            with metrics().timer("round.effects"):
+                self.effects.advance(self.participants.round)
+        self.checkpoint()
+
+        round = self.participants.round
+        self.round_steps[round] = self.cursor
+        if round % self.snapshot_interval == 0:
+            self.snapshots[self.cursor] = self._snapshot()
+
+        return seed
+
+    @property
+    def seeds(self):
+        """
+        Seeds of the initiative rolls of all recorded rounds.
+        """
+        return [event[1] for event in self.events if event[0] == ROUND]
+
+    def _set_round(self, values, pending, offset):
+        for state, (order, temporary) in zip(self.states, values):
+            state._set("order", order)
+            state._set("temporary_defense_modifier", temporary)
+
+        self.participants.pending = set(self.states[state_id]
+                                        for state_id in pending)
+        self.participants.round += offset
+        self.participants.index.rebuild()
+
+    def _replay(self, step, undo):
+        events = self.events[self._start(step):self.steps[step]]
+        if undo:
+            events = reversed(events)
+
+        moved = set()
+        self._replaying = True
+        try:
+            for event in events:
+                if event[0] == SET:
+                    kind, state_id, attribute, old_value, new_value = event
+                    state = self.states[state_id]
+                    state._set(attribute, old_value if undo else new_value)
+                    if attribute == "order":
+                        moved.add(state)
+                elif event[0] == EFFECTS:
+                    self._restore_schedule(event[1] if undo else event[2])
+                elif event[0] == MOVE:
+                    self._relocate(self.states[event[1]],
+                                   event[2] if undo else event[3])
+                elif undo:
+                    self._set_round(event[5], event[4], -1)
+                else:
+                    self._set_round(event[6], event[3], 1)
+        finally:
+            self._replaying = False
+
+        for state in moved:
+            if state in self.participants.roster:
+                self.participants.update(state)
+
+    def undo(self):
+        """
+        Revert the last step, returns False if there is none.
+        """
+        self.checkpoint()
+        if self.cursor == 0:
+            return False
+
+        self._replay(self.cursor - 1, True)
+        self.cursor -= 1
+
+        return True
+
+    def redo(self):
+        """
+        Apply the last step undone, returns False if there is none.
+        """
+        if self.cursor == len(self.steps):
+            return False
+
+        self._replay(self.cursor, False)
+        self.cursor += 1
+
+        return True
+
+    def _snapshot(self):
+        return (self.participants.round, self._pending(),
+                tuple(self._location(state) for state in self.states),
+                tuple(tuple(getattr(state, attribute)
+                            for attribute in attributes(state))
+                      for state in self.states),
+                self.effects.snapshot() if self.effects is not None else None)
+
+    def _restore(self, snapshot):
+        round, pending, locations, values, schedule = snapshot
+
+        self._replaying = True
+        try:
+            for state, state_values in zip(self.states, values):
+                for attribute, value in zip(attributes(state),
+                                            state_values):
+                    state._set(attribute, value)
+            # states that joined after the snapshot leave again
+            locations += (None,) * (len(self.states) - len(locations))
+            for state, location in zip(self.states, locations):
+                self._relocate(state, location)
+            self._restore_schedule(schedule)
+        finally:
+            self._replaying = False
+
+        self.participants.pending = set(self.states[state_id]
+                                        for state_id in pending)
+        self.participants.round = round
+        self.participants.index.rebuild()
+
+    def jump_to_round(self, round):
+        """
+        Restore the battle as it was at the beginning of a recorded round.
+        """
+        self.checkpoint()
+        try:
+            target = self.round_steps[round]
+        except KeyError:
+            raise ValueError("Round %i has not been recorded" % round)
+
+        snapshot = max(cursor for cursor in self.snapshots
+                       if cursor <= target)
+        if target - snapshot < abs(target - self.cursor):
+            self._restore(self.snapshots[snapshot])
+            self.cursor = snapshot
+
+        while self.cursor < target:
+            self.redo()
+        while self.cursor > target:
+            self.undo()
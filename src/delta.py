@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Delta updates of the battle for the players' display.
+
+The GM's side keeps a :class:`DeltaEncoder` per display, which remembers
+what the display has been sent and produces only the differences::
+
+    ["add", id, name, level, player_controlled]
+    ["remove", id]
+    ["hp", id, level]
+    ["move", source, destination]
+    ["order", [id, ...]]
+    ["active", id]
+
+Hit points are sent as a level from 0 to :data:`HP_STEPS`, players do not
+see the exact values of the NPCs. Added combatants are appended, so the
+order is only correct after the moves of the same batch. A batch of
+messages is sent as one line of JSON, the display applies it to a
+:class:`DisplayMirror`.
+"""
+import json
+
+from initiative import minimal_moves
+
+HP_STEPS = 10
+
+
+def hp_level(state):
+    if state.base_hps <= 0:
+        return 0
+
+    return max(0, min(HP_STEPS, int(round(HP_STEPS * state.hps /
+                                          float(state.base_hps)))))
+
+
+def encode(messages):
+    return json.dumps(messages, separators=(",", ":")) + "\n"
+
+
+def decode(line):
+    return json.loads(line)
+
+
+class DeltaEncoder(object):
+    """
+    Differences between the battle and what a display has been sent.
+
+    Changed states are collected with :meth:`mark`, :meth:`collect`
+    produces the messages for all of them at once. Calling it less often,
+    e.g. while the display is busy, coalesces the changes.
+    """
+    def __init__(self):
+        self.ids = {}
+        self.levels = {}
+        self.order = []
+        self.active = None
+
+        self.dirty = set()
+        self.order_dirty = True
+
+    def mark(self, states):
+        self.dirty.update(states)
+
+    def mark_order(self):
+        self.order_dirty = True
+
+    def _id(self, state):
+        try:
+            return self.ids[state]
+        except KeyError:
+            self.ids[state] = len(self.ids)
+
+            return self.ids[state]
+
+    def collect(self, participants, active=None):
+        """
+        Return the messages bringing the display up to date.
+
+        :param participants: states in initiative order
+        :param active: state whose turn it is
+        """
+        messages = []
+
+        if self.order_dirty:
+            current = [self._id(state) for state in participants]
+            present = set(current)
+
+            order = []
+            for state_id in self.order:
+                if state_id in present:
+                    order.append(state_id)
+                else:
+                    messages.append(["remove", state_id])
+                    del self.levels[state_id]
+
+            known = set(order)
+            for state, state_id in zip(participants, current):
+                if state_id not in known:
+                    level = hp_level(state)
+                    messages.append(["add", state_id, state.name, level,
+                                     state.player_controlled])
+                    self.levels[state_id] = level
+                    order.append(state_id)
+
+            moves = minimal_moves(order, current)
+            if len(moves) > len(current) // 2:
+                messages.append(["order", current])
+            else:
+                messages.extend(["move", source, destination]
+                                for source, destination in moves)
+
+            self.order = current
+            self.order_dirty = False
+
+        for state in self.dirty:
+            state_id = self.ids.get(state)
+            if state_id not in self.levels:
+                continue
+
+            level = hp_level(state)
+            if level != self.levels[state_id]:
+                messages.append(["hp", state_id, level])
+                self.levels[state_id] = level
+        self.dirty.clear()
+
+        active_id = self.ids.get(active)
+        if active_id != self.active:
+            messages.append(["active", active_id])
+            self.active = active_id
+
+        return messages
+
+
+class DisplayMirror(object):
+    """
+    What the players' display shows, built from the messages.
+    """
+    def __init__(self):
+        self.names = {}
+        self.levels = {}
+        self.player_controlled = {}
+        self.order = []
+        self.active = None
+
+    def add(self, state_id, name, level, player_controlled):
+        self.names[state_id] = name
+        self.levels[state_id] = level
+        self.player_controlled[state_id] = player_controlled
+        self.order.append(state_id)
+
+    def remove(self, state_id):
+        """
+        Remove a combatant and return the row it had.
+        """
+        row = self.order.index(state_id)
+        del self.order[row]
+        del self.names[state_id]
+        del self.levels[state_id]
+        del self.player_controlled[state_id]
+        if self.active == state_id:
+            self.active = None
+
+        return row
+
+    def move(self, source, destination):
+        self.order.insert(destination, self.order.pop(source))
+
+    def set_order(self, order):
+        self.order = list(order)
+
+    def set_level(self, state_id, level):
+        self.levels[state_id] = level
+
+    def set_active(self, state_id):
+        self.active = state_id
+
+    def apply(self, messages):
+        for message in messages:
+            kind = message[0]
+            if kind == "add":
+                self.add(*message[1:])
+            elif kind == "remove":
+                self.remove(message[1])
+            elif kind == "hp":
+                self.set_level(message[1], message[2])
+            elif kind == "move":
+                self.move(message[1], message[2])
+            elif kind == "order":
+                self.set_order(message[1])
+            elif kind == "active":
+                self.set_active(message[1])
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Resolution of goal rolls, attacks and damage.
+
+The following rules are used:
+
+    * a goal roll succeeds if a d20 is at most the goal number, i.e. trait +
+      skill + modifiers, a 20 always fails
+    * a successful roll yields one victory point (VP) per three points
+      rolled, a roll equal to the goal number is critical and doubles them
+    * every damage effect die showing at least :data:`DAMAGE_DIE_SUCCESS`
+      inflicts a wound, and all VP are converted into further wounds
+    * an energy shield triggers at its minimum and absorbs up to its
+      maximum, unless the attacker pulls VP to slip under the minimum,
+      which is not possible in an aggressive stance
+    * armour absorbs its rating from the remaining wounds
+
+Dice are drawn from pre-generated buffers and exact outcome distributions
+are memoized, so readouts and large simulations stay fast.
+"""
+import collections
+import functools
+
+import numpy as np
+
+DAMAGE_DIE_SUCCESS = 4
+DAMAGE_DIE_CHANCE = (7 - DAMAGE_DIE_SUCCESS) / 6.
+CRITICAL_FAILURE = 20
+
+
+def lru_cache(maxsize=1024):
+    """
+    Memoize a function of hashable arguments, keeping the last recently
+    used results.
+    """
+    def decorator(function):
+        cache = collections.OrderedDict()
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            try:
+                result = cache.pop(args)
+            except KeyError:
+                result = function(*args)
+                if len(cache) >= maxsize:
+                    cache.popitem(last=False)
+            cache[args] = result
+
+            return result
+
+        wrapper.cache_clear = cache.clear
+
+        return wrapper
+
+    return decorator
+
+
+class DiceBuffer(object):
+    """
+    Dice with the given number of sides, rolled in large batches.
+
+    :param int sides: number of sides
+    :param int size: number of results generated at once
+    :param random_state: numpy.random.RandomState, a new one if not given
+    """
+    def __init__(self, sides, size=65536, random_state=None):
+        self.sides = sides
+        self.size = size
+        if random_state is None:
+            random_state = np.random.RandomState()
+        self.random_state = random_state
+
+        self._results = []
+
+    def _refill(self):
+        self._results = self.random_state.randint(
+            1, self.sides + 1, size=self.size).tolist()
+
+    def roll(self):
+        if not self._results:
+            self._refill()
+
+        return self._results.pop()
+
+    def rolls(self, count):
+        """
+        Return an array of results without per-roll overhead.
+        """
+        return self.random_state.randint(1, self.sides + 1, size=count)
+
+
+def victory_points(roll, goal):
+    """
+    VP of a single goal roll, None if it failed.
+    """
+    if roll >= CRITICAL_FAILURE or roll > goal:
+        return None
+
+    points = roll // 3
+    if roll == goal:
+        points *= 2
+
+    return points
+
+
+@lru_cache()
+def outcome_distribution(goal, modifier=0):
+    """
+    Exact distribution of a goal roll.
+
+    Returns a tuple of ``(victory_points, probability)`` pairs, where
+    failure is given as None.
+    """
+    outcomes = collections.OrderedDict()
+    for roll in range(1, 21):
+        points = victory_points(roll, goal + modifier)
+        outcomes[points] = outcomes.get(points, 0) + 1 / 20.
+
+    return tuple(outcomes.items())
+
+
+@lru_cache()
+def chance_to_hit(goal, modifier=0):
+    """
+    Probability that a goal roll succeeds.
+    """
+    return sum(probability
+               for points, probability in outcome_distribution(goal, modifier)
+               if points is not None)
+
+
+def absorb(wounds, victory_points, armour=0, shield=None, pull_vp=True):
+    """
+    Wounds left after shields and armour.
+
+    :param int wounds: wounds inflicted, including the VP
+    :param int victory_points: VP included in the wounds
+    :param int armour: armour rating
+    :param tuple shield: minimum and maximum of an energy shield
+    :param bool pull_vp: whether VP may be pulled to slip under the shield
+    """
+    if shield is not None and wounds >= shield[0]:
+        if pull_vp and wounds - victory_points < shield[0]:
+            wounds = shield[0] - 1
+        else:
+            wounds = max(0, wounds - shield[1])
+
+    return max(0, wounds - armour)
+
+
+@lru_cache()
+def wound_distribution(goal, modifier=0, damage_dice=0, armour=0,
+                       shield=None, pull_vp=True):
+    """
+    Exact distribution of the wounds of an attack.
+
+    Returns a tuple of ``(wounds, probability)`` pairs, a failed attack
+    counts as zero wounds.
+    """
+    dice = _binomial(damage_dice, DAMAGE_DIE_CHANCE)
+
+    wounds = collections.defaultdict(float)
+    for points, probability in outcome_distribution(goal, modifier):
+        if points is None:
+            wounds[0] += probability
+            continue
+
+        for count, dice_probability in enumerate(dice):
+            inflicted = absorb(count + points, points, armour, shield,
+                               pull_vp)
+            wounds[inflicted] += probability * dice_probability
+
+    return tuple(sorted(wounds.items()))
+
+
+def _binomial(count, success):
+    """
+    Probabilities of 0 to count successes of independent dice.
+    """
+    probabilities = [1.]
+    for idx in range(count):
+        following = [0.] * (len(probabilities) + 1)
+        for hits, probability in enumerate(probabilities):
+            following[hits] += probability * (1 - success)
+            following[hits + 1] += probability * success
+        probabilities = following
+
+    return probabilities
+
+
+def expected_wounds(goal, modifier=0, damage_dice=0, armour=0, shield=None,
+                    pull_vp=True):
+    return sum(wounds * probability
+               for wounds, probability in wound_distribution(
+                   goal, modifier, damage_dice, armour, shield, pull_vp))
+
+
+class Resolver(object):
+    """
+    Rolls goal rolls and attacks with buffered dice.
+
+    :param random_state: numpy.random.RandomState for reproducible results
+    """
+    def __init__(self, random_state=None):
+        if random_state is None:
+            random_state = np.random.RandomState()
+        self.random_state = random_state
+
+        self.d20 = DiceBuffer(20, random_state=random_state)
+        self.d6 = DiceBuffer(6, random_state=random_state)
+
+    def goal_roll(self, goal, modifier=0):
+        """
+        Roll against a goal number and return the VP, None on failure.
+        """
+        return victory_points(self.d20.roll(), goal + modifier)
+
+    def attack(self, goal, modifier=0, damage_dice=0, armour=0, shield=None,
+               pull_vp=True):
+        """
+        Resolve a single attack and return the wounds inflicted.
+        """
+        points = self.goal_roll(goal, modifier)
+        if points is None:
+            return 0
+
+        wounds = points
+        for idx in range(damage_dice):
+            if self.d6.roll() >= DAMAGE_DIE_SUCCESS:
+                wounds += 1
+
+        return absorb(wounds, points, armour, shield, pull_vp)
+
+    def attacks(self, goals, damage_dice, armour):
+        """
+        Resolve many attacks at once.
+
+        :param goals: array of goal numbers including all modifiers
+        :param damage_dice: array of damage effect dice
+        :param armour: array of armour ratings
+
+        Shields are not handled here, use :meth:`attack` for them. Returns
+        the array of wounds.
+        """
+        goals = np.asarray(goals)
+        rolls = self.d20.rolls(len(goals))
+
+        hit = (rolls <= goals) & (rolls < CRITICAL_FAILURE)
+        points = rolls // 3
+        points = np.where(rolls == goals, 2 * points, points)
+
+        dice_wounds = self.random_state.binomial(damage_dice,
+                                                 DAMAGE_DIE_CHANCE,
+                                                 size=len(goals))
+
+        wounds = np.where(hit, points + dice_wounds, 0)
+
+        return np.maximum(wounds - armour, 0)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Effects that last for a number of rounds, e.g. psi or theurgy buffs, stuns
+or bleeding.
+
+Points in time are given by the round and the initiative within the round,
+higher initiative coming first. An effect created at initiative 12 in round
+3 and lasting two rounds expires at initiative 12 in round 5.
+"""
+import heapq
+import itertools
+
+# effects trigger before they expire at the same point in time
+TRIGGER = 0
+EXPIRE = 1
+
+
+class Effect(object):
+    """
+    A single timed effect on a combatant.
+
+    :param target: :class:`state.CombatantState` affected
+    :param str name: description, e.g. "Stun" or "Bleeding"
+    :param int defense: defense modifier while the effect is active
+    :param int goal: goal number modifier while the effect is active
+    :param int damage: hit points lost every round while active
+    """
+    __slots__ = ("target", "name", "defense", "goal", "damage",
+                 "start", "end", "active", "generation")
+
+    def __init__(self, target, name, defense=0, goal=0, damage=0):
+        self.target = target
+        self.name = name
+        self.defense = defense
+        self.goal = goal
+        self.damage = damage
+
+        self.start = None
+        self.end = None
+        self.active = False
+        # queued events of an earlier activation carry an older generation
+        self.generation = 0
+
+    def __repr__(self):
+        return "%s on %s until round %i" % (self.name, self.target.name,
+                                             self.end[0])
+
+
+class EffectScheduler(object):
+    """
+    Priority queue of the points in time at which effects expire or deal
+    their damage.
+
+    Adding, removing, expiring and triggering an effect costs O(log n), no
+    list of effects is scanned when a round advances. The modifiers of all
+    active effects of a combatant are aggregated in its state, see
+    :meth:`state.CombatantState.add_effect_modifiers`.
+
+    Observers are called as ``observer(scheduler)`` after every change, the
+    whole schedule can be saved with :meth:`snapshot` and brought back with
+    :meth:`restore`, e.g. to undo a round.
+    """
+    def __init__(self):
+        self.now = (0, float("-inf"))
+        self.effects = set()
+        self.observers = []
+        self._events = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._events)
+
+    @staticmethod
+    def _time(round, initiative=None):
+        # within a round higher initiative comes first, without an
+        # initiative the beginning of the round is meant
+        if initiative is None:
+            return (round, float("-inf"))
+
+        return (round, -initiative)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def _notify(self):
+        for observer in list(self.observers):
+            observer(self)
+
+    def _push(self, time, kind, effect):
+        heapq.heappush(self._events,
+                       (time, kind, next(self._counter), effect.generation,
+                        effect))
+
+    def add(self, effect, rounds, initiative=None):
+        """
+        Activate an effect for a number of rounds starting now.
+
+        :param effect: the :class:`Effect`
+        :param int rounds: duration of the effect
+        :param int initiative: initiative at which the effect starts, the
+            effect expires and triggers at the same initiative
+        """
+        if initiative is None and self.now[1] != float("-inf"):
+            initiative = -self.now[1]
+
+        if effect.active:
+            self.remove(effect)
+
+        effect.start = self.now
+        effect.end = self._time(self.now[0] + rounds, initiative)
+        effect.active = True
+        effect.generation += 1
+        effect.target.add_effect_modifiers(effect.defense, effect.goal)
+        self.effects.add(effect)
+
+        self._push(effect.end, EXPIRE, effect)
+        if effect.damage:
+            self._push(self._time(self.now[0] + 1, initiative),
+                       TRIGGER, effect)
+        self._notify()
+
+        return effect
+
+    def resume(self, effect):
+        """
+        Queue an effect whose modifiers are already part of its target's
+        state, e.g. after the state was recovered from a journal.
+
+        The ``start`` and ``end`` of the effect have to be set.
+        """
+        effect.active = True
+        effect.generation += 1
+        self.effects.add(effect)
+
+        self._push(effect.end, EXPIRE, effect)
+        if effect.damage:
+            # the next round at the initiative of the effect
+            round = self.now[0]
+            if (round, effect.end[1]) <= self.now:
+                round += 1
+            following = (max(round, effect.start[0] + 1), effect.end[1])
+            if following <= effect.end:
+                self._push(following, TRIGGER, effect)
+        self._notify()
+
+    def remove(self, effect):
+        """
+        End an effect early. Its queued events are dropped when reached.
+        """
+        if effect.active:
+            self._deactivate(effect)
+            self._notify()
+
+    def _deactivate(self, effect):
+        effect.active = False
+        effect.generation += 1
+        effect.target.add_effect_modifiers(-effect.defense, -effect.goal)
+        self.effects.discard(effect)
+
+    def advance(self, round, initiative=None):
+        """
+        Process all events up to the given point in time.
+
+        :param int round: current round
+        :param int initiative: current initiative within the round, the
+            beginning of the round if not given
+
+        Returns the list of effects that expired.
+        """
+        self.now = self._time(round, initiative)
+
+        expired = []
+        while self._events and self._events[0][0] <= self.now:
+            time, kind, sequence, generation, effect = heapq.heappop(
+                self._events)
+            if generation != effect.generation:
+                continue
+
+            if kind == EXPIRE:
+                self._deactivate(effect)
+                expired.append(effect)
+            else:
+                effect.target.reduce_hitpoints(effect.damage)
+                following = (time[0] + 1, time[1])
+                if following <= effect.end:
+                    self._push(following, TRIGGER, effect)
+        self._notify()
+
+        return expired
+
+    def snapshot(self):
+        """
+        The point in time, the queue and the active effects.
+        """
+        return (self.now, tuple(self._events),
+                tuple((effect, effect.generation, effect.start, effect.end)
+                      for effect in self.effects))
+
+    def restore(self, snapshot):
+        """
+        Return to a :meth:`snapshot`.
+
+        The modifiers of the targets are left alone, they are restored
+        together with the rest of their states.
+        """
+        now, events, effects = snapshot
+
+        active = set(effect for effect, generation, start, end in effects)
+        for effect in self.effects - active:
+            effect.active = False
+            effect.generation += 1
+
+        self.now = now
+        self._events = list(events)
+        self.effects = active
+        for effect, generation, start, end in effects:
+            effect.active = True
+            effect.generation = generation
+            effect.start = start
+            effect.end = end
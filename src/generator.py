@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Random generation of NPCs from archetypes.
+
+An archetype is given as a dict (or in a JSON file as a list of them)::
+
+    {"name": "Guard", "faction": "Guards",
+     "dexterity": [5, 1], "wits": [4, 1],
+     "hps": [5, 5, 1], "defense": [1, 2]}
+
+Traits are normally distributed with the given mean and standard
+deviation, rounded and limited to :data:`TRAIT_RANGE`. The hit points are a
+base value plus an endurance drawn like a trait, given as ``[base, mean,
+deviation]``. The defense is uniformly distributed between both limits.
+
+All NPCs of a batch are sampled at once with NumPy. The same seed always
+yields the same NPCs.
+"""
+import json
+
+import numpy as np
+
+from state import NPCState
+
+TRAIT_RANGE = (1, 10)
+
+DEFAULT_ARCHETYPES = [
+    {"name": "Mook", "dexterity": [4, 1], "wits": [3, 1],
+     "hps": [5, 3, 1], "defense": [0, 1]},
+    {"name": "Guard", "faction": "Guards", "dexterity": [5, 1],
+     "wits": [4, 1], "hps": [5, 5, 1], "defense": [1, 2]},
+    {"name": "Veteran", "dexterity": [7, 1], "wits": [6, 1],
+     "hps": [5, 6, 1], "defense": [2, 3]},
+    {"name": "Beast", "faction": "Beasts", "dexterity": [6, 2],
+     "wits": [2, 1], "hps": [8, 6, 2], "defense": [1, 2]},
+]
+
+# names are put together from these syllables
+FIRST_SYLLABLES = np.array(["Al", "Bo", "Ca", "Do", "El", "Fa", "Gu", "Ha",
+                            "Is", "Jo", "Ka", "Lu", "Ma", "Ne", "Or", "Pa",
+                            "Ro", "Sa", "Ti", "Ul", "Va", "Ya", "Ze"])
+MIDDLE_SYLLABLES = np.array(["", "", "la", "ri", "do", "ne", "ka", "mi",
+                             "so", "ru", "be"])
+LAST_SYLLABLES = np.array(["n", "r", "s", "k", "x", "l", "th", "nd", "rik",
+                           "mon", "las", "tor", "us", "a", "o"])
+
+
+class Archetype(object):
+    """
+    Template of NPCs.
+
+    :param dict template: archetype in the format described in the module
+    """
+    def __init__(self, template):
+        self.name = template["name"]
+        self.faction = template.get("faction", "")
+        self.dexterity = tuple(template["dexterity"])
+        self.wits = tuple(template["wits"])
+        self.hps = tuple(template["hps"])
+        self.defense = tuple(template.get("defense", (0, 0)))
+
+        if self.defense[0] > self.defense[1]:
+            raise ValueError("Invalid defense range of %s" % self.name)
+
+    @staticmethod
+    def _trait(random_state, mean, deviation, count):
+        values = np.rint(random_state.normal(mean, deviation, count))
+
+        return np.clip(values, *TRAIT_RANGE).astype(int)
+
+    def sample(self, count, random_state):
+        """
+        Draw the traits of many NPCs at once.
+
+        Returns a dict of arrays with the keys ``name``, ``dexterity``,
+        ``wits``, ``hps`` and ``defense``.
+        """
+        names = np.char.add(
+            np.char.add(
+                FIRST_SYLLABLES[random_state.randint(
+                    len(FIRST_SYLLABLES), size=count)],
+                MIDDLE_SYLLABLES[random_state.randint(
+                    len(MIDDLE_SYLLABLES), size=count)]),
+            LAST_SYLLABLES[random_state.randint(
+                len(LAST_SYLLABLES), size=count)])
+
+        base, mean, deviation = self.hps
+
+        return {
+            "name": names,
+            "dexterity": self._trait(random_state, self.dexterity[0],
+                                     self.dexterity[1], count),
+            "wits": self._trait(random_state, self.wits[0], self.wits[1],
+                                count),
+            "hps": base + self._trait(random_state, mean, deviation, count),
+            "defense": random_state.randint(self.defense[0],
+                                            self.defense[1] + 1, size=count),
+        }
+
+    def states(self, columns):
+        """
+        Create the states of sampled traits.
+        """
+        faction = self.faction
+
+        return [NPCState(name, dexterity, wits, hps, defense,
+                         faction=faction)
+                for name, dexterity, wits, hps, defense in zip(
+                    columns["name"].tolist(), columns["dexterity"].tolist(),
+                    columns["wits"].tolist(), columns["hps"].tolist(),
+                    columns["defense"].tolist())]
+
+
+def archetypes(templates=None):
+    """
+    Archetypes by name.
+
+    :param templates: list of dicts, :data:`DEFAULT_ARCHETYPES` if not given
+    """
+    if templates is None:
+        templates = DEFAULT_ARCHETYPES
+
+    return dict((template["name"], Archetype(template))
+                for template in templates)
+
+
+def load_archetypes(path):
+    """
+    Read archetypes from a JSON file containing a list of templates.
+    """
+    with open(path) as archetype_file:
+        return archetypes(json.load(archetype_file))
+
+
+def generate(archetype, count, seed=None, batch_size=10000):
+    """
+    Create NPCs of an archetype, yielding them batch by batch.
+
+    :param archetype: :class:`Archetype`
+    :param int count: number of NPCs
+    :param int seed: seed for reproducible results
+    :param int batch_size: number of NPCs sampled at once
+
+    The NPCs can be fed into a :class:`roster.Roster` or a
+    :class:`pool.Pool` as they are generated, e.g.
+    ``pool.extend(generate(archetype, 100000, seed=1))``.
+    """
+    random_state = np.random.RandomState(seed)
+
+    while count > 0:
+        size = min(count, batch_size)
+        for state in archetype.states(archetype.sample(size, random_state)):
+            yield state
+        count -= size
@@ -0,0 +1,593 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Ordering of battle participants by their initiative.
+"""
+import bisect
+import itertools
+
+import numpy as np
+
+from metrics import metrics, timed
+from roster import Roster
+
+
+class _CountingTree(object):
+    """
+    Fenwick tree summing the places taken by the slots before a slot.
+    """
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    @classmethod
+    def from_counts(cls, counts):
+        tree = cls(len(counts))
+        for slot, count in enumerate(counts):
+            tree.add(slot, count)
+
+        return tree
+
+    def add(self, slot, value):
+        slot += 1
+        while slot < len(self.tree):
+            self.tree[slot] += value
+            slot += slot & -slot
+
+    def before(self, slot):
+        total = 0
+        while slot > 0:
+            total += self.tree[slot]
+            slot -= slot & -slot
+
+        return total
+
+    def find(self, count):
+        """
+        Slot holding the occupied place after ``count`` places and the
+        number of places before that slot.
+        """
+        slot = 0
+        remaining = count
+        step = 1
+        while step * 2 < len(self.tree):
+            step *= 2
+
+        while step:
+            if (slot + step < len(self.tree) and
+                    self.tree[slot + step] <= remaining):
+                slot += step
+                remaining -= self.tree[slot]
+            step //= 2
+
+        return slot, count - remaining
+
+
+class InitiativeIndex(object):
+    """
+    Participants sorted by initiative.
+
+    :param participants: objects providing ``order`` and ``dexterity``
+    :param roster: :class:`roster.Roster` holding the same participants,
+        its columns are sorted at once by :meth:`sorted_keys`
+
+    Participants with a higher order act first. Ties are broken by the
+    higher dexterity and then by the order in which the participants were
+    added, so the result is deterministic for any integer range.
+
+    The sorted keys are kept in blocks of at most twice
+    :attr:`BLOCK_SIZE` keys, together with the largest key of every block
+    and a Fenwick tree over the block lengths. Inserting, removing and
+    locating a single participant bisects the block maxima and one block
+    and sums the lengths of the blocks before it in the tree, i.e. costs
+    O(log n + BLOCK_SIZE) instead of the O(n) of shifting a single list.
+    Splitting or dropping a block rebuilds the tree, which happens at most
+    once per BLOCK_SIZE changes.
+    """
+    BLOCK_SIZE = 256
+
+    def __init__(self, participants=(), roster=None):
+        self.roster = roster
+        self._size = 0
+        self._key_blocks = []
+        self._entry_blocks = []
+        self._maxes = []
+        self._lengths = _CountingTree(0)
+        self._key_of = {}
+        self._counter = itertools.count()
+
+        for participant in participants:
+            self.insert(participant)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._entry_blocks)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return list(self)[key]
+
+        if key < 0:
+            key += self._size
+        if not 0 <= key < self._size:
+            raise IndexError("participant index out of range")
+
+        block, offset = self._entry_block(key)
+
+        return self._entry_blocks[block][key - offset]
+
+    def __contains__(self, participant):
+        return participant in self._key_of
+
+    @property
+    def entries(self):
+        """
+        List of all participants in their order.
+        """
+        return list(self)
+
+    @staticmethod
+    def _key(participant, sequence):
+        return (-participant.order, -participant.dexterity, sequence)
+
+    def _entry_block(self, position):
+        # block holding a position and the position of its first entry, the
+        # last block for the position after the end
+        if not self._entry_blocks:
+            raise IndexError("participant index out of range")
+        if position >= self._size:
+            block = len(self._entry_blocks) - 1
+
+            return block, self._size - len(self._entry_blocks[block])
+
+        return self._lengths.find(position)
+
+    def _locate(self, key):
+        # block a key belongs to and its place in there
+        block = min(bisect.bisect_left(self._maxes, key),
+                    len(self._maxes) - 1)
+
+        return block, bisect.bisect_left(self._key_blocks[block], key)
+
+    def _offset(self, block):
+        return self._lengths.before(block)
+
+    def _update_lengths(self):
+        self._lengths = _CountingTree.from_counts(
+            [len(keys) for keys in self._key_blocks])
+
+    def _grown(self, block):
+        # split a block that became too large
+        keys = self._key_blocks[block]
+        if len(keys) <= 2 * self.BLOCK_SIZE:
+            return
+
+        entries = self._entry_blocks[block]
+        half = len(keys) // 2
+        self._key_blocks[block:block + 1] = [keys[:half], keys[half:]]
+        self._entry_blocks[block:block + 1] = [entries[:half], entries[half:]]
+        self._maxes[block:block + 1] = [keys[half - 1], keys[-1]]
+        self._update_lengths()
+
+    def _shrunk(self, block):
+        # drop a block that became empty
+        keys = self._key_blocks[block]
+        if keys:
+            self._maxes[block] = keys[-1]
+        else:
+            del self._key_blocks[block]
+            del self._entry_blocks[block]
+            del self._maxes[block]
+            self._update_lengths()
+
+    def _insert_key(self, participant, key):
+        self._key_of[participant] = key
+        self._size += 1
+        if not self._key_blocks:
+            self._key_blocks.append([key])
+            self._entry_blocks.append([participant])
+            self._maxes.append(key)
+            self._update_lengths()
+
+            return 0
+
+        block, place = self._locate(key)
+        keys = self._key_blocks[block]
+        keys.insert(place, key)
+        self._entry_blocks[block].insert(place, participant)
+        self._maxes[block] = keys[-1]
+        self._lengths.add(block, 1)
+        position = self._offset(block) + place
+        self._grown(block)
+
+        return position
+
+    def insert(self, participant):
+        """
+        Add a participant and return its position.
+        """
+        key = self._key(participant, next(self._counter))
+
+        return self._insert_key(participant, key)
+
+    def insert_position(self, participant):
+        """
+        Position a participant would get by :meth:`insert`.
+        """
+        if not self._key_blocks:
+            return 0
+
+        block, place = self._locate(
+            (-participant.order, -participant.dexterity, float("inf")))
+
+        return self._offset(block) + place
+
+    def remove(self, participant):
+        """
+        Remove a participant and return the position it had.
+        """
+        key = self._key_of.pop(participant)
+        block, place = self._locate(key)
+        position = self._offset(block) + place
+
+        del self._key_blocks[block][place]
+        del self._entry_blocks[block][place]
+        self._size -= 1
+        self._lengths.add(block, -1)
+        self._shrunk(block)
+
+        return position
+
+    def rekey(self, participant):
+        """
+        Move a participant after its order or dexterity changed.
+
+        Returns the old and the new position of the participant.
+        """
+        sequence = self._key_of[participant][2]
+        old_position = self.remove(participant)
+        new_position = self._insert_key(participant,
+                                        self._key(participant, sequence))
+
+        return old_position, new_position
+
+    def rekey_position(self, participant, order):
+        """
+        Position :meth:`rekey` would give a participant after its order
+        changed to the given one, without changing the index.
+        """
+        old_key = self._key_of[participant]
+        key = (-order, -participant.dexterity, old_key[2])
+        block, place = self._locate(key)
+        position = self._offset(block) + place
+        if key > old_key:
+            # the participant itself is counted among the ones before
+            position -= 1
+
+        return position
+
+    def sequence(self, participant):
+        """
+        Number breaking ties of participants with equal dexterity, the
+        lower one acts first.
+        """
+        return self._key_of[participant][2]
+
+    def position(self, participant):
+        block, place = self._locate(self._key_of[participant])
+
+        return self._offset(block) + place
+
+    def rebuild(self):
+        """
+        Sort all participants again, e.g. after a new round was rolled.
+        """
+        self.set_order(self.sorted_keys())
+
+    def sorted_keys(self):
+        """
+        Keys and participants in the order :meth:`rebuild` would give,
+        without changing the index.
+        """
+        if self.roster is None:
+            return sorted((self._key(participant, key[2]), participant)
+                          for participant, key in self._key_of.items())
+
+        states = self.roster.states
+        key_of = self._key_of
+        sequences = np.array([key_of[state][2] for state in states],
+                             dtype=np.int64)
+        orders = -self.roster.order.astype(np.int64)
+        dexterities = -self.roster.dexterity.astype(np.int64)
+
+        rows = np.lexsort((sequences, dexterities, orders))
+        keys = zip(orders[rows].tolist(), dexterities[rows].tolist(),
+                   sequences[rows].tolist())
+
+        return zip(keys, [states[row] for row in rows.tolist()])
+
+    def move(self, source, destination):
+        """
+        Move a single entry, e.g. to present the intermediate orderings of
+        a view while it moves its rows.
+
+        The key moves along with the entry, but the keys are only sorted
+        again by :meth:`set_order`, until then the positions of
+        participants are only valid by the intermediate orderings and
+        participants must not be inserted or located by their keys.
+        """
+        block, offset = self._entry_block(source)
+        participant = self._entry_blocks[block].pop(source - offset)
+        key = self._key_blocks[block].pop(source - offset)
+        self._size -= 1
+        self._lengths.add(block, -1)
+        self._shrunk(block)
+
+        if not self._entry_blocks:
+            self._key_blocks.append([])
+            self._entry_blocks.append([])
+            self._maxes.append(key)
+            self._update_lengths()
+        block, offset = self._entry_block(destination)
+        self._entry_blocks[block].insert(destination - offset, participant)
+        keys = self._key_blocks[block]
+        keys.insert(destination - offset, key)
+        self._maxes[block] = keys[-1]
+        self._size += 1
+        self._lengths.add(block, 1)
+        self._grown(block)
+
+    def set_order(self, keyed):
+        """
+        Apply an ordering returned by :meth:`sorted_keys`.
+        """
+        self._key_blocks = []
+        self._entry_blocks = []
+        for start in range(0, len(keyed), self.BLOCK_SIZE):
+            chunk = keyed[start:start + self.BLOCK_SIZE]
+            self._key_blocks.append([key for key, participant in chunk])
+            self._entry_blocks.append([participant
+                                       for key, participant in chunk])
+        self._maxes = [keys[-1] for keys in self._key_blocks]
+        self._update_lengths()
+        self._key_of = dict((participant, key)
+                            for key, participant in keyed)
+        self._size = len(keyed)
+
+
+def longest_increasing_subsequence(sequence):
+    """
+    Return the indices of a longest strictly increasing subsequence.
+    """
+    # tails[k] is the index of the smallest tail of a subsequence of
+    # length k + 1, predecessors allow to reconstruct the subsequence
+    tails = []
+    tail_values = []
+    predecessors = [None] * len(sequence)
+
+    for idx, value in enumerate(sequence):
+        length = bisect.bisect_left(tail_values, value)
+        if length > 0:
+            predecessors[idx] = tails[length - 1]
+
+        if length == len(tails):
+            tails.append(idx)
+            tail_values.append(value)
+        else:
+            tails[length] = idx
+            tail_values[length] = value
+
+    result = []
+    idx = tails[-1] if tails else None
+    while idx is not None:
+        result.append(idx)
+        idx = predecessors[idx]
+    result.reverse()
+
+    return result
+
+
+def minimal_moves(old, new):
+    """
+    Compute a minimal set of single row moves turning one ordering into
+    another.
+
+    :param list old: previous ordering
+    :param list new: permutation of the same participants
+
+    The participants forming a longest increasing subsequence of new
+    positions keep their place. Every other participant is moved right
+    behind its predecessor in the new ordering. Returns a list of
+    ``(source, destination)`` rows, to be applied one after another.
+
+    Runs in O(n log n): every place a participant can take is known in
+    advance, the rows are counted in a Fenwick tree over these places.
+    """
+    new_position = dict((participant, position)
+                        for position, participant in enumerate(new))
+    positions = [new_position[participant] for participant in old]
+    old_position = dict((participant, position)
+                        for position, participant in enumerate(old))
+
+    stable = set(old[idx]
+                 for idx in longest_increasing_subsequence(positions))
+
+    # a moved participant is placed right behind its predecessor, i.e. at
+    # the old place of the first stable participant of its chain plus the
+    # length of the chain so far, -1 stands for the beginning of the list
+    targets = {}
+    for position, participant in enumerate(new):
+        if participant in stable:
+            continue
+
+        if position == 0:
+            anchor = (-1, 0)
+        else:
+            previous = new[position - 1]
+            anchor = targets.get(previous, (old_position[previous], 0))
+        targets[participant] = (anchor[0], anchor[1] + 1)
+
+    places = sorted(set([(position, 0) for position in range(len(old))] +
+                        list(targets.values())))
+    slots = dict((place, slot) for slot, place in enumerate(places))
+
+    occupied = _CountingTree(len(places))
+    for position in range(len(old)):
+        occupied.add(slots[(position, 0)], 1)
+
+    moves = []
+    for participant in new:
+        if participant in stable:
+            continue
+
+        slot = slots[(old_position[participant], 0)]
+        source = occupied.before(slot)
+        occupied.add(slot, -1)
+
+        slot = slots[targets[participant]]
+        destination = occupied.before(slot)
+        occupied.add(slot, 1)
+
+        if source != destination:
+            moves.append((source, destination))
+
+    return moves
+
+
+class participants_list():
+    """
+    Container of combatant states ordered by their initiative.
+
+    :param participants: list of :class:`state.CombatantState`
+    """
+
+    def __init__(self, participants):
+        participants = list(participants)
+        self.roster = Roster(participants)
+        self.pending = set()
+        self.round = 0
+
+        self.sort_participants(participants)
+
+    @timed("initiative.sort_participants")
+    def sort_participants(self, participants):
+        self.index = InitiativeIndex(participants, self.roster)
+
+    @property
+    def flattened_list(self):
+        return list(self.index)
+
+    def __len__(self):
+        return self.index.__len__()
+
+    def __getitem__(self, key):
+        return self.index.__getitem__(key)
+
+    def __iter__(self):
+        return self.index.__iter__()
+
+    def add(self, participant):
+        """
+        Let a participant join the battle and return its position.
+        """
+        self.roster.append(participant)
+
+        return self.index.insert(participant)
+
+    def remove(self, participant):
+        """
+        Remove a participant from the battle and return its old position.
+        """
+        self.roster.remove(participant)
+        self.pending.discard(participant)
+
+        return self.index.remove(participant)
+
+    def update(self, participant):
+        """
+        Move a participant whose initiative changed during the round.
+
+        Returns the old and the new position.
+        """
+        row = self.roster.rows[participant]
+        self.roster.order[row] = participant.order
+
+        return self.index.rekey(participant)
+
+    def reduce_hitpoints(self, amount=1, participants=None):
+        """
+        Let several participants take the same damage at once.
+
+        :param int amount: hit points lost by every participant
+        :param participants: affected participants, all if not given
+        """
+        if participants is None:
+            participants = list(self.index)
+
+        for participant in participants:
+            participant.reduce_hitpoints(amount)
+
+    @timed("round.reshuffle")
+    def reshuffle(self, initiative_rolls=None, pending=(),
+                  random_state=None, rebuild=True):
+        """
+        Start a new round for all participants.
+
+        :param dict initiative_rolls: d6 results per state for the
+            combatants whose dice are rolled by the players, all others are
+            rolled at once by the roster
+        :param pending: states whose rolls are not known yet, they are
+            placed as if they had rolled a 1 until :meth:`submit_initiative`
+            is called for them
+        :param random_state: numpy.random.RandomState to draw the rolls
+            from, e.g. seeded to reproduce a fight
+        :param bool rebuild: if False the participants keep their positions
+            until the caller applies :meth:`InitiativeIndex.sorted_keys`,
+            e.g. after announcing the moves to a view
+        """
+        initiative_rolls = dict(initiative_rolls or {})
+        for participant in pending:
+            initiative_rolls[participant] = 1
+        self.pending = set(pending)
+
+        # the roster observes the participants, its columns are up to date
+        registry = metrics()
+        with registry.timer("round.reshuffle.roll"):
+            self.roster.next_round(initiative_rolls, random_state)
+        with registry.timer("round.reshuffle.push"):
+            self.roster.push("order", "temporary_defense_modifier")
+        if rebuild:
+            with registry.timer("round.reshuffle.sort"):
+                self.index.rebuild()
+        self.round += 1
+
+    def submit_initiative(self, participant, initiative_roll):
+        """
+        Slot in a participant whose initiative roll arrived during the round.
+
+        Returns the old and the new position.
+        """
+        self.pending.discard(participant)
+        participant.set_initiative_roll(initiative_roll)
+
+        return self.update(participant)
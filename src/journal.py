@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Crash-safe autosave of a running battle.
+
+Changes of the combatant states are appended to a journal file, one JSON
+record per line, each with an increasing sequence number ``n``::
+
+    {"n": 1, "add": 0, "class": "PCState", "values": [...]}
+    {"n": 2, "set": [0, "hps", 7]}
+    {"n": 3, "round": 1}
+    {"n": 4, "remove": 0}
+    {"n": 5, "effects": [[0, "Stun", -4, 0, 0, [1, -12], [2, -12]]]}
+
+The effects record lists all active effects with their target, name,
+modifiers, damage, start and end, so their modifiers still expire after
+the battle was recovered. All values are absolute, so replaying a record
+twice does no harm. Records are written and synced by a background thread
+in batches, all changes within the flush interval cost one fsync together. Every few thousand records the journal is
+compacted: a snapshot of all states is written atomically next to it and
+the journal starts over, so recovery never has to read a long history.
+"""
+import json
+import os
+import threading
+import time
+
+from combatlog import ATTRIBUTES, attributes
+from effects import Effect
+from state import NPCState, PCState, SquadState
+
+STATE_CLASSES = dict((state_class.__name__, state_class)
+                     for state_class in (PCState, NPCState, SquadState))
+
+
+def _write_synced(path, text):
+    # write a new file next to the old one and replace it atomically
+    temporary = path + ".tmp"
+    with open(temporary, "w") as output:
+        output.write(text)
+        output.flush()
+        os.fsync(output.fileno())
+    os.rename(temporary, path)
+
+
+def _create_state(state_class, values):
+    state_class = STATE_CLASSES[state_class]
+    names = ATTRIBUTES + state_class.extra_attributes
+    values = dict(zip(names + ("name",), values))
+    state = state_class(values["name"], values["dexterity"], values["wits"],
+                        values["hps"], values["base_defense"])
+    for attribute in names:
+        setattr(state, attribute, values[attribute])
+
+    return state
+
+
+def _state_values(state):
+    return [getattr(state, attribute) for attribute in attributes(state)] + \
+        [state.name]
+
+
+class Journal(object):
+    """
+    Append-only journal of the changes of the watched states.
+
+    :param str path: journal file, the snapshot is written to ``path +
+        ".snapshot"``
+    :param float flush_interval: seconds to collect records before they are
+        written and synced
+    :param int compact_every: number of records after which a snapshot is
+        taken
+
+    A new journal replaces the files of an earlier battle, recover them with
+    :func:`recover` first.
+    """
+    def __init__(self, path, flush_interval=0.2, compact_every=5000):
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+
+        self.states = []
+        self.ids = {}
+        self.removed = set()
+        self.round = 0
+        self.effects = []
+        self.sequence = 0
+        self._since_snapshot = 0
+
+        # records and snapshots waiting for the writer thread
+        self._lines = []
+        self._snapshot = None
+        self._written = 0
+        self._closing = False
+        self._forced = False
+        self._condition = threading.Condition()
+
+        if os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+        self._output = open(self.path, "w")
+
+        self._writer = threading.Thread(target=self._run)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def _record(self, record):
+        # the values in a record are never changed later, so it is
+        # serialized by the writer thread
+        with self._condition:
+            self.sequence += 1
+            record["n"] = self.sequence
+            # only the first record of a batch wakes the writer up
+            if not self._lines:
+                self._condition.notify()
+            self._lines.append((self.sequence, record))
+
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.compact_every:
+            self.compact()
+
+    def watch(self, state):
+        """
+        Write a state to the journal and record its changes.
+        """
+        if state in self.ids:
+            if state not in self.removed:
+                return
+            self.removed.discard(state)
+        else:
+            self.ids[state] = len(self.states)
+            self.states.append(state)
+        state.add_observer(self.on_changed)
+
+        self._record({"add": self.ids[state],
+                      "class": type(state).__name__,
+                      "values": _state_values(state)})
+
+    def forget(self, state):
+        """
+        Record that a state left the battle.
+        """
+        if state not in self.ids or state in self.removed:
+            return
+
+        state.remove_observer(self.on_changed)
+        self.removed.add(state)
+        self._record({"remove": self.ids[state]})
+
+    def on_changed(self, state, attribute, old_value, new_value):
+        self._record({"set": [self.ids[state], attribute, new_value]})
+
+    def watch_effects(self, scheduler):
+        """
+        Record the active effects of a :class:`effects.EffectScheduler`
+        whenever they change.
+        """
+        scheduler.add_observer(self.on_effects_changed)
+        self.on_effects_changed(scheduler)
+
+    def on_effects_changed(self, scheduler):
+        effects = sorted([self.ids[effect.target], effect.name,
+                          effect.defense, effect.goal, effect.damage,
+                          effect.start, effect.end]
+                         for effect in scheduler.effects
+                         if effect.target in self.ids and
+                         effect.target not in self.removed)
+        if effects != self.effects:
+            self.effects = effects
+            self._record({"effects": effects})
+
+    def record_round(self, participants):
+        """
+        Record the number of the current round, the new initiative of the
+        states is recorded as they are changed.
+
+        :param participants: :class:`initiative.participants_list`
+        """
+        self.round = participants.round
+        self._record({"round": participants.round})
+
+    def compact(self):
+        """
+        Let the writer thread replace the journal by a snapshot.
+
+        Only the values of the states are copied here, the writer thread
+        serializes them.
+        """
+        snapshot = {
+            "n": self.sequence, "round": self.round,
+            "states": [(type(state).__name__, _state_values(state))
+                       for state in self.states],
+            "removed": sorted(self.ids[state] for state in self.removed),
+            "effects": self.effects}
+        self._since_snapshot = 0
+
+        with self._condition:
+            self._snapshot = (self.sequence, snapshot)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not (self._lines or self._snapshot or self._closing):
+                    self._condition.wait()
+                # collect the records of the flush interval into one batch
+                deadline = time.time() + self.flush_interval
+                while not (self._closing or self._forced):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                self._forced = False
+
+                lines, self._lines = self._lines, []
+                snapshot, self._snapshot = self._snapshot, None
+                closing = self._closing
+
+            if snapshot is not None:
+                sequence, values = snapshot
+                _write_synced(self.snapshot_path,
+                              json.dumps(values, default=list))
+                # everything written so far is part of the snapshot
+                self._output.close()
+                self._output = open(self.path, "w")
+                lines = [line for line in lines if line[0] > sequence]
+
+            if lines:
+                self._output.write("".join(
+                    json.dumps(record, default=list) + "\n"
+                    for sequence, record in lines))
+                self._output.flush()
+                os.fsync(self._output.fileno())
+
+            with self._condition:
+                if lines:
+                    self._written = lines[-1][0]
+                elif snapshot is not None:
+                    self._written = max(self._written, snapshot[0])
+                self._condition.notify_all()
+
+            if closing:
+                self._output.close()
+                return
+
+    def flush(self):
+        """
+        Wait until all records are on disk.
+        """
+        with self._condition:
+            if self._written < self.sequence:
+                self._forced = True
+                self._condition.notify()
+            while self._written < self.sequence and self._writer.is_alive():
+                self._condition.wait(self.flush_interval)
+
+    def close(self):
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        self._writer.join()
+
+
+def recover(path):
+    """
+    Restore the states of a battle from its journal.
+
+    Returns the list of states still in the battle, the round and the
+    effects on them, or None if there is no journal. The effects are
+    already part of the modifiers of the states, continue them with
+    :meth:`effects.EffectScheduler.resume`. A record that was cut off by a
+    crash is ignored.
+    """
+    snapshot_path = path + ".snapshot"
+    if not os.path.exists(path) and not os.path.exists(snapshot_path):
+        return None
+
+    states = []
+    removed = set()
+    round = 0
+    effects = []
+    sequence = 0
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        states = [_create_state(state_class, values)
+                  for state_class, values in snapshot["states"]]
+        removed.update(snapshot["removed"])
+        round = snapshot["round"]
+        effects = snapshot.get("effects", [])
+        sequence = snapshot["n"]
+
+    if os.path.exists(path):
+        with open(path) as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record["n"] <= sequence:
+                    continue
+
+                if "set" in record:
+                    state_id, attribute, value = record["set"]
+                    setattr(states[state_id], attribute, value)
+                elif "round" in record:
+                    round = record["round"]
+                elif "remove" in record:
+                    removed.add(record["remove"])
+                elif "effects" in record:
+                    effects = record["effects"]
+                else:
+                    added = _create_state(record["class"], record["values"])
+                    if record["add"] < len(states):
+                        states[record["add"]] = added
+                    else:
+                        states.append(added)
+                    removed.discard(record["add"])
+
+    resumed = []
+    for state_id, name, defense, goal, damage, start, end in effects:
+        if state_id in removed:
+            continue
+        effect = Effect(states[state_id], name, defense, goal, damage)
+        effect.start = tuple(start)
+        effect.end = tuple(end)
+        resumed.append(effect)
+
+    return [state for state_id, state in enumerate(states)
+            if state_id not in removed], round, resumed
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Detection of objects piling up during a long battle.
+
+After every round a census of the live objects is taken, counted by class
+name, together with any other counts such as the number of Qt objects. The
+:class:`LeakDetector` flags every count that grew in each of the last rounds
+beyond what the size of the roster explains. The class names point to the
+code creating the objects. The :class:`MemoryTracer` adds up the sizes of
+the same objects per class, so a report shows where the memory went as
+well. Both only rely on :mod:`gc` and work on Python 2.
+"""
+import collections
+import gc
+import sys
+
+Sample = collections.namedtuple("Sample", "round roster_size counts memory")
+Growth = collections.namedtuple("Growth", "name first last expected")
+
+
+def census(sizes=None):
+    """
+    Count the objects tracked by the garbage collector by class name.
+
+    :param sizes: collections.Counter that gets the sizes of the objects
+        per class name added, see :class:`MemoryTracer`
+    """
+    objects = gc.get_objects()
+    if sizes is None:
+        return collections.Counter(type(obj).__name__ for obj in objects)
+
+    counts = collections.Counter()
+    for obj in objects:
+        name = type(obj).__name__
+        counts[name] += 1
+        sizes[name] += sys.getsizeof(obj, 0)
+
+    return counts
+
+
+class MemoryTracer(object):
+    """
+    Memory of the objects tracked by the garbage collector per class name.
+
+    :param sizes: sizes per class name at the start, a census is taken if
+        not given
+
+    The sizes are the ones of :func:`sys.getsizeof`, i.e. without the
+    objects referred to. Objects the collector does not track, e.g.
+    strings and numbers, are not seen, but the containers holding them
+    are.
+    """
+    def __init__(self, sizes=None):
+        if sizes is None:
+            sizes = collections.Counter()
+            census(sizes)
+        self.baseline = sizes
+        self.sizes = sizes
+
+    def record(self, sizes):
+        """
+        Use the sizes of a later census, see :func:`census`.
+        """
+        self.sizes = sizes
+
+    def current(self):
+        """
+        Size in bytes of all objects of the last census.
+        """
+        return sum(self.sizes.values())
+
+    def top_growth(self, limit=5):
+        """
+        Classes whose objects grew the most since the start.
+        """
+        growth = sorted(((size - self.baseline.get(name, 0), name)
+                         for name, size in self.sizes.items()),
+                        reverse=True)
+
+        return ["%s: +%i KiB" % (name, size // 1024)
+                for size, name in growth[:limit] if size > 0]
+
+
+class LeakDetector(object):
+    """
+    Counts of objects per round and the ones suspected to leak.
+
+    :param int window: number of rounds a count has to grow in a row
+    :param int slack: growth that is ignored
+    """
+    def __init__(self, window=3, slack=10):
+        self.window = window
+        self.slack = slack
+        self.samples = []
+
+    def record(self, round, roster_size, counts, memory=None):
+        """
+        :param int round: number of the round
+        :param int roster_size: number of combatants known to the battle
+        :param dict counts: number of objects by name
+        :param int memory: bytes used
+        """
+        self.samples.append(Sample(round, roster_size, dict(counts), memory))
+
+    def suspects(self):
+        """
+        Counts that grew steadily and more than the roster, as
+        :class:`Growth` with the count expected from the roster size.
+        """
+        if len(self.samples) <= self.window:
+            return []
+
+        first = self.samples[0]
+        recent = self.samples[-self.window - 1:]
+        # objects belonging to the combatants may grow with the roster
+        scale = max(1, recent[-1].roster_size) / float(max(1,
+                                                           first.roster_size))
+
+        suspects = []
+        for name in recent[-1].counts:
+            counts = [sample.counts.get(name, 0) for sample in recent]
+            if not all(later > earlier
+                       for earlier, later in zip(counts, counts[1:])):
+                continue
+
+            expected = first.counts.get(name, 0) * scale
+            if counts[-1] > expected + self.slack:
+                suspects.append(Growth(name, first.counts.get(name, 0),
+                                       counts[-1], expected))
+
+        suspects.sort(key=lambda growth: growth.expected - growth.last)
+
+        return suspects
+
+    def report(self):
+        """
+        Lines describing the suspects, the largest growth first.
+        """
+        if not self.samples:
+            return []
+
+        last = self.samples[-1]
+        lines = ["Round %i, %i combatants" % (last.round, last.roster_size)]
+        if last.memory is not None:
+            lines[0] += ", %i KiB" % (last.memory // 1024)
+        for growth in self.suspects():
+            lines.append("  %s: %i -> %i, expected %i" % (
+                growth.name, growth.first, growth.last, growth.expected))
+
+        return lines
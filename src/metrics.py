@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Timers and counters of the hot paths of the battle organizer.
+
+Timed code is named hierarchically, e.g. ``round.reshuffle.roll`` is a stage
+of ``round.reshuffle``, so a slow round can be traced to the responsible
+stage. Every timer keeps only the number of calls, the total, the maximum
+and the last duration, which is cheap enough to stay enabled during a
+session::
+
+    @timed("char.init_ui")
+    def initUI(self):
+        ...
+
+    with metrics().timer("round.moves"):
+        ...
+
+The values are dumped as JSON or in the text format of Prometheus.
+"""
+import functools
+import json
+import os
+import re
+import timeit
+
+_clock = timeit.default_timer
+
+
+class Timer(object):
+    """
+    Statistics of the durations of a timed piece of code.
+    """
+    __slots__ = ("count", "total", "maximum", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.maximum = 0.
+        self.last = 0.
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if duration > self.maximum:
+            self.maximum = duration
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.
+
+
+class _Timing(object):
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = _clock()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_time(self.name, _clock() - self.start)
+
+
+class _NoTiming(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_NO_TIMING = _NoTiming()
+
+
+class Metrics(object):
+    """
+    Registry of timers and counters.
+
+    :param bool enabled: nothing is recorded while this is False
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timers = {}
+        self.counters = {}
+
+    def add_time(self, name, duration):
+        """
+        Record a duration in seconds.
+        """
+        try:
+            self.timers[name].add(duration)
+        except KeyError:
+            self.timers[name] = Timer()
+            self.timers[name].add(duration)
+
+    def increment(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timer(self, name):
+        """
+        Context manager timing its block.
+        """
+        if not self.enabled:
+            return _NO_TIMING
+
+        return _Timing(self, name)
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+
+    def stages(self, name):
+        """
+        Timers of the stages of ``name``, the slowest last call first.
+        """
+        prefix = name + "."
+
+        return sorted(((stage, timer)
+                       for stage, timer in self.timers.items()
+                       if stage.startswith(prefix)),
+                      key=lambda item: item[1].last, reverse=True)
+
+    def as_dict(self):
+        return {
+            "timers": dict((name, {"count": timer.count,
+                                   "total": timer.total,
+                                   "max": timer.maximum,
+                                   "last": timer.last})
+                           for name, timer in self.timers.items()),
+            "counters": dict(self.counters),
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=1, sort_keys=True)
+
+    def to_prometheus(self, prefix="fsga"):
+        """
+        Text exposition format of Prometheus, timers become summaries.
+        """
+        lines = []
+        for name, timer in sorted(self.timers.items()):
+            metric = _metric_name(prefix, name) + "_seconds"
+            lines.append("# TYPE %s summary" % metric)
+            lines.append("%s_count %i" % (metric, timer.count))
+            lines.append("%s_sum %r" % (metric, timer.total))
+            lines.append("# TYPE %s_max gauge" % metric)
+            lines.append("%s_max %r" % (metric, timer.maximum))
+        for name, value in sorted(self.counters.items()):
+            metric = _metric_name(prefix, name) + "_total"
+            lines.append("# TYPE %s counter" % metric)
+            lines.append("%s %i" % (metric, value))
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Write the metrics to a file, as JSON if its name ends with
+        ``.json`` and in the format of Prometheus otherwise.
+
+        The file is replaced atomically, so it can be read at any time,
+        e.g. by the textfile collector of the Prometheus node exporter.
+        """
+        if path.endswith(".json"):
+            text = self.to_json()
+        else:
+            text = self.to_prometheus()
+
+        temporary = path + ".tmp"
+        with open(temporary, "w") as output:
+            output.write(text)
+        os.rename(temporary, path)
+
+
+def _metric_name(prefix, name):
+    return re.sub("[^a-zA-Z0-9_]", "_", "%s_%s" % (prefix, name))
+
+
+_metrics = None
+
+
+def metrics():
+    """
+    Return the metrics shared by the whole application.
+    """
+    global _metrics
+
+    if _metrics is None:
+        _metrics = Metrics()
+
+    return _metrics
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            registry = metrics()
+            if not registry.enabled:
+                return function(*args, **kwargs)
+
+            start = _clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                registry.add_time(name, _clock() - start)
+
+        return wrapper
+
+    return decorator
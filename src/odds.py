@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Exact odds of the initiative order of the next round.
+
+Every combatant rolls dexterity + wits + d6. The difference of two d6 is
+distributed as ``(6 - |k|) / 36`` for ``k`` from -5 to 5, so the chance
+that one combatant acts before another follows from the difference of
+their base initiatives alone. Equal results are resolved by a tie-break
+value, e.g. the dexterity, as in :class:`initiative.InitiativeIndex`.
+"""
+import numpy as np
+
+# probability that the first d6 exceeds the second by more than k, for k
+# from -6 to 5
+_DIFFERENCES = np.arange(-5, 6)
+_DIFFERENCE_PROBABILITY = (6 - np.abs(_DIFFERENCES)) / 36.
+_GREATER = np.array([_DIFFERENCE_PROBABILITY[_DIFFERENCES > k].sum()
+                     for k in range(-6, 6)])
+_EQUAL = np.concatenate([[0.], _DIFFERENCE_PROBABILITY])
+
+
+def act_before(base, tiebreak, other_bases, other_tiebreaks):
+    """
+    Probabilities that a combatant acts before each of the others.
+
+    :param int base: base initiative, i.e. dexterity + wits
+    :param int tiebreak: the higher value wins a tie
+    :param other_bases: array of the base initiatives of the others
+    :param other_tiebreaks: array of their tie-break values
+    """
+    # the combatant needs a d6 difference above this
+    needed = np.clip(np.asarray(other_bases) - base, -6, 6)
+    greater = np.where(needed > 5, 0., _GREATER[np.minimum(needed, 5) + 6])
+    equal = np.where(np.abs(needed) > 5, 0., _EQUAL[np.clip(needed, -6, 5)
+                                                    + 6])
+
+    return greater + equal * (tiebreak > np.asarray(other_tiebreaks))
+
+
+class InitiativeOdds(object):
+    """
+    Expected initiative ranks of a whole battle.
+
+    :param bases: base initiatives
+    :param tiebreaks: tie-break values, all distinct
+
+    The ranks are computed in blocks by :meth:`compute`, which can be
+    cancelled between blocks. Later changes, additions and removals of
+    single combatants are applied incrementally by :meth:`update`,
+    :meth:`add` and :meth:`remove` in O(n).
+    """
+    def __init__(self, bases, tiebreaks):
+        self.bases = np.array(bases, dtype=int)
+        self.tiebreaks = np.array(tiebreaks, dtype=int)
+        self.ranks = None
+
+    def __len__(self):
+        return len(self.bases)
+
+    def before(self, index):
+        """
+        Probabilities that combatant ``index`` acts before each combatant,
+        0 for itself.
+        """
+        probabilities = act_before(self.bases[index], self.tiebreaks[index],
+                                   self.bases, self.tiebreaks)
+        probabilities[index] = 0.
+
+        return probabilities
+
+    def compute(self, cancelled=lambda: False, block_size=256):
+        """
+        Compute the expected rank of every combatant, 1 being the first.
+
+        :param cancelled: function returning True if the result is not
+            needed anymore, checked between blocks
+
+        Returns the ranks or None if cancelled.
+        """
+        ranks = np.ones(len(self))
+        for start in range(0, len(self), block_size):
+            if cancelled():
+                return None
+
+            stop = min(start + block_size, len(self))
+            # probabilities that the combatants of the block act before
+            # everybody else
+            needed = np.clip(self.bases[np.newaxis, :] -
+                             self.bases[start:stop, np.newaxis], -6, 6)
+            greater = np.where(needed > 5, 0.,
+                               _GREATER[np.minimum(needed, 5) + 6])
+            equal = np.where(np.abs(needed) > 5, 0.,
+                             _EQUAL[np.clip(needed, -6, 5) + 6])
+            wins = (self.tiebreaks[start:stop, np.newaxis] >
+                    self.tiebreaks[np.newaxis, :])
+            block = greater + equal * wins
+            block[np.arange(stop - start), np.arange(start, stop)] = 0.
+
+            ranks += block.sum(axis=0)
+
+        self.ranks = ranks
+
+        return ranks
+
+    def update(self, index, base, tiebreak):
+        """
+        Change the base initiative and tie-break value of one combatant.
+        """
+        old_before = self.before(index)
+        self.bases[index] = base
+        self.tiebreaks[index] = tiebreak
+        new_before = self.before(index)
+
+        if self.ranks is not None:
+            self.ranks += new_before - old_before
+            # everybody else acts before the combatant if it does not act
+            # before them
+            self.ranks[index] = len(self) - new_before.sum()
+
+    def add(self, base, tiebreak):
+        """
+        Add a combatant after the others and return its index.
+        """
+        before = act_before(base, tiebreak, self.bases, self.tiebreaks)
+        self.bases = np.append(self.bases, base)
+        self.tiebreaks = np.append(self.tiebreaks, tiebreak)
+
+        if self.ranks is not None:
+            self.ranks += before
+            # the others act before the new combatant if it does not act
+            # before them
+            self.ranks = np.append(self.ranks,
+                                   1 + len(before) - before.sum())
+
+        return len(self) - 1
+
+    def remove(self, index):
+        """
+        Remove a combatant, the last one takes its index.
+        """
+        if self.ranks is not None:
+            self.ranks -= self.before(index)
+
+        last = len(self) - 1
+        for values in (self.bases, self.tiebreaks, self.ranks):
+            if values is not None:
+                values[index] = values[last]
+        self.bases = self.bases[:last]
+        self.tiebreaks = self.tiebreaks[:last]
+        if self.ranks is not None:
+            self.ranks = self.ranks[:last]
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Second screen showing the battle to the players.
+
+The :class:`DisplayServer` runs in the GM's application and sends the
+changes of the battle as described in :mod:`delta` over a local socket.
+The display is a separate process started with ``./playerdisplay.py``, it
+shows the initiative order, the hit point bars and whose turn it is.
+"""
+from PySide import QtCore, QtGui, QtNetwork
+
+from delta import HP_STEPS, DeltaEncoder, DisplayMirror, decode, encode
+from metrics import timed
+
+DISPLAY_NAME = "fsga-display"
+# a display with more unsent bytes than this gets no new messages, its
+# changes are coalesced until it caught up
+MAX_BACKLOG = 64 * 1024
+
+LEVEL_ROLE = QtCore.Qt.UserRole
+PLAYER_CONTROLLED_ROLE = QtCore.Qt.UserRole + 1
+
+
+class DisplayServer(QtNetwork.QLocalServer):
+    """
+    Keep the players' displays up to date.
+
+    :param participants: :class:`initiative.participants_list`
+
+    Changes are collected with :meth:`mark` and :meth:`mark_order` and sent
+    to every display at most once per event loop iteration. Writing never
+    blocks the GM's interface.
+    """
+    def __init__(self, participants, parent=None):
+        super(DisplayServer, self).__init__(parent)
+
+        self.participants = participants
+        self.active = None
+        self.encoders = {}
+        self.scheduled = False
+
+        self.newConnection.connect(self.on_new_connection)
+
+    def start(self, name=DISPLAY_NAME):
+        # a server that crashed may have left its socket behind
+        QtNetwork.QLocalServer.removeServer(name)
+
+        return self.listen(name)
+
+    def mark(self, dirty):
+        """
+        :param dict dirty: changed attributes per combatant state
+        """
+        reordered = any("order" in attributes
+                        for attributes in dirty.values())
+        for encoder in self.encoders.values():
+            encoder.mark(dirty)
+            if reordered:
+                encoder.mark_order()
+        self.schedule()
+
+    def mark_order(self):
+        """
+        Note that combatants joined, left or changed their places.
+        """
+        for encoder in self.encoders.values():
+            encoder.mark_order()
+        self.schedule()
+
+    def set_active(self, state):
+        self.active = state
+        self.schedule()
+
+    def schedule(self):
+        if self.encoders and not self.scheduled:
+            self.scheduled = True
+            QtCore.QTimer.singleShot(0, self.send)
+
+    @QtCore.Slot()
+    @timed("display.send")
+    def send(self):
+        self.scheduled = False
+        for socket in list(self.encoders):
+            self.send_to(socket)
+
+    def send_to(self, socket):
+        if socket.bytesToWrite() > MAX_BACKLOG:
+            return
+
+        messages = self.encoders[socket].collect(self.participants,
+                                                 self.active)
+        if messages:
+            socket.write(encode(messages))
+
+    @QtCore.Slot()
+    def on_new_connection(self):
+        while self.hasPendingConnections():
+            socket = self.nextPendingConnection()
+            # a new display starts empty and gets the whole battle
+            self.encoders[socket] = DeltaEncoder()
+            socket.bytesWritten.connect(
+                lambda written, socket=socket: self.on_bytes_written(socket))
+            socket.disconnected.connect(
+                lambda socket=socket: self.on_disconnected(socket))
+            self.send_to(socket)
+
+    def on_bytes_written(self, socket):
+        # send what was held back while the display was busy
+        if socket in self.encoders and socket.bytesToWrite() == 0:
+            self.send_to(socket)
+
+    def on_disconnected(self, socket):
+        self.encoders.pop(socket, None)
+        socket.deleteLater()
+
+
+class DisplayModel(QtCore.QAbstractListModel):
+    """
+    Model of the combatants shown to the players.
+
+    Every message only touches the rows it concerns.
+    """
+    def __init__(self, parent=None):
+        super(DisplayModel, self).__init__(parent)
+
+        self.mirror = DisplayMirror()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.mirror.order)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        state_id = self.mirror.order[index.row()]
+
+        if role == QtCore.Qt.DisplayRole:
+            return self.mirror.names[state_id]
+        elif role == LEVEL_ROLE:
+            return self.mirror.levels[state_id]
+        elif role == PLAYER_CONTROLLED_ROLE:
+            return self.mirror.player_controlled[state_id]
+        elif role == QtCore.Qt.FontRole and state_id == self.mirror.active:
+            font = QtGui.QFont()
+            font.setBold(True)
+            return font
+
+        return None
+
+    def _changed(self, state_id):
+        if state_id is None:
+            return
+
+        index = self.index(self.mirror.order.index(state_id))
+        self.dataChanged.emit(index, index)
+
+    def apply(self, messages):
+        mirror = self.mirror
+        root = QtCore.QModelIndex()
+
+        for message in messages:
+            kind = message[0]
+            if kind == "add":
+                row = len(mirror.order)
+                self.beginInsertRows(root, row, row)
+                mirror.add(*message[1:])
+                self.endInsertRows()
+            elif kind == "remove":
+                row = mirror.order.index(message[1])
+                self.beginRemoveRows(root, row, row)
+                mirror.remove(message[1])
+                self.endRemoveRows()
+            elif kind == "hp":
+                mirror.set_level(message[1], message[2])
+                self._changed(message[1])
+            elif kind == "move":
+                source, destination = message[1], message[2]
+                if destination > source:
+                    self.beginMoveRows(root, source, source, root,
+                                       destination + 1)
+                else:
+                    self.beginMoveRows(root, source, source, root,
+                                       destination)
+                mirror.move(source, destination)
+                self.endMoveRows()
+            elif kind == "order":
+                self.layoutAboutToBeChanged.emit()
+                mirror.set_order(message[1])
+                self.layoutChanged.emit()
+            elif kind == "active":
+                previous = mirror.active
+                mirror.set_active(message[1])
+                self._changed(previous)
+                self._changed(message[1])
+
+
+class DisplayDelegate(QtGui.QStyledItemDelegate):
+    """
+    Paints the name and the hit point bar of a combatant.
+    """
+    pc_color = QtGui.QColor(74, 35, 106)
+    npc_color = QtGui.QColor(140, 30, 30)
+    active_color = QtGui.QColor(240, 220, 120)
+
+    def paint(self, painter, option, index):
+        painter.save()
+
+        font = index.data(QtCore.Qt.FontRole)
+        if font is not None:
+            painter.fillRect(option.rect, self.active_color)
+            painter.setFont(font)
+
+        rect = option.rect.adjusted(8, 0, -8, 0)
+        name_rect = QtCore.QRect(rect.left(), rect.top(),
+                                 rect.width() // 2, rect.height())
+        bar = QtCore.QRect(name_rect.right(), rect.top(),
+                           rect.width() - name_rect.width(), rect.height())
+        bar.adjust(0, bar.height() // 4, 0, -bar.height() // 4)
+
+        painter.drawText(name_rect, QtCore.Qt.AlignLeft |
+                         QtCore.Qt.AlignVCenter, index.data())
+
+        if index.data(PLAYER_CONTROLLED_ROLE):
+            color = self.pc_color
+        else:
+            color = self.npc_color
+        filled = QtCore.QRect(bar.left(), bar.top(),
+                              bar.width() * index.data(LEVEL_ROLE) // HP_STEPS,
+                              bar.height())
+        painter.fillRect(filled, color)
+        painter.drawRect(bar)
+
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(option.rect.width(),
+                            2 * option.fontMetrics.height())
+
+
+class PlayerDisplay(QtGui.QWidget):
+    """
+    Window shown to the players, connected to a :class:`DisplayServer`.
+
+    The connection is retried until the GM's application runs.
+    """
+    def __init__(self, name=DISPLAY_NAME, parent=None):
+        super(PlayerDisplay, self).__init__(parent)
+
+        self.name = name
+        self.buffer = ""
+
+        self.setupUI()
+
+        self.socket = QtNetwork.QLocalSocket(self)
+        self.socket.readyRead.connect(self.on_ready_read)
+        self.socket.disconnected.connect(self.on_disconnected)
+        self.socket.error.connect(lambda error: self.on_disconnected())
+        self.retry_timer = QtCore.QTimer(self)
+        self.retry_timer.setInterval(1000)
+        self.retry_timer.timeout.connect(self.connect_to_server)
+
+        self.connect_to_server()
+
+    def setupUI(self):
+        layout = QtGui.QVBoxLayout()
+
+        self.model = DisplayModel(self)
+        view = QtGui.QListView()
+        view.setModel(self.model)
+        view.setItemDelegate(DisplayDelegate(view))
+        view.setUniformItemSizes(True)
+        view.setSelectionMode(QtGui.QAbstractItemView.NoSelection)
+        view.setFocusPolicy(QtCore.Qt.NoFocus)
+        font = view.font()
+        font.setPointSize(2 * font.pointSize())
+        view.setFont(font)
+        layout.addWidget(view)
+
+        self.setLayout(layout)
+        self.setWindowTitle("Initiative")
+
+    @QtCore.Slot()
+    def connect_to_server(self):
+        self.retry_timer.stop()
+        self.socket.abort()
+        self.socket.connectToServer(self.name)
+
+    @QtCore.Slot()
+    def on_disconnected(self):
+        # the server sends everything again after reconnecting
+        self.buffer = ""
+        self.model.beginResetModel()
+        self.model.mirror = DisplayMirror()
+        self.model.endResetModel()
+        if not self.retry_timer.isActive():
+            self.retry_timer.start()
+
+    @QtCore.Slot()
+    def on_ready_read(self):
+        lines = (self.buffer + str(self.socket.readAll())).split("\n")
+        self.buffer = lines.pop()
+
+        for line in lines:
+            self.model.apply(decode(line))
+
+
+if __name__ == "__main__":
+    import sys
+
+    app = QtGui.QApplication(sys.argv)
+
+    display = PlayerDisplay()
+    display.show()
+
+    sys.exit(app.exec_())
@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Pool of all combatants known to the GM.
+
+Every combatant is either active in the battle, in the graveyard or in the
+reserve. The pool is indexed by name, faction and traits, so the right NPC
+can be found in a library of many thousands without scanning it.
+
+Roster files can be attached to the reserve as they are: their records are
+searched in the file and get a state only when they are moved, see
+:meth:`Pool.attach`.
+"""
+import bisect
+import heapq
+import itertools
+
+import numpy as np
+
+ACTIVE = "active"
+GRAVEYARD = "graveyard"
+RESERVE = "reserve"
+LOCATIONS = (ACTIVE, GRAVEYARD, RESERVE)
+
+# traits that can be searched by range
+TRAITS = ("dexterity", "wits", "base_hps", "base_defense")
+
+
+class ValueIndex(object):
+    """
+    Sets of objects per value with the distinct values kept sorted.
+
+    Adding and removing an object costs O(1) unless a value appears or
+    vanishes. A range query bisects the distinct values and only touches
+    the matching sets.
+    """
+    def __init__(self):
+        self.values = []
+        self.objects = {}
+
+    def add(self, value, obj):
+        try:
+            self.objects[value].add(obj)
+        except KeyError:
+            self.objects[value] = set([obj])
+            bisect.insort(self.values, value)
+
+    def discard(self, value, obj):
+        objects = self.objects.get(value)
+        if objects is None:
+            return
+
+        objects.discard(obj)
+        if not objects:
+            del self.objects[value]
+            del self.values[bisect.bisect_left(self.values, value)]
+
+    def add_array(self, values):
+        """
+        Add the positions in an array with the values found there, e.g. the
+        records of a roster file, sorting the array instead of adding every
+        position on its own.
+        """
+        order = np.argsort(values, kind="mergesort")
+        values = values[order]
+        starts = np.flatnonzero(np.concatenate(
+            ([True], values[1:] != values[:-1])))
+        stops = np.append(starts[1:], len(values))
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            value = values[start].item()
+            positions = order[start:stop].tolist()
+            if value in self.objects:
+                self.objects[value].update(positions)
+            else:
+                self.objects[value] = set(positions)
+                bisect.insort(self.values, value)
+
+    def get(self, value):
+        return self.objects.get(value, set())
+
+    def range(self, low=None, high=None):
+        """
+        Objects with values between low and high, both included.
+        """
+        start = 0 if low is None else bisect.bisect_left(self.values, low)
+        stop = (len(self.values) if high is None
+                else bisect.bisect_right(self.values, high))
+
+        result = set()
+        for value in self.values[start:stop]:
+            result.update(self.objects[value])
+
+        return result
+
+    def prefix(self, prefix):
+        """
+        Objects with string values starting with prefix.
+        """
+        result = set()
+        for obj in self.ordered(prefix):
+            result.add(obj)
+
+        return result
+
+    def ordered(self, prefix=""):
+        """
+        Iterate over the objects with string values starting with prefix in
+        the order of their values.
+        """
+        start = bisect.bisect_left(self.values, prefix)
+        for value in self.values[start:]:
+            if not value.startswith(prefix):
+                break
+            for obj in self.objects[value]:
+                yield obj
+
+
+class RosterRecord(object):
+    """
+    Record of a roster file attached to a pool, which has no state yet.
+
+    :param roster_file: :class:`rosterfile.RosterFile`
+    :param int index: index of the record in the file
+
+    Search results show records like states, :meth:`Pool.materialize`
+    turns them into states.
+    """
+    __slots__ = ("roster_file", "index")
+
+    def __init__(self, roster_file, index):
+        self.roster_file = roster_file
+        self.index = index
+
+    @property
+    def name(self):
+        return self.roster_file.name(self.index)
+
+    @property
+    def faction(self):
+        return self.roster_file.faction(self.index)
+
+    def state(self):
+        """
+        The state of the record, the same object on every call.
+        """
+        return self.roster_file[self.index]
+
+    def __eq__(self, other):
+        return (isinstance(other, RosterRecord) and
+                self.roster_file is other.roster_file and
+                self.index == other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.roster_file), self.index))
+
+    def __repr__(self):
+        return "<record %i: %s>" % (self.index, self.name.encode("utf-8"))
+
+
+class Pool(object):
+    """
+    Active, dead and reserve combatants.
+
+    :param battle: container of the active states providing ``add``,
+        ``remove`` and iteration, e.g. a
+        :class:`initiative.participants_list`
+    :param reserve: states that are not part of the battle yet
+
+    Moving a combatant between the sets costs O(1), joining or leaving the
+    battle updates its initiative order incrementally. Observers are called
+    as ``observer(state, old_location, new_location)`` whenever a state is
+    added, moved or discarded, with None for the location of a state that
+    is not part of the pool.
+    """
+    def __init__(self, battle, reserve=()):
+        self.battle = battle
+
+        self.sets = dict((location, set()) for location in LOCATIONS)
+        self.location = {}
+        self.names = ValueIndex()
+        self.factions = ValueIndex()
+        self.traits = dict((trait, ValueIndex()) for trait in TRAITS)
+
+        # attached roster files, which of their records have no state and
+        # indexes of their records, built on the first search by a trait
+        self.files = []
+        self.available = []
+        self.record_indexes = []
+
+        self.observers = []
+
+        for state in list(battle):
+            self._index(state, ACTIVE)
+        self.extend(reserve)
+
+    def __len__(self):
+        return len(self.location) + sum(int(np.count_nonzero(available))
+                                        for available in self.available)
+
+    def __contains__(self, state):
+        if isinstance(state, RosterRecord):
+            try:
+                position = self.files.index(state.roster_file)
+            except ValueError:
+                return False
+
+            return bool(self.available[position][state.index])
+
+        return state in self.location
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def _notify(self, state, old_location, new_location):
+        for observer in list(self.observers):
+            observer(state, old_location, new_location)
+
+    def _index(self, state, location):
+        self.sets[location].add(state)
+        self.location[state] = location
+        self.names.add(state.name, state)
+        self.factions.add(state.faction, state)
+        for trait, index in self.traits.items():
+            index.add(getattr(state, trait), state)
+        state.add_observer(self.on_changed)
+
+    def on_changed(self, state, attribute, old_value, new_value):
+        """
+        Keep the indexes up to date when a trait of a state changes, e.g.
+        the hit points of a squad after :meth:`state.SquadState.split`.
+        """
+        if attribute == "name":
+            index = self.names
+        elif attribute == "faction":
+            index = self.factions
+        else:
+            index = self.traits.get(attribute)
+            if index is None:
+                return
+
+        index.discard(old_value, state)
+        index.add(new_value, state)
+
+    def add(self, state, location=RESERVE):
+        if state in self.location:
+            raise ValueError("%s is already in the pool" % state.name)
+
+        self._index(state, location)
+        if location == ACTIVE:
+            self.battle.add(state)
+        self._notify(state, None, location)
+
+    def extend(self, states, location=RESERVE):
+        for state in states:
+            self.add(state, location)
+
+    def attach(self, roster_file):
+        """
+        Add all records of a roster file to the reserve.
+
+        :param roster_file: :class:`rosterfile.RosterFile`, it has to stay
+            open as long as it is attached
+
+        No state is created: :meth:`find` searches the records in the file
+        and returns :class:`RosterRecord` objects for them.
+        """
+        self.files.append(roster_file)
+        self.available.append(np.ones(len(roster_file), dtype=bool))
+        self.record_indexes.append({})
+
+    def materialize(self, state):
+        """
+        Return the state of a search result.
+
+        A :class:`RosterRecord` gets its state, which replaces the record
+        in the reserve. States are returned unchanged.
+        """
+        if not isinstance(state, RosterRecord):
+            return state
+
+        available = self.available[self.files.index(state.roster_file)]
+        if not available[state.index]:
+            return state.state()
+
+        available[state.index] = False
+        state = state.state()
+        self._index(state, RESERVE)
+
+        return state
+
+    def discard(self, state):
+        """
+        Remove a state from the pool altogether.
+
+        A :class:`RosterRecord` without a state is no longer found, the
+        state of a record is removed like any other.
+        """
+        if isinstance(state, RosterRecord):
+            try:
+                position = self.files.index(state.roster_file)
+            except ValueError:
+                return
+
+            available = self.available[position]
+            if available[state.index]:
+                available[state.index] = False
+                return
+            state = state.state()
+
+        location = self.location.pop(state, None)
+        if location is None:
+            return
+
+        if location == ACTIVE:
+            self.battle.remove(state)
+        state.remove_observer(self.on_changed)
+        self.sets[location].discard(state)
+        self.names.discard(state.name, state)
+        self.factions.discard(state.faction, state)
+        for trait, index in self.traits.items():
+            index.discard(getattr(state, trait), state)
+        self._notify(state, location, None)
+
+    def move(self, state, location):
+        """
+        Move a state to another location.
+
+        A :class:`RosterRecord` gets its state first, see
+        :meth:`materialize`.
+        """
+        state = self.materialize(state)
+        old_location = self.location[state]
+        if old_location == location:
+            return
+
+        if old_location == ACTIVE:
+            self.battle.remove(state)
+        self.sets[old_location].discard(state)
+        self.sets[location].add(state)
+        self.location[state] = location
+        if location == ACTIVE:
+            self.battle.add(state)
+        self._notify(state, old_location, location)
+
+    def activate(self, state):
+        self.move(state, ACTIVE)
+
+    def kill(self, state):
+        self.move(state, GRAVEYARD)
+
+    def revive(self, state, hps=1):
+        """
+        Bring a dead combatant back into the battle with some hit points.
+        """
+        if state.hps < hps:
+            state.increase_hitpoints(hps - state.hps)
+        self.move(state, ACTIVE)
+
+    def retreat(self, state):
+        self.move(state, RESERVE)
+
+    def find(self, name=None, faction=None, location=None, limit=None,
+             **ranges):
+        """
+        Search the pool.
+
+        :param str name: prefix of the names
+        :param str faction: faction
+        :param str location: one of :data:`LOCATIONS`
+        :param int limit: maximum number of states returned
+        :param ranges: ranges of traits, e.g. ``dexterity=(5, 8)``, where
+            either limit may be None
+
+        Returns the list of matching states sorted by name. With a limit,
+        a search matching a large part of the pool walks the names in
+        order and stops at the limit instead of sorting all matches.
+        Records of attached roster files are part of the reserve and
+        returned as :class:`RosterRecord`.
+        """
+        name = name or ""
+        ranges = dict((trait, (low, high))
+                      for trait, (low, high) in ranges.items()
+                      if low is not None or high is not None)
+        states = self._find_states(name, faction, location, limit, ranges)
+        if location not in (None, RESERVE) or not self.files:
+            return states
+
+        results = [states]
+        for position in range(len(self.files)):
+            results.append(self._find_records(position, name, faction, limit,
+                                              ranges))
+        merged = heapq.merge(*[[(obj.name, source, obj) for obj in result]
+                               for source, result in enumerate(results)])
+
+        return [obj for key, source, obj in itertools.islice(merged, limit)]
+
+    def _record_index(self, position, column):
+        indexes = self.record_indexes[position]
+        if column not in indexes:
+            indexes[column] = ValueIndex()
+            indexes[column].add_array(self.files[position].records[column])
+
+        return indexes[column]
+
+    def _find_records(self, position, name, faction, limit, ranges):
+        roster_file = self.files[position]
+        available = self.available[position]
+
+        candidates = []
+        if faction is not None:
+            candidates.append(self._record_index(position, "faction").get(
+                roster_file.faction_offset(faction)))
+        for trait, (low, high) in ranges.items():
+            candidates.append(
+                self._record_index(position, trait).range(low, high))
+
+        if not candidates:
+            order = roster_file.by_name(name)
+            matches = order[available[order]][:limit]
+        else:
+            # intersect starting with the smallest set and sort the matches
+            # by the places of their names
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for candidate in candidates[1:]:
+                result.intersection_update(candidate)
+            matches = np.fromiter(result, dtype=np.intp, count=len(result))
+            matches = matches[available[matches]]
+
+            start, stop = roster_file.name_range(name)
+            ranks = roster_file.name_ranks(matches)
+            inside = (ranks >= start) & (ranks < stop)
+            matches = matches[inside][np.argsort(ranks[inside])][:limit]
+
+        return [RosterRecord(roster_file, index)
+                for index in matches.tolist()]
+
+    def _find_states(self, name, faction, location, limit, ranges):
+        candidates = []
+        if faction is not None:
+            candidates.append(self.factions.get(faction))
+        if location is not None:
+            candidates.append(self.sets[location])
+        for trait, (low, high) in ranges.items():
+            candidates.append(self.traits[trait].range(low, high))
+        candidates.sort(key=len)
+
+        if limit is not None and (not candidates or
+                                  len(candidates[0]) > 4 * limit):
+            result = []
+            for state in self.names.ordered(name):
+                if all(state in candidate for candidate in candidates):
+                    result.append(state)
+                    if len(result) == limit:
+                        break
+
+            return result
+
+        if name:
+            candidates.insert(0, self.names.prefix(name))
+        if not candidates:
+            result = set(self.location)
+        else:
+            # intersect starting with the smallest set
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for candidate in candidates[1:]:
+                result.intersection_update(candidate)
+
+        if limit is not None:
+            return heapq.nsmallest(limit, result,
+                                   key=lambda state: state.name)
+
+        return sorted(result, key=lambda state: state.name)
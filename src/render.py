@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Coalesced repainting of combatant views.
+"""
+from PySide import QtCore
+
+from metrics import metrics
+
+
+class RepaintScheduler(QtCore.QObject):
+    """
+    Collects changed combatant states and repaints them once per event loop
+    iteration.
+
+    States are registered with :meth:`watch`. Every change of a watched
+    state marks it dirty, and the first change schedules a flush. The
+    flush emits :attr:`flushed` with a dict mapping each dirty state to the
+    set of changed attributes, so views only update what has changed.
+
+    Views of a single state register a callback with :meth:`subscribe`
+    instead, it is only called when its state is dirty, so a flush costs
+    the same no matter how many of these views exist.
+    """
+    flushed = QtCore.Signal(object)
+
+    def __init__(self, parent=None):
+        super(RepaintScheduler, self).__init__(parent)
+
+        self.dirty = {}
+        self.callbacks = {}
+
+    def watch(self, state):
+        state.add_observer(self.mark_dirty)
+
+    def unwatch(self, state):
+        state.remove_observer(self.mark_dirty)
+
+    def subscribe(self, state, callback):
+        """
+        Call ``callback(attributes)`` with the changed attributes of a state
+        on every flush that includes it.
+        """
+        self.watch(state)
+        self.callbacks.setdefault(state, []).append(callback)
+
+    def unsubscribe(self, state, callback):
+        callbacks = self.callbacks.get(state, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self.callbacks.pop(state, None)
+
+    def mark_dirty(self, state, attribute, old_value=None, new_value=None):
+        if not self.dirty:
+            QtCore.QTimer.singleShot(0, self.flush)
+
+        self.dirty.setdefault(state, set()).add(attribute)
+
+    @QtCore.Slot()
+    def flush(self):
+        dirty = self.dirty
+        self.dirty = {}
+
+        if dirty:
+            registry = metrics()
+            registry.increment("render.dirty_states", len(dirty))
+            with registry.timer("render.flush"):
+                self.flushed.emit(dirty)
+                self._notify(dirty)
+
+    def _notify(self, dirty):
+        if len(self.callbacks) < len(dirty):
+            states = [state for state in self.callbacks if state in dirty]
+        else:
+            states = [state for state in dirty if state in self.callbacks]
+
+        for state in states:
+            for callback in list(self.callbacks.get(state, ())):
+                callback(dirty[state])
+
+
+_scheduler = None
+
+
+def scheduler():
+    """
+    Return the scheduler shared by all views of the application.
+    """
+    global _scheduler
+
+    if _scheduler is None:
+        _scheduler = RepaintScheduler()
+
+    return _scheduler
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""
+Requests and pages of the initiative server in :mod:`rollserver`.
+
+Players choose their character by the id the server gave to the request
+for its roll, e.g. ``GET /roll?id=3&value=4&token=...``. Ids are never
+reused, so a form left open from an earlier round cannot submit a roll for
+somebody else. Every request has to carry the token of the server, which
+is only shown to the GM, so other devices on the network cannot submit
+rolls or read the timers. The parsing is kept apart from Qt, so it can be
+tested without it.
+"""
+import binascii
+import cgi
+import hmac
+import os
+
+try:
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from urlparse import parse_qs, urlparse
+
+PAGE = u"""<html>
+<head><title>Initiative</title></head>
+<body>
+<p>%(message)s</p>
+<form action="/roll">
+<input name="token" type="hidden" value="%(token)s">
+<select name="id">%(options)s</select>
+<input name="value" type="number" min="1" max="6" value="1">
+<input type="submit" value="Roll">
+</form>
+</body>
+</html>
+"""
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+
+    return value
+
+
+def new_token():
+    """
+    Return a random token for the links handed to the players.
+    """
+    return binascii.hexlify(os.urandom(8)).decode("ascii")
+
+
+def _query(request_line):
+    # path and query of a GET request, None for all other requests
+    parts = request_line.split()
+    if len(parts) < 2 or parts[0] != "GET":
+        return None
+
+    url = urlparse(parts[1])
+
+    return url.path, parse_qs(url.query)
+
+
+def is_authorized(request_line, token):
+    """
+    Whether a request carries the token of the server.
+    """
+    request = _query(request_line)
+    if request is None:
+        return False
+
+    sent = request[1].get("token", [""])[0]
+
+    return hmac.compare_digest(_text(sent).encode("utf-8"),
+                               _text(token).encode("utf-8"))
+
+
+def parse_roll_request(request_line):
+    """
+    Extract id and value from a request line like
+    ``GET /roll?id=3&value=4 HTTP/1.1``.
+
+    Returns None for all other requests.
+    """
+    request = _query(request_line)
+    if request is None or request[0] != "/roll":
+        return None
+
+    query = request[1]
+    try:
+        roll_id = int(query["id"][0])
+        value = int(query["value"][0])
+    except (KeyError, ValueError):
+        return None
+
+    return roll_id, value
+
+
+def is_metrics_request(request_line):
+    request = _query(request_line)
+
+    return request is not None and request[0] == "/metrics"
+
+
+def page(message, options, token):
+    """
+    Return the UTF-8 encoded form for the rolls.
+
+    :param message: text shown above the form
+    :param options: pairs of id and name of the characters to choose from
+    :param token: token of the server, submitted along with the rolls
+    """
+    options = u"".join(u'<option value="%i">%s</option>' %
+                       (roll_id, cgi.escape(_text(name)))
+                       for roll_id, name in options)
+
+    return (PAGE % {"message": cgi.escape(_text(message)),
+                    "options": options,
+                    "token": cgi.escape(_text(token), quote=True)}
+            ).encode("utf-8")
+
+
+def response(body, content_type, status="200 OK"):
+    """
+    Return a complete HTTP response closing the connection.
+
+    :param bytes body: encoded body
+    """
+    return (b"HTTP/1.0 %s\r\n"
+            b"Content-Type: %s\r\n"
+            b"Content-Length: %i\r\n"
+            b"Connection: close\r\n\r\n" % (status, content_type, len(body)) +
+            body)
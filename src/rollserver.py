@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Collection of the players' initiative rolls over the local network.
+
+The :class:`InitiativeServer` is a minimal HTTP server running inside the Qt
+event loop. Players open its page on their own devices (or a second screen)
+and submit their rolls, see :mod:`rollrequest`. The page is only served
+with the token of the server, use :meth:`InitiativeServer.url` for the
+link handed to the players.
+
+``GET /metrics?token=...`` returns the timers of :mod:`metrics` in the text
+format of Prometheus if the server was created with ``serve_metrics``.
+"""
+import itertools
+
+from PySide import QtCore, QtNetwork
+
+from metrics import metrics
+from rollrequest import (is_authorized, is_metrics_request, new_token, page,
+                         parse_roll_request, response)
+
+DEFAULT_PORT = 8765
+# requests are short, clients sending more are disconnected
+MAX_REQUEST_SIZE = 8192
+
+
+class InitiativeServer(QtNetwork.QTcpServer):
+    """
+    Receive initiative rolls for the characters that are requested.
+
+    :param bool serve_metrics: answer ``GET /metrics``, every device that
+        can reach the server can read the timers then
+
+    :attr:`roll_received` is emitted with the state and the roll for each
+    valid submission. Requests without the server's :attr:`token` are
+    refused. All sockets are handled asynchronously, a slow client
+    never blocks the GM's interface.
+    """
+    roll_received = QtCore.Signal(object, int)
+
+    def __init__(self, parent=None, serve_metrics=False):
+        super(InitiativeServer, self).__init__(parent)
+        self.serve_metrics = serve_metrics
+        self.token = new_token()
+
+        self.pending = {}
+        self.buffers = {}
+        self.ids = itertools.count(1)
+
+        self.newConnection.connect(self.on_new_connection)
+
+    def start(self, port=DEFAULT_PORT, address=QtNetwork.QHostAddress.Any):
+        """
+        Listen for the players' devices.
+
+        :param address: address to listen on, all interfaces by default
+        """
+        return self.listen(address, port)
+
+    def url(self, host):
+        """
+        Link to the page of the rolls including the token.
+        """
+        return "http://%s:%i/?token=%s" % (host, self.serverPort(),
+                                           self.token)
+
+    def cancel(self, state):
+        """
+        Stop waiting for the roll of a state, e.g. entered by the GM.
+        """
+        for roll_id, pending in list(self.pending.items()):
+            if pending is state:
+                del self.pending[roll_id]
+
+    def request_rolls(self, states):
+        """
+        Wait for the rolls of the given states, replacing earlier requests.
+        """
+        self.pending = dict((next(self.ids), state) for state in states)
+
+    @QtCore.Slot()
+    def on_new_connection(self):
+        while self.hasPendingConnections():
+            socket = self.nextPendingConnection()
+            self.buffers[socket] = b""
+            socket.readyRead.connect(
+                lambda socket=socket: self.on_ready_read(socket))
+            socket.disconnected.connect(
+                lambda socket=socket: self.on_disconnected(socket))
+
+    def on_disconnected(self, socket):
+        self.buffers.pop(socket, None)
+        socket.deleteLater()
+
+    def on_ready_read(self, socket):
+        data = self.buffers.get(socket, b"") + bytes(socket.readAll())
+        if b"\r\n\r\n" not in data and b"\n\n" not in data:
+            if len(data) > MAX_REQUEST_SIZE:
+                self.buffers.pop(socket, None)
+                self.send(socket, response(
+                    b"", b"text/plain",
+                    b"431 Request Header Fields Too Large"))
+            else:
+                self.buffers[socket] = data
+            return
+        self.buffers[socket] = b""
+
+        request_line = data.splitlines()[0]
+        if not is_authorized(request_line, self.token):
+            self.send(socket, response(b"", b"text/plain", b"403 Forbidden"))
+            return
+
+        if self.serve_metrics and is_metrics_request(request_line):
+            self.send(socket, response(metrics().to_prometheus(),
+                                       b"text/plain; version=0.0.4"))
+            return
+
+        request = parse_roll_request(request_line)
+        message = u"Waiting for initiative rolls."
+        if request is not None:
+            roll_id, value = request
+            if roll_id not in self.pending:
+                message = u"No roll requested for this character."
+            elif not 1 <= value <= 6:
+                message = u"%i is not a result of a d6." % value
+            else:
+                state = self.pending.pop(roll_id)
+                self.roll_received.emit(state, value)
+                message = u"%s rolled %i." % (state.name, value)
+
+        options = sorted(self.pending.items(),
+                         key=lambda item: item[1].name)
+        self.send(socket, response(page(message, options, self.token),
+                                   b"text/html; charset=utf-8"))
+
+    def send(self, socket, data):
+        socket.write(data)
+        socket.disconnectFromHost()
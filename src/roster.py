@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Columnar storage of a battle roster.
+
+Every trait of the combatants is kept in a NumPy array so that a new round
+can be rolled for the whole roster at once.
+"""
+import numpy as np
+
+from ruletable import rules_table
+
+COLUMNS = ("dexterity", "wits", "base_initiative", "order",
+           "hps", "base_hps", "base_defense", "defense_modifier",
+           "temporary_defense_modifier", "next_round_defense_modifier",
+           "current_stance", "conditions", "effect_defense_modifier",
+           "effect_goal_modifier")
+
+
+def _column_property(name):
+    """
+    Create a property that returns the used part of a column.
+    """
+    def getter(self):
+        return self._columns[name][:self._size]
+
+    return property(getter)
+
+
+class Roster(object):
+    """
+    Array backed store of combatant states.
+
+    :param states: iterable of :class:`state.CombatantState`
+
+    The states are kept as well, so that results of a batched operation can
+    be written back to them with :meth:`push`. The roster observes its
+    states, changes done to single states through their methods update the
+    columns right away. Changes made without notifying the observers can be
+    collected with :meth:`pull`. The values the states hold are kept in a
+    second set of columns, so :meth:`push` only writes the rows that differ.
+
+    Stances and conditions are resolved through the current
+    :class:`ruletable.RulesTable` for all rows at once.
+    """
+    def __init__(self, states=()):
+        self.states = []
+        self.rows = {}
+
+        self._size = 0
+        self.goal_modifier = np.zeros(0, dtype=np.int32)
+        self._columns = {}
+        self._synced = {}
+        self._pushing = None
+        self._pushed_name = None
+        for name in COLUMNS:
+            self._columns[name] = np.zeros(8, dtype=np.int32)
+            self._synced[name] = np.zeros(8, dtype=np.int32)
+        self._player_controlled = np.zeros(8, dtype=bool)
+
+        self.extend(states)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __contains__(self, state):
+        return state in self.rows
+
+    @property
+    def player_controlled(self):
+        return self._player_controlled[:self._size]
+
+    def _reserve(self, size):
+        capacity = len(self._player_controlled)
+        if size <= capacity:
+            return
+
+        while capacity < size:
+            capacity *= 2
+
+        for columns in (self._columns, self._synced):
+            for name, column in columns.items():
+                columns[name] = np.resize(column, capacity)
+        self._player_controlled = np.resize(self._player_controlled, capacity)
+
+    def append(self, state):
+        self.extend([state])
+
+    def extend(self, states):
+        states = list(states)
+        start = self._size
+        stop = start + len(states)
+        self._reserve(stop)
+
+        for name, column in self._columns.items():
+            column[start:stop] = [getattr(state, name) for state in states]
+            self._synced[name][start:stop] = column[start:stop]
+        self._player_controlled[start:stop] = \
+            [state.player_controlled for state in states]
+
+        for row, state in enumerate(states, start):
+            self.rows[state] = row
+            state.add_observer(self.on_changed)
+        self.states.extend(states)
+        self._size = stop
+
+    def on_changed(self, state, attribute, old_value, new_value):
+        if state is self._pushing and attribute == self._pushed_name:
+            # the value comes from the columns, see push
+            return
+
+        column = self._columns.get(attribute)
+        if column is not None:
+            row = self.rows[state]
+            column[row] = new_value
+            self._synced[attribute][row] = new_value
+
+    def remove(self, state):
+        """
+        Remove a state by moving the last row into its place.
+        """
+        row = self.rows.pop(state)
+        state.remove_observer(self.on_changed)
+        last = self._size - 1
+
+        if row != last:
+            for columns in (self._columns, self._synced):
+                for column in columns.values():
+                    column[row] = column[last]
+            self._player_controlled[row] = self._player_controlled[last]
+
+            moved = self.states[last]
+            self.states[row] = moved
+            self.rows[moved] = row
+
+        self.states.pop()
+        self._size = last
+
+    def pull(self, *names):
+        """
+        Copy the given attributes of all states into their columns, all of
+        them if no names are given.
+        """
+        for name in names or COLUMNS:
+            self._columns[name][:self._size] = \
+                [getattr(state, name) for state in self.states]
+            self._synced[name][:self._size] = self._columns[name][:self._size]
+
+    def push(self, *names):
+        """
+        Write the given columns back into the states.
+
+        The values are set through the states, so their observers are
+        notified of every value that changed. Rows holding the value of
+        their state already are skipped.
+        """
+        for name in names:
+            column = self._columns[name][:self._size]
+            synced = self._synced[name][:self._size]
+            rows = np.flatnonzero(column != synced)
+            synced[rows] = column[rows]
+            self._pushed_name = name
+            try:
+                for row, value in zip(rows.tolist(), column[rows].tolist()):
+                    state = self._pushing = self.states[row]
+                    state._set(name, value)
+            finally:
+                self._pushing = self._pushed_name = None
+        self._pushed_name = None
+
+    def current_defense(self):
+        return (self.base_defense +
+                self.defense_modifier +
+                self.temporary_defense_modifier +
+                self.effect_defense_modifier +
+                rules_table().condition_defense_array[self.conditions])
+
+    def next_round(self, initiative_rolls=None, random_state=None):
+        """
+        Roll initiative and activate the chosen stances for all combatants.
+
+        :param dict initiative_rolls: known results of the d6 for some
+            states, e.g. the ones rolled by the players
+        :param random_state: numpy.random.RandomState to draw the rolls from
+
+        Returns the array of rolls that have been used.
+        """
+        if random_state is None:
+            random_state = np.random
+
+        rolls = random_state.randint(1, 7, size=self._size)
+        if initiative_rolls:
+            for state, roll in initiative_rolls.items():
+                rolls[self.rows[state]] = roll
+
+        np.add(self.base_initiative, rolls, out=self.order)
+
+        defense, goal = rules_table().round_modifiers(self.current_stance,
+                                                      self.conditions)
+        self.goal_modifier = goal + self.effect_goal_modifier
+        self.temporary_defense_modifier[:] = defense
+        self.next_round_defense_modifier[:] = defense
+
+        return rolls
+
+
+for _name in COLUMNS:
+    setattr(Roster, _name, _column_property(_name))
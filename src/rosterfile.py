@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Files of character pools and encounters.
+
+The binary format consists of a header, fixed-width records of the traits
+and a table of all strings::
+
+    header:  magic "FSGA", version, number of records, offset of the strings
+    record:  kind, dexterity, wits, hps, base_hps, defense,
+             defense_modifier, offset and length of name, faction and notes
+    strings: UTF-8 encoded, every distinct string stored once
+
+A :class:`RosterFile` maps the file into memory. Opening it reads only the
+header, the traits of all records can be searched as a NumPy array and a
+state is created only for the records that are actually used. Names are
+sorted once on the first search by name, see :meth:`RosterFile.by_name`.
+
+For interchange the states can be streamed from and to CSV files and JSON
+Lines files, i.e. one JSON object per line.
+"""
+import bisect
+import csv
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from state import NPCState, PCState, SquadState
+
+MAGIC = b"FSGA"
+VERSION = 1
+HEADER = struct.Struct("<4sHIQ")
+RECORD = struct.Struct("<B6hIHIHIH")
+# the same record as NumPy type for searching the traits
+RECORD_DTYPE = np.dtype([("kind", "u1"), ("dexterity", "<i2"),
+                         ("wits", "<i2"), ("hps", "<i2"),
+                         ("base_hps", "<i2"), ("base_defense", "<i2"),
+                         ("defense_modifier", "<i2"),
+                         ("name", "<u4"), ("name_length", "<u2"),
+                         ("faction", "<u4"), ("faction_length", "<u2"),
+                         ("notes", "<u4"), ("notes_length", "<u2")])
+
+NPC = 0
+PC = 1
+STATE_CLASSES = {NPC: NPCState, PC: PCState}
+
+# columns of the interchange formats
+FIELDS = ("type", "name", "faction", "dexterity", "wits", "hps", "base_hps",
+          "defense", "defense_modifier", "notes")
+KINDS = {"NPC": NPC, "PC": PC}
+
+
+def _encode(text):
+    if isinstance(text, unicode):
+        return text.encode("utf-8")
+
+    return text
+
+
+def _members(states):
+    # squads are saved as their members
+    for state in states:
+        if isinstance(state, SquadState):
+            for member in state.expand():
+                yield member
+        else:
+            yield state
+
+
+def write_roster(path, states):
+    """
+    Write states to a binary roster file.
+
+    :param states: iterable of :class:`state.CombatantState`, consumed one
+        at a time, squads are written as their members
+
+    Returns the number of records written.
+    """
+    strings = {}
+    table = []
+    table_size = [0]
+
+    def string(text):
+        text = _encode(text)
+        try:
+            return strings[text]
+        except KeyError:
+            location = (table_size[0], len(text))
+            strings[text] = location
+            table.append(text)
+            table_size[0] += len(text)
+
+            return location
+
+    count = 0
+    with open(path, "wb") as output:
+        output.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for state in _members(states):
+            kind = PC if state.player_controlled else NPC
+            output.write(RECORD.pack(
+                kind, state.dexterity, state.wits, state.hps, state.base_hps,
+                state.base_defense, state.defense_modifier,
+                *(string(state.name) + string(state.faction) +
+                  string(state.notes))))
+            count += 1
+
+        offset = HEADER.size + count * RECORD.size
+        output.write(b"".join(table))
+        output.seek(0)
+        output.write(HEADER.pack(MAGIC, VERSION, count, offset))
+
+    return count
+
+
+class RosterFile(object):
+    """
+    Memory mapped roster file.
+
+    :param str path: file written by :func:`write_roster`
+
+    ``roster_file[index]`` creates the state of a record, the same object is
+    returned for later requests. :attr:`records` is a NumPy view of all
+    records for searching, e.g.
+    ``np.flatnonzero(roster_file.records["dexterity"] >= 6)``.
+    """
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+
+        magic, version, self._count, self._strings = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a roster file" % path)
+
+        self.records = np.frombuffer(self._map, dtype=RECORD_DTYPE,
+                                     count=self._count, offset=HEADER.size)
+        self._states = {}
+        self._name_order = None
+        self._name_ranks = None
+        self._sorted_names = None
+        self._factions = None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+
+        return self._map[start:start + length].decode("utf-8")
+
+    def name(self, index):
+        """
+        Name of a record without creating its state.
+        """
+        record = self.records[index]
+
+        return self._string(record["name"], record["name_length"])
+
+    def faction(self, index):
+        """
+        Faction of a record without creating its state.
+        """
+        record = self.records[index]
+
+        return self._string(record["faction"], record["faction_length"])
+
+    def _sort_names(self):
+        names = [self._string(offset, length) for offset, length in
+                 zip(self.records["name"].tolist(),
+                     self.records["name_length"].tolist())]
+        self._name_order = np.array(
+            sorted(range(self._count), key=names.__getitem__),
+            dtype=np.intp)
+        self._name_ranks = np.empty(self._count, dtype=np.intp)
+        self._name_ranks[self._name_order] = np.arange(self._count)
+        # the sorted names are bisected, the order only needs indexes
+        self._sorted_names = [names[index] for index in self._name_order]
+
+    def name_range(self, prefix=u""):
+        """
+        Start and stop of the names starting with prefix in the order of
+        :meth:`by_name`.
+
+        All names are decoded and sorted on the first call, afterwards a
+        prefix is found by bisecting the order.
+        """
+        if self._name_order is None:
+            self._sort_names()
+
+        if not prefix:
+            return 0, self._count
+
+        start = bisect.bisect_left(self._sorted_names, prefix)
+        # every name with the prefix sorts before the prefix followed by
+        # the largest character
+        stop = bisect.bisect_left(self._sorted_names, prefix + u"\uffff",
+                                  start)
+
+        return start, stop
+
+    def by_name(self, prefix=u""):
+        """
+        Indexes of the records whose names start with prefix, in the order
+        of the names.
+        """
+        start, stop = self.name_range(prefix)
+
+        return self._name_order[start:stop]
+
+    def name_ranks(self, indexes):
+        """
+        Places of the given records in the order of :meth:`by_name`.
+        """
+        if self._name_order is None:
+            self._sort_names()
+
+        return self._name_ranks[indexes]
+
+    def faction_offset(self, faction):
+        """
+        Offset of a faction in the string table, which all records of the
+        faction share as every distinct string is stored once, or None for
+        a faction without records.
+        """
+        if self._factions is None:
+            offsets, first = np.unique(self.records["faction"],
+                                       return_index=True)
+            self._factions = dict((self.faction(index), offset)
+                                  for offset, index in zip(offsets, first))
+
+        return self._factions.get(faction)
+
+    def with_faction(self, faction):
+        """
+        Boolean mask of the records belonging to a faction.
+        """
+        offset = self.faction_offset(faction)
+        if offset is None:
+            return np.zeros(self._count, dtype=bool)
+
+        return self.records["faction"] == offset
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("record index out of range")
+
+        try:
+            return self._states[index]
+        except KeyError:
+            pass
+
+        (kind, dexterity, wits, hps, base_hps, defense, defense_modifier,
+         name, name_length, faction, faction_length, notes, notes_length) = \
+            RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+
+        state = STATE_CLASSES[kind](self._string(name, name_length),
+                                    dexterity, wits, base_hps, defense,
+                                    defense_modifier,
+                                    self._string(faction, faction_length),
+                                    self._string(notes, notes_length))
+        state.hps = hps
+        self._states[index] = state
+
+        return state
+
+    def close(self):
+        self.records = None
+        self._map.close()
+        self._file.close()
+
+
+def _row(state):
+    return {"type": "PC" if state.player_controlled else "NPC",
+            "name": state.name, "faction": state.faction,
+            "dexterity": state.dexterity, "wits": state.wits,
+            "hps": state.hps, "base_hps": state.base_hps,
+            "defense": state.base_defense,
+            "defense_modifier": state.defense_modifier,
+            "notes": state.notes}
+
+
+def _state(row):
+    state = STATE_CLASSES[KINDS[row.get("type", "NPC")]](
+        row["name"], int(row["dexterity"]), int(row["wits"]),
+        int(row.get("base_hps") or row["hps"]), int(row["defense"]),
+        int(row.get("defense_modifier") or 0), row.get("faction") or "",
+        row.get("notes") or "")
+    state.hps = int(row.get("hps") or state.base_hps)
+
+    return state
+
+
+def export_csv(states, output):
+    """
+    Write states to an open CSV file one at a time.
+    """
+    writer = csv.DictWriter(output, FIELDS)
+    writer.writeheader()
+    for state in _members(states):
+        writer.writerow(dict((key, _encode(value))
+                             for key, value in _row(state).items()))
+
+
+def import_csv(input):
+    """
+    Read states from an open CSV file, yielding them one at a time.
+
+    Only ``name``, ``dexterity``, ``wits``, ``hps`` and ``defense`` are
+    required columns.
+    """
+    for row in csv.DictReader(input):
+        yield _state(dict((key, value.decode("utf-8"))
+                          for key, value in row.items()
+                          if value is not None))
+
+
+def export_json(states, output):
+    """
+    Write states to an open JSON Lines file one at a time.
+    """
+    for state in _members(states):
+        output.write(json.dumps(_row(state)) + "\n")
+
+
+def import_json(input):
+    """
+    Read states from an open JSON Lines file, yielding them one at a time.
+    """
+    for line in input:
+        if line.strip():
+            yield _state(json.loads(line))
+
+
+def is_roster(path):
+    """
+    Whether a path is a binary roster file rather than CSV or JSON Lines.
+    """
+    return not (path.endswith(".csv") or path.endswith(".jsonl") or
+                path.endswith(".json"))
+
+
+def stream(path):
+    """
+    Read the states of a roster, CSV or JSON Lines file by its extension,
+    yielding them one at a time.
+    """
+    if path.endswith(".csv"):
+        with open(path, "rb") as input:
+            for state in import_csv(input):
+                yield state
+    elif path.endswith(".jsonl") or path.endswith(".json"):
+        with open(path) as input:
+            for state in import_json(input):
+                yield state
+    else:
+        roster_file = RosterFile(path)
+        try:
+            for index in range(len(roster_file)):
+                yield roster_file[index]
+        finally:
+            roster_file.close()
+
+
+def count(path):
+    """
+    Number of states in a file, None if it is only known after reading it.
+    """
+    if not is_roster(path):
+        return None
+
+    with open(path, "rb") as input:
+        magic, version, records, strings = HEADER.unpack(
+            input.read(HEADER.size))
+
+    return records
+
+
+def load(path):
+    """
+    Read all states of a roster, CSV or JSON Lines file by its extension.
+    """
+    return list(stream(path))
+
+
+def save(path, states):
+    """
+    Write states to a roster, CSV or JSON Lines file by its extension.
+    """
+    if path.endswith(".csv"):
+        with open(path, "wb") as output:
+            export_csv(states, output)
+    elif path.endswith(".jsonl") or path.endswith(".json"):
+        with open(path, "w") as output:
+            export_json(states, output)
+    else:
+        write_roster(path, states)
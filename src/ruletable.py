@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Data driven table of stances and conditions.
+
+The rules are given as a dict (or a JSON file with house rules) like::
+
+    {
+        "stances": [
+            {"name": "neutral"},
+            {"name": "aggressive", "defense": -2, "goal": 4,
+             "pull_vp": false},
+            ...
+        ],
+        "conditions": [
+            {"name": "running", "defense": -2},
+            ...
+        ]
+    }
+
+Every stance may define ``defense``, ``goal`` and ``damage_dice`` modifiers,
+whether the combatant may ``attack`` and ``pull_vp`` to slip under shields,
+and whether it may only ``move_only`` during its turn. Conditions may define
+``defense`` and ``goal`` modifiers and are stored per combatant as bit mask.
+
+The table is compiled into lookup arrays once, so resolving the modifiers of
+a combatant costs the same no matter how many rules there are.
+"""
+import json
+
+import numpy as np
+
+DEFAULT_RULES = {
+    "stances": [
+        {"name": "neutral"},
+        {"name": "aggressive", "defense": -2, "goal": 4, "pull_vp": False},
+        {"name": "defensive", "defense": 2, "goal": -4},
+        {"name": "total defense", "defense": 4, "attack": False,
+         "move_only": True},
+        {"name": "aggressive (damage)", "defense": -2, "damage_dice": 2,
+         "pull_vp": False},
+    ],
+    "conditions": [
+        {"name": "running", "defense": -2},
+    ],
+}
+
+STANCE_COLUMNS = (("defense", 0), ("goal", 0), ("damage_dice", 0),
+                  ("attack", True), ("pull_vp", True), ("move_only", False))
+CONDITION_COLUMNS = (("defense", 0), ("goal", 0))
+
+# conditions are combined in lookup tables over all bit masks
+MAX_CONDITIONS = 12
+
+
+class RulesTable(object):
+    """
+    Stances and conditions compiled into lookup tables.
+
+    :param dict rules: rules in the format described in the module
+
+    For a stance index ``stance`` the modifiers are available as tuples,
+    e.g. ``table.defense[stance]``, and as NumPy arrays for whole rosters,
+    e.g. ``table.defense_array[stances]``. Modifiers of conditions are
+    looked up by bit mask in ``table.condition_defense`` and
+    ``table.condition_goal`` and their ``_array`` counterparts.
+    """
+    def __init__(self, rules):
+        stances = rules["stances"]
+        conditions = rules.get("conditions", [])
+
+        if not stances:
+            raise ValueError("At least one stance is required")
+        if len(conditions) > MAX_CONDITIONS:
+            raise ValueError("At most %i conditions are supported" %
+                             MAX_CONDITIONS)
+
+        self.stance_names = [stance["name"] for stance in stances]
+        for column, default in STANCE_COLUMNS:
+            values = [stance.get(column, default) for stance in stances]
+            setattr(self, column, tuple(values))
+            setattr(self, column + "_array", np.array(values))
+
+        self.condition_names = [condition["name"]
+                                for condition in conditions]
+        masks = np.arange(2 ** len(conditions))
+        bits = (masks[:, np.newaxis] >> np.arange(len(conditions))) & 1
+        for column, default in CONDITION_COLUMNS:
+            values = np.array([condition.get(column, default)
+                               for condition in conditions], dtype=int)
+            by_mask = bits.dot(values).astype(int)
+            setattr(self, "condition_" + column, tuple(by_mask.tolist()))
+            setattr(self, "condition_" + column + "_array", by_mask)
+
+    def stance_index(self, name):
+        return self.stance_names.index(name)
+
+    def condition_bit(self, name):
+        return 1 << self.condition_names.index(name)
+
+    def round_modifiers(self, stances, conditions):
+        """
+        Modifiers of a whole roster at the beginning of a round.
+
+        :param stances: array of stance indices
+        :param conditions: array of condition bit masks
+
+        Returns the defense modifiers of the stances, which replace the
+        temporary defense modifiers, and the combined goal modifiers of
+        stances and conditions.
+        """
+        defense = self.defense_array[stances]
+        goal = (self.goal_array[stances] +
+                self.condition_goal_array[conditions])
+
+        return defense, goal
+
+
+_rules_table = None
+
+
+def rules_table():
+    """
+    Return the rules table currently in use.
+    """
+    global _rules_table
+
+    if _rules_table is None:
+        _rules_table = RulesTable(DEFAULT_RULES)
+
+    return _rules_table
+
+
+def set_rules_table(table):
+    global _rules_table
+
+    _rules_table = table
+
+
+def load_rules(path):
+    """
+    Load house rules from a JSON file and use them from now on.
+    """
+    with open(path) as rules_file:
+        table = RulesTable(json.load(rules_file))
+
+    set_rules_table(table)
+
+    return table
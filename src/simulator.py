@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Monte Carlo simulation of encounters between a party and an NPC roster.
+
+The simulation uses the rules of :mod:`state`, :mod:`ruletable` and
+:mod:`dice`:
+
+    * every round each combatant acts in the order of dexterity + wits + d6,
+      ties are resolved as in :class:`initiative.InitiativeIndex`
+    * the stance chosen for the battle, conditions and effects of a
+      combatant modify its defense and goal number and combatants in a
+      stance without attacks do not attack
+    * an attack on a random living opponent is a goal roll of dexterity +
+      wits against the target's defense, resolved with
+      :class:`dice.Resolver` including the damage effect dice of the weapon
+      and the stance
+    * combatants drop out of the battle at zero hit points
+
+Battles are split into chunks with their own seeds, so a simulation with a
+given seed gives the same result independent of the number of processes.
+"""
+import collections
+import multiprocessing
+import random
+
+import numpy as np
+
+from dice import Resolver
+from ruletable import rules_table
+from state import SquadState
+
+SimulationResult = collections.namedtuple(
+    "SimulationResult",
+    ["battles", "win_probability", "draw_probability",
+     "expected_rounds", "expected_pc_hp_loss", "seed"])
+
+
+def _combatants(states):
+    # every standing member of a squad fights on its own
+    for state in states:
+        if isinstance(state, SquadState):
+            for member in state.standing():
+                yield state.member_state(member)
+        else:
+            yield state
+
+
+def combatant_stats(state, damage_dice=2):
+    """
+    Compact, picklable description of a combatant for the simulation.
+
+    :param int damage_dice: damage effect dice of the combatant's weapon,
+        the stance may add more
+
+    The defense is the one of the chosen stance as activated by
+    :meth:`state.CombatantState.next_round`, temporary modifiers of the
+    current round do not last into the battle. A squad would be described as
+    a single combatant with the hit points of all members, :func:`simulate`
+    describes each standing member instead.
+    """
+    table = rules_table()
+    stance = state.current_stance
+
+    return (state.base_initiative,
+            state.dexterity,
+            state.hps,
+            (state.base_defense +
+             state.defense_modifier +
+             state.next_round_defense_modifier +
+             state.effect_defense_modifier +
+             table.condition_defense[state.conditions]),
+            state.dexterity + state.wits + state.goal_modifier(),
+            table.attack[stance],
+            damage_dice + table.damage_dice[stance],
+            table.pull_vp[stance])
+
+
+def fight(pcs, npcs, rng, resolver, max_rounds=50):
+    """
+    Fight a single battle.
+
+    :param list pcs: :func:`combatant_stats` of the party
+    :param list npcs: :func:`combatant_stats` of the opponents
+    :param rng: random.Random choosing the targets
+    :param resolver: :class:`dice.Resolver` rolling initiative and attacks
+    :param int max_rounds: rounds after which the battle counts as a draw
+
+    Returns the winning side (1 for the party, -1 for the NPCs, 0 for a
+    draw), the number of rounds and the hit points lost by the party.
+    """
+    combatants = list(pcs) + list(npcs)
+    hps = [stats[2] for stats in combatants]
+    sides = [1] * len(pcs) + [-1] * len(npcs)
+    living = {1: list(range(len(pcs))),
+              -1: list(range(len(pcs), len(combatants)))}
+
+    rounds = 0
+    while living[1] and living[-1] and rounds < max_rounds:
+        rounds += 1
+
+        order = sorted(
+            (-(stats[0] + resolver.d6.roll()), -stats[1], idx)
+            for idx, stats in enumerate(combatants) if hps[idx] > 0)
+
+        for key in order:
+            attacker = key[2]
+            if hps[attacker] <= 0 or not combatants[attacker][5]:
+                continue
+
+            opponents = living[-sides[attacker]]
+            if not opponents:
+                break
+
+            stats = combatants[attacker]
+            target = rng.choice(opponents)
+            hps[target] -= resolver.attack(stats[4], -combatants[target][3],
+                                           stats[6], pull_vp=stats[7])
+            if hps[target] <= 0:
+                opponents.remove(target)
+
+    if not living[-1] and living[1]:
+        winner = 1
+    elif not living[1]:
+        winner = -1
+    else:
+        winner = 0
+
+    pc_hp_loss = sum(stats[2] - max(hps[idx], 0)
+                     for idx, stats in enumerate(pcs))
+
+    return winner, rounds, pc_hp_loss
+
+
+def _simulate_chunk(task):
+    pcs, npcs, battles, seed, max_rounds = task
+
+    rng = random.Random(seed)
+    resolver = Resolver(np.random.RandomState(seed % 2 ** 32))
+    wins = draws = rounds = pc_hp_loss = 0
+    for idx in range(battles):
+        result = fight(pcs, npcs, rng, resolver, max_rounds)
+        if result[0] == 1:
+            wins += 1
+        elif result[0] == 0:
+            draws += 1
+        rounds += result[1]
+        pc_hp_loss += result[2]
+
+    return wins, draws, rounds, pc_hp_loss
+
+
+def simulate(pcs, npcs, battles=1000, seed=None, processes=None,
+             chunk_size=250, damage_dice=2, max_rounds=50):
+    """
+    Fight an encounter many times and summarize the results.
+
+    :param list pcs: :class:`state.CombatantState` of the party
+    :param list npcs: :class:`state.CombatantState` of the opponents,
+        squads fight as their standing members
+    :param int battles: number of simulated battles
+    :param int seed: seed for reproducible results, a random one is used and
+        reported in the result if not given
+    :param int processes: size of the process pool, all cores if not given
+        and no pool at all for 1
+    :param int chunk_size: battles simulated with the same seed
+    :param int damage_dice: damage effect dice of the weapons, added to
+        those of each combatant's stance
+
+    Returns a :class:`SimulationResult`.
+    """
+    if seed is None:
+        seed = random.SystemRandom().randint(0, 2 ** 31)
+
+    pc_stats = [combatant_stats(state, damage_dice)
+                for state in _combatants(pcs)]
+    npc_stats = [combatant_stats(state, damage_dice)
+                 for state in _combatants(npcs)]
+
+    tasks = []
+    for chunk, start in enumerate(range(0, battles, chunk_size)):
+        tasks.append((pc_stats, npc_stats,
+                      min(chunk_size, battles - start),
+                      seed * 1000003 + chunk,
+                      max_rounds))
+
+    if processes == 1:
+        results = [_simulate_chunk(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_simulate_chunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    wins, draws, rounds, pc_hp_loss = ([sum(values)
+                                        for values in zip(*results)] or
+                                       [0, 0, 0, 0])
+    battles = float(max(battles, 1))
+
+    return SimulationResult(int(battles),
+                            wins / battles,
+                            draws / battles,
+                            rounds / battles,
+                            pc_hp_loss / battles,
+                            seed)
+
+
+if __name__ == "__main__":
+    from state import NPCState, PCState
+
+    party = [
+        PCState("Nader", 3, 8, 9, 1),
+        PCState("Tristan", 6, 5, 11, 1),
+        PCState("Hieronymus", 7, 6, 8, 1),
+        PCState("Frederik", 6, 9, 10, 1),
+    ]
+    opponents = [NPCState("Mook %i" % i, 6, 4, 10, 1) for i in range(7)]
+
+    print simulate(party, opponents, battles=10000)
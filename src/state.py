@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Plain combatant state that does not depend on Qt.
+
+The widgets in :mod:`views` are bound to these objects, so the rules
+can run headless in simulations and tests.
+"""
+import collections
+import random
+from array import array
+
+from ruletable import rules_table
+
+_HP_BARS = {}
+
+
+def hp_bar(hps, base_hps):
+    """
+    Text representation of the hit points, e.g. ``ooo__`` for 3 of 5.
+
+    The strings are cached since only few combinations occur in a battle.
+    """
+    key = (hps, base_hps)
+    try:
+        return _HP_BARS[key]
+    except KeyError:
+        text = "o" * hps + "_" * (base_hps - max(hps, 0))
+        _HP_BARS[key] = text
+
+        return text
+
+
+class CombatantState(object):
+    """
+    State of a single battle participant.
+
+    :param str name: Identifier for the character
+    :param int dexterity: dexterity trait
+    :param int wits: wits trait
+    :param int hps: hit points at the beginning of the battle
+    :param int defense: characters base defense
+    :param int defense_modifier: modifiers that might vanish during battle
+    :param str faction: side or group the character belongs to
+    :param str notes: free text of the GM
+
+    The class uses __slots__ so that large rosters stay small in memory.
+
+    Observers registered with :meth:`add_observer` are called as
+    ``observer(state, attribute, old_value, new_value)`` whenever one of the
+    mutating methods changes an attribute.
+    """
+    __slots__ = ("name", "dexterity", "wits", "hps", "base_hps",
+                 "base_defense", "defense_modifier",
+                 "temporary_defense_modifier", "next_round_defense_modifier",
+                 "current_stance", "conditions", "effect_defense_modifier",
+                 "effect_goal_modifier", "base_initiative", "order",
+                 "faction", "notes", "observers")
+
+    player_controlled = False
+    # attributes of subclasses that are saved and restored as well
+    extra_attributes = ()
+
+    def __init__(self,
+                 name, dexterity, wits, hps, defense,
+                 defense_modifier=0, faction="", notes=""):
+        self.observers = ()
+
+        self.name = name
+        self.dexterity = dexterity
+        self.wits = wits
+        self.hps = hps
+        self.base_defense = defense
+        self.base_hps = hps
+        self.faction = faction
+        self.notes = notes
+
+        self.defense_modifier = defense_modifier
+        self.temporary_defense_modifier = 0
+
+        self.base_initiative = self.dexterity + self.wits
+
+        self.order = self.base_initiative + random.randint(1, 6)
+
+        self.current_stance = 0
+        self.next_round_defense_modifier = rules_table().defense[0]
+        self.conditions = 0
+
+        self.effect_defense_modifier = 0
+        self.effect_goal_modifier = 0
+
+    def __repr__(self):
+        result = ("%s with %i initiative and %i hp" %
+                  (self.name, self.order, self.hps))
+
+        return result
+
+    def add_observer(self, observer):
+        if observer not in self.observers:
+            self.observers = self.observers + (observer,)
+
+    def remove_observer(self, observer):
+        self.observers = tuple(registered for registered in self.observers
+                               if registered != observer)
+
+    def _set(self, attribute, value):
+        old_value = getattr(self, attribute)
+        if old_value == value:
+            return
+
+        setattr(self, attribute, value)
+        for observer in self.observers:
+            observer(self, attribute, old_value, value)
+
+    def choose_stance(self, new_stance):
+        """
+        Set the current stance.
+
+        :param int new_stance: Index of the chosen stance in the
+            :class:`ruletable.RulesTable`, see :meth:`rules.Char.choose_stance`
+            for the rules behind the default stances.
+        """
+        self._set("current_stance", new_stance)
+        self._set("next_round_defense_modifier",
+                  rules_table().defense[new_stance])
+
+    def set_condition(self, name, active=True):
+        """
+        Activate or clear a condition of the rules table, e.g. running.
+        """
+        bit = rules_table().condition_bit(name)
+        if active:
+            self._set("conditions", self.conditions | bit)
+        else:
+            self._set("conditions", self.conditions & ~bit)
+
+    def set_defense_modifier(self, value):
+        self._set("defense_modifier", value)
+
+    def current_defense(self):
+        return (self.base_defense +
+                self.defense_modifier +
+                self.temporary_defense_modifier +
+                self.effect_defense_modifier +
+                rules_table().condition_defense[self.conditions])
+
+    def goal_modifier(self):
+        table = rules_table()
+
+        return (table.goal[self.current_stance] +
+                table.condition_goal[self.conditions] +
+                self.effect_goal_modifier)
+
+    def add_effect_modifiers(self, defense, goal):
+        """
+        Add the modifiers of a timed effect, see :mod:`effects`.
+        """
+        self._set("effect_defense_modifier",
+                  self.effect_defense_modifier + defense)
+        self._set("effect_goal_modifier", self.effect_goal_modifier + goal)
+
+    def reduce_hitpoints(self, amount=1):
+        self._set("hps", self.hps - amount)
+
+    def increase_hitpoints(self, amount=1):
+        self._set("hps", self.hps + amount)
+
+    def reduce_defense(self, amount=1):
+        self._set("temporary_defense_modifier",
+                  self.temporary_defense_modifier - amount)
+
+    def increase_defense(self, amount=1):
+        self._set("temporary_defense_modifier",
+                  self.temporary_defense_modifier + amount)
+
+    def set_initiative_roll(self, initiative_roll):
+        self._set("order", self.base_initiative + initiative_roll)
+
+    def next_round(self, initiative_roll=None):
+        """
+        Roll initiative and activate the stance chosen for this round.
+
+        :param int initiative_roll: result of the d6, rolled randomly if
+            not given
+        """
+        if initiative_roll is None:
+            initiative_roll = random.randint(1, 6)
+
+        self.set_initiative_roll(initiative_roll)
+        self._set("temporary_defense_modifier",
+                  self.next_round_defense_modifier)
+
+
+class PCState(CombatantState):
+    """
+    State of a player character. Players roll their initiative themselves.
+    """
+    __slots__ = ()
+
+    player_controlled = True
+
+
+class NPCState(CombatantState):
+    """
+    State of a non-player character.
+    """
+    __slots__ = ()
+
+
+class SquadState(NPCState):
+    """
+    Several identical non-player characters acting as a single combatant.
+
+    :param int size: number of members
+    :param members: names of the members, numbered after the squad if not
+        given
+
+    All other parameters are the ones of a single member. The members share
+    their traits, stance and initiative, only their hit points are kept
+    apart in a compact array. :attr:`hps` and :attr:`base_hps` are the sums
+    over the standing members. Members that have to act on their own are
+    taken out with :meth:`split`.
+    """
+    __slots__ = ("member_names", "_member_hps")
+
+    extra_attributes = ("member_names", "member_hps")
+
+    def __init__(self,
+                 name, dexterity, wits, hps, defense,
+                 defense_modifier=0, faction="", notes="", size=2,
+                 members=None):
+        super(SquadState, self).__init__(name, dexterity, wits, hps, defense,
+                                         defense_modifier, faction, notes)
+
+        if members is None:
+            members = ["%s %i" % (name, idx + 1) for idx in range(size)]
+        self.member_names = tuple(members)
+        self._member_hps = array("h", [hps] * len(self.member_names))
+
+        self.hps = hps * len(self.member_names)
+        self.base_hps = self.hps
+
+    @property
+    def member_hps(self):
+        return self._member_hps
+
+    @member_hps.setter
+    def member_hps(self, hps):
+        self._member_hps = array("h", hps)
+
+    @property
+    def size(self):
+        return len(self.member_names)
+
+    def __repr__(self):
+        return ("%s (%i of %i standing) with %i initiative" %
+                (self.name, len(self.standing()), self.size, self.order))
+
+    @property
+    def member_base_hps(self):
+        return self.base_hps // max(self.size, 1)
+
+    def standing(self):
+        """
+        Indices of the members with hit points left.
+        """
+        return [member for member, hps in enumerate(self._member_hps)
+                if hps > 0]
+
+    def _set_members(self, names, hps):
+        # the arrays are replaced rather than changed, so that observers
+        # get the old and the new value
+        self._set("member_names", tuple(names))
+        self._set("member_hps", hps)
+        self._set("hps", sum(max(member_hps, 0) for member_hps in hps))
+
+    def reduce_member_hitpoints(self, member, amount=1):
+        hps = array("h", self._member_hps)
+        hps[member] -= amount
+        self._set_members(self.member_names, hps)
+
+    def reduce_hitpoints(self, amount=1):
+        """
+        Damage the first member that is still standing.
+        """
+        standing = self.standing()
+        self.reduce_member_hitpoints(standing[0] if standing else 0, amount)
+
+    def increase_hitpoints(self, amount=1):
+        """
+        Heal the first wounded member.
+        """
+        wounded = [member for member, hps in enumerate(self._member_hps)
+                   if hps < self.member_base_hps]
+        self.reduce_member_hitpoints(wounded[0] if wounded else 0, -amount)
+
+    def member_state(self, member):
+        """
+        Create the state of a single member.
+
+        Timed effects stay with the squad, all other attributes are copied.
+        """
+        state = NPCState(self.member_names[member], self.dexterity,
+                         self.wits, self.member_base_hps, self.base_defense,
+                         self.defense_modifier, self.faction, self.notes)
+        for attribute in ("temporary_defense_modifier",
+                          "next_round_defense_modifier", "current_stance",
+                          "conditions", "base_initiative", "order"):
+            setattr(state, attribute, getattr(self, attribute))
+        state.hps = self._member_hps[member]
+
+        return state
+
+    def expand(self):
+        """
+        States of all members, the squad itself stays unchanged.
+        """
+        return [self.member_state(member) for member in range(self.size)]
+
+    def split(self, member):
+        """
+        Take a member out of the squad and return its own state.
+        """
+        state = self.member_state(member)
+
+        base_hps = self.member_base_hps
+        names = list(self.member_names)
+        del names[member]
+        hps = array("h", self._member_hps)
+        del hps[member]
+
+        self._set("base_hps", self.base_hps - base_hps)
+        self._set_members(names, hps)
+
+        return state
+
+
+def form_squads(states, minimum=2):
+    """
+    Combine identical non-player characters into squads.
+
+    :param states: iterable of :class:`CombatantState`
+    :param int minimum: smallest number of NPCs that form a squad
+
+    NPCs are identical if they agree in their traits, defense and faction.
+    Returns a new list with the squads in place of their first member.
+    """
+    states = list(states)
+    groups = collections.OrderedDict()
+    for state in states:
+        if type(state) is NPCState:
+            key = (state.dexterity, state.wits, state.base_hps,
+                   state.base_defense, state.defense_modifier,
+                   state.faction)
+        else:
+            key = state
+        groups.setdefault(key, []).append(state)
+
+    result = []
+    for group in groups.values():
+        if len(group) < minimum:
+            result.extend(group)
+            continue
+
+        first = group[0]
+        squad = SquadState("%s +%i" % (first.name, len(group) - 1),
+                           first.dexterity, first.wits, first.base_hps,
+                           first.base_defense, first.defense_modifier,
+                           first.faction,
+                           members=[state.name for state in group])
+        squad.member_hps = [state.hps for state in group]
+        squad.hps = sum(max(state.hps, 0) for state in group)
+        result.append(squad)
+
+    return result
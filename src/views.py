@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+#
+#    Copyrright (C) 2015 Jan bundesmann
+#
+#    This file is part of FS Gamemaster Assistant (FSGA).
+#
+#    FSGA is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    FSGA is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with ChordMaker.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Widgets showing a single combatant with the controls of the GM.
+"""
+import functools
+
+from PySide import QtGui, QtCore
+
+from metrics import timed
+from render import scheduler
+from ruletable import rules_table
+from state import CombatantState, PCState, NPCState, hp_bar
+
+HITPOINT_ATTRIBUTES = frozenset(["hps", "base_hps"])
+DEFENSE_ATTRIBUTES = frozenset(["base_defense", "defense_modifier",
+                                "temporary_defense_modifier",
+                                "effect_defense_modifier", "conditions"])
+
+
+def _state_property(attribute):
+    """
+    Create a property that forwards to the bound combatant state.
+    """
+    def getter(self):
+        return getattr(self.state, attribute)
+
+    def setter(self, value):
+        # notify the observers, e.g. the roster and the journal
+        self.state._set(attribute, value)
+
+    return property(getter, setter)
+
+
+def ask_initiative_roll(parent, name, value=1):
+    """
+    Ask a player for the result of the initiative roll.
+
+    :param parent: parent widget of the dialog
+    :param str name: name of the player's character
+    :param int value: preselected result
+    """
+    initiative_roll, valid = QtGui.QInputDialog.getInteger(
+        parent, "Dice roll",
+        "What is the result of %s's initiative roll?" % name,
+        value=value,
+        minValue=1, maxValue=6, step=1)
+
+    return initiative_roll
+
+
+class Char(QtGui.QWidget):
+    """
+    Simple character model used for NPCs where, potentially, less traits are
+    required.
+
+    :param str name: Identifier for the character
+    :param int dexterity: dexterity trait
+    :param int wits: wits trait
+    :param int hps: hit points at the beginning of the battle
+    :param int defense: characters base defense
+    :param inst defense_modifier: modifiers that might vanish during battle
+
+    Character class that allows for a smart display of the most important traits
+    and easy modifications.
+    """
+    state_class = CombatantState
+
+    def __init__(self,
+                 name, dexterity, wits, hps, defense,
+                 defense_modifier=0,
+                 parent=None, state=None):
+        super(Char, self).__init__(parent)
+
+        if state is None:
+            state = self.state_class(name, dexterity, wits, hps, defense,
+                                     defense_modifier)
+        self.state = state
+
+        self.initUI()
+
+        self.stanceLabel.setCurrentIndex(self.current_stance)
+
+        self.set_connections()
+
+        # labels are updated once per event loop iteration by the scheduler,
+        # editors are deleted by their view, so the callback is dropped when
+        # the widget is destroyed
+        self.scheduler = scheduler()
+        self.scheduler.subscribe(self.state, self.on_flushed)
+        self.destroyed.connect(functools.partial(
+            self.scheduler.unsubscribe, self.state, self.on_flushed))
+
+    @classmethod
+    def from_state(cls, state, parent=None):
+        """
+        Create a view bound to an existing combatant state.
+
+        :param state: :class:`state.CombatantState` to be displayed
+        """
+        return cls(state.name, state.dexterity, state.wits, state.base_hps,
+                   state.base_defense, state.defense_modifier,
+                   parent=parent, state=state)
+
+    name = _state_property("name")
+    dexterity = _state_property("dexterity")
+    wits = _state_property("wits")
+    hps = _state_property("hps")
+    base_hps = _state_property("base_hps")
+    base_defense = _state_property("base_defense")
+    defense_modifier = _state_property("defense_modifier")
+    temporary_defense_modifier = _state_property("temporary_defense_modifier")
+    next_round_defense_modifier = \
+        _state_property("next_round_defense_modifier")
+    current_stance = _state_property("current_stance")
+    base_initiative = _state_property("base_initiative")
+    order = _state_property("order")
+
+    @timed("char.init_ui")
+    def initUI(self):
+        """
+        Create the widget containing informations and basic modifiers.
+
+        The layout looks like this:
+            NAME                                    INI
+            stance              - DEFENSE +         DEF_MOD +-
+            fighting stance     - HPS +
+        """
+        layout = QtGui.QGridLayout()
+
+        # first line, consisting only of labels - that's easy
+        self.nameWidget = QtGui.QLabel(("<b>%s</b>" % self.name))
+        self.initiativeLabel = QtGui.QLabel("%i" % self.order)
+        self.initiativeLabel.setAlignment(QtCore.Qt.AlignRight)
+        #layout.addWidget(self.nameWidget, 0, 0)
+        #layout.addWidget(self.initiativeLabel, 0, 2)
+        layout.addWidget(self.nameWidget, 0, 0)
+        layout.addWidget(self.initiativeLabel, 0, 1)
+
+        # second row, more complicated
+        self.stanceLabel = QtGui.QComboBox()
+        self.stanceLabel.addItems(rules_table().stance_names)
+        #layout.addWidget(self.stanceLabel, 1, 0)
+        layout.addWidget(self.stanceLabel, 0, 2)
+
+        self.def_layout = QtGui.QHBoxLayout()
+        self.def_minus_button = QtGui.QPushButton("-")
+        self.def_label = QtGui.QLabel()
+        self.def_plus_button = QtGui.QPushButton("+")
+
+        self.def_layout.addWidget(self.def_minus_button)
+        self.def_layout.addWidget(self.def_label)
+        self.def_layout.addWidget(self.def_plus_button)
+
+        #layout.addLayout(self.def_layout, 1, 1)
+        layout.addLayout(self.def_layout, 0, 3)
+
+        self.box_def_modifier = QtGui.QSpinBox()
+        self.box_def_modifier.setMinimum(-30)
+        layout.addWidget(self.box_def_modifier, 0, 4)
+
+        # third row, again easier
+        self.fightingStanceLabel = QtGui.QLabel("fighting stance")
+        #layout.addWidget(self.fightingStanceLabel, 2, 0)
+
+        self.hp_layout = QtGui.QHBoxLayout()
+        self.hp_minus_button = QtGui.QPushButton("-")
+        self.hp_label = QtGui.QLabel()
+        self.hp_plus_button = QtGui.QPushButton("+")
+
+        self.hp_layout.addWidget(self.hp_minus_button)
+        self.hp_layout.addWidget(self.hp_label)
+        self.hp_layout.addWidget(self.hp_plus_button)
+
+        #layout.addLayout(self.hp_layout, 2, 1, 1, 2)
+        layout.addLayout(self.hp_layout, 0, 5)
+
+        # add a line at the bottom of the widget
+        frame = QtGui.QFrame()
+        frame.setFrameShape(QtGui.QFrame.HLine)
+        #layout.addWidget(frame, 3, 0, 1, 3)
+        layout.addWidget(frame, 0, 6)
+
+        self.setLayout(layout)
+
+        self.write_current_hitpoints()
+        self.write_current_defense()
+
+    def set_connections(self):
+        self.hp_minus_button.clicked.connect(self.reduce_hitpoints)
+        self.hp_plus_button.clicked.connect(self.increase_hitpoints)
+        self.def_minus_button.clicked.connect(self.reduce_defense)
+        self.def_plus_button.clicked.connect(self.increase_defense)
+        self.stanceLabel.currentIndexChanged.connect(self.choose_stance)
+        self.box_def_modifier.valueChanged.connect(self.set_defense_modifier)
+
+    @QtCore.Slot(int)
+    def choose_stance(self, new_stance):
+        """
+        Set the current stance.
+
+        :param int new_stance: Index of the chosen stance.
+
+        A character can choose between four stances identified by their index:
+
+        0 - NEUTRAL STANCE
+            By default most characters are in a neutral stance which ofers no
+            bonus or penalties. Surprised characters are assumed to be in a
+            neutral stance.
+        1 - AGGRESSIVE STANCE
+            A character taking an aggressive stance is acting with out regard
+            to safety. The character sacrifices defense to increase the chances
+            of success. Taking an aggressive stance lowers a character’s Defense
+            by 2. When taking an aggressive stance the player can choose to gain
+            a +4 bonus to goal numbers or add 2 damage efect dice to any
+            successful attack. When ighting with an aggressive stance a
+            character cannot pull VP to try and slip under shields. All VP must
+            be converted to wounds.
+        2 - DEFENSIVE STANCE
+            Sometimes a character wants to live more than they want to deal
+            damage. Characters taking a defensive stance are keeping their head
+            down, ducking and covering, and concentrating on staying out of the
+            line of ire. A character in a defensive stance gains +2 Defense, but
+            takes a –4 penalty to all goal numbers until their next action.
+        3 - FULL DEFENSE STANCE
+            Sometimes a character may want to cover up so that they can move
+            across a battleield quickly. Other times they may want to hide in a
+            hole and hope no one attacks them. A character can declare full
+            defense before Initiative and get +4 Defense.
+            On a turn where a character declares full defense the only action
+            they can take is to move (move, run, or stand/kneel/prone). If they
+            choose to run they still lose 2 Defense for running.
+        4 - AGGRESSIVE STANCE (DAMAGE)
+            The aggressive stance with 2 damage effect dice instead of the
+            bonus to goal numbers.
+
+        The modifiers of these stances are defined in the
+        :class:`ruletable.RulesTable` and can be replaced by house rules.
+        """
+        self.state.choose_stance(new_stance)
+
+    @QtCore.Slot(int)
+    def set_defense_modifier(self, value):
+        """
+        Set a finite defense modifier.
+
+        :param int value: The value by how much defense is altered.
+
+        Character's defense values might be altered by several reasons - PSI,
+        theurgy, GM decision.
+        """
+        self.state.set_defense_modifier(value)
+
+    @timed("char.write_current_hitpoints")
+    def write_current_hitpoints(self):
+        self.hp_label.setText(hp_bar(self.hps, self.base_hps))
+
+    @timed("char.write_current_defense")
+    def write_current_defense(self):
+        def_text = "%i" % self.state.current_defense()
+
+        self.def_label.setText(def_text)
+
+    def refresh(self):
+        """
+        Update all labels from the bound state.
+        """
+        self.initiativeLabel.setText("%i" % self.order)
+        self.stanceLabel.setCurrentIndex(self.current_stance)
+        self.write_current_hitpoints()
+        self.write_current_defense()
+
+    def on_flushed(self, attributes):
+        """
+        Update the labels whose values have changed since the last flush.
+
+        :param set attributes: changed attributes of the state
+        """
+        if "order" in attributes:
+            self.initiativeLabel.setText("%i" % self.order)
+        if "current_stance" in attributes:
+            self.stanceLabel.setCurrentIndex(self.current_stance)
+        if "defense_modifier" in attributes:
+            self.box_def_modifier.setValue(self.defense_modifier)
+        if attributes & HITPOINT_ATTRIBUTES:
+            self.write_current_hitpoints()
+        if attributes & DEFENSE_ATTRIBUTES:
+            self.write_current_defense()
+
+    def reduce_hitpoints(self, amount=1):
+        self.state.reduce_hitpoints(amount)
+
+    def increase_hitpoints(self, amount=1):
+        self.state.increase_hitpoints(amount)
+
+    def reduce_defense(self, amount=1):
+        self.state.reduce_defense(amount)
+
+    def increase_defense(self, amount=1):
+        self.state.increase_defense(amount)
+
+    @timed("char.next_round")
+    def next_round(self, initiative_roll=None):
+        self.state.next_round(initiative_roll)
+
+
+class PC(Char):
+    """
+    Simple character model used for NPCs where, potentially, less traits are
+    required.
+
+    :param str name: Identifier for the character
+    :param int dexterity: dexterity trait
+    :param int wits: wits trait
+    :param int hps: hit points at the beginning of the battle
+    :param int defense: characters base defense
+    :param int defense_modifier: modifiers that might vanish during battle
+
+    Character class that allows for a smart display of the most important traits
+    and easy modifications.
+    """
+    state_class = PCState
+
+    def __init__(self,
+                 name, dexterity, wits, hps, defense,
+                 defense_modifier=0,
+                 parent=None, state=None):
+        super(PC, self).__init__(
+            name, dexterity, wits, hps, defense,
+            defense_modifier, parent, state)
+
+        self.initiative_roll = 1
+
+    def ask_initiative_roll(self):
+        """
+        Ask the player for the result of the initiative roll.
+        """
+        self.initiative_roll = ask_initiative_roll(self, self.name,
+                                                   self.initiative_roll)
+
+        return self.initiative_roll
+
+    def next_round(self, initiative_roll=None):
+        if initiative_roll is None:
+            initiative_roll = self.ask_initiative_roll()
+
+        super(PC, self).next_round(initiative_roll)
+
+
+class NPC(Char):
+    """
+    Simple character model used for NPCs where, potentially, less traits are
+    required.
+
+    :param str name: Identifier for the character
+    :param int dexterity: dexterity trait
+    :param int wits: wits trait
+    :param int hps: hit points at the beginning of the battle
+    :param int defense: characters base defense
+    :param inst defense_modifier: modifiers that might vanish during battle
+
+    Character class that allows for a smart display of the most important traits
+    and easy modifications.
+    """
+    state_class = NPCState
+
+    def __init__(self,
+                 name, dexterity, wits, hps, defense,
+                 defense_modifier=0,
+                 parent=None, state=None):
+        super(NPC, self).__init__(
+            name, dexterity, wits, hps, defense,
+            defense_modifier, parent, state)
@@ -23,10 +23,50 @@
 Collection of widgets the are combined in the complete widget.
 """
 
+import collections
+import os
 import random
+import sys
 
+import numpy as np
 from PySide import QtGui
 from PySide import QtCore
+from PySide import QtNetwork
+
+from combatlog import CombatLog
+from dice import chance_to_hit, expected_wounds
+from effects import Effect, EffectScheduler
+from generator import archetypes, generate
+from initiative import minimal_moves, participants_list
+from journal import Journal, recover
+from leaks import LeakDetector, MemoryTracer, census
+from metrics import metrics, timed
+from odds import InitiativeOdds
+from playerdisplay import DisplayServer
+from pool import ACTIVE, GRAVEYARD, RESERVE, Pool, RosterRecord
+from render import scheduler
+from rollserver import InitiativeServer
+import rosterfile
+from views import NPC, PC, ask_initiative_roll
+from ruletable import load_rules, rules_table
+from state import NPCState, PCState, SquadState, form_squads
+
+# house rules are loaded from this file if it exists
+HOUSE_RULES = "house_rules.json"
+# the running battle is saved continuously to this file
+JOURNAL = "battle.journal"
+# the demo battle is read from this file if it exists, see rosterfile
+ENCOUNTER = "encounter.fsr"
+ROSTER_FILTER = "Rosters (*.fsr);;CSV (*.csv);;JSON Lines (*.jsonl)"
+# the timers of the hot paths are written to this file on exit, see metrics
+METRICS = "metrics.prom"
+# set this environment variable to check for leaks after every round
+LEAK_CHECK = "FSGA_LEAK_CHECK"
+# set this environment variable to serve the timers at /metrics of the
+# initiative server to the local network
+SERVE_METRICS = "FSGA_SERVE_METRICS"
+# changes of these attributes change the odds of the initiative
+INITIATIVE_TRAITS = frozenset(["dexterity", "wits", "base_initiative"])
 
 
 class participant_model(QtGui.QWidget):
@@ -71,87 +111,876 @@ class participant_model(QtGui.QWidget):
         #self.repaint()
 
 
-class participants_list():
+class BattleModel(QtCore.QAbstractListModel):
     """
-    Dummy container of objects with their own order parameter
+    Model presenting the participants of a battle in initiative order.
+
+    :param participants: :class:`participants_list` holding the states
+
+    Advancing a round only reorders and updates the existing rows, no
+    widgets are created for the participants.
     """
+    def __init__(self, participants, parent=None):
+        super(BattleModel, self).__init__(parent)
+
+        self.participants = participants
+        self._resetting = False
 
-    def __init__(self, participants):
-        self.sort_participants(participants)
+        self.scheduler = scheduler()
+        for participant in self.participants:
+            self.scheduler.watch(participant)
+        self.scheduler.flushed.connect(self.on_flushed)
 
-    def sort_participants(self, participants):
-        # we restrict the order range to 0-10
-        nested_base = [[] for i in range(23)]
-        for participant in participants:
-            nested_base[participant.order].append(participant)
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
 
-        self.flattened_list = []
-        nested_base.reverse()
-        for sublist in nested_base:
-            self.flattened_list.extend(sublist)
+        return len(self.participants)
 
-    def __len__(self):
-        return self.flattened_list.__len__()
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
 
-    def __getitem__(self, key):
-        return self.flattened_list.__getitem__(key)
+        participant = self.participants[index.row()]
+
+        if role == QtCore.Qt.DisplayRole:
+            return participant.name
+        elif role == QtCore.Qt.ToolTipRole:
+            return repr(participant)
+
+        return None
+
+    def flags(self, index):
+        return (super(BattleModel, self).flags(index) |
+                QtCore.Qt.ItemIsEditable)
+
+    def participant(self, index):
+        return self.participants[index.row()]
 
     def __iter__(self):
-        return self.flattened_list.__iter__()
+        return iter(self.participants)
+
+    def reset(self, function, *args):
+        """
+        Call a function that may change all rows, e.g. a replay of the log,
+        which may let participants join and leave as well.
+        """
+        self.beginResetModel()
+        self._resetting = True
+        try:
+            return function(*args)
+        finally:
+            self._resetting = False
+            self.endResetModel()
+
+    def add(self, participant):
+        """
+        Insert the row of a participant joining the battle.
+        """
+        if self._resetting:
+            self.participants.add(participant)
+        else:
+            position = self.participants.index.insert_position(participant)
+            self.beginInsertRows(QtCore.QModelIndex(), position, position)
+            self.participants.add(participant)
+            self.endInsertRows()
+
+        self.scheduler.watch(participant)
+
+    def remove(self, participant):
+        """
+        Remove the row of a participant leaving the battle.
+        """
+        if self._resetting:
+            self.participants.remove(participant)
+        else:
+            position = self.participants.index.position(participant)
+            self.beginRemoveRows(QtCore.QModelIndex(), position, position)
+            self.participants.remove(participant)
+            self.endRemoveRows()
+
+        self.scheduler.unwatch(participant)
+
+    @QtCore.Slot(object)
+    def on_flushed(self, dirty):
+        """
+        Repaint all rows changed since the last flush in a single pass.
+
+        :param dict dirty: changed attributes per combatant state
+        """
+        index = self.participants.index
+        rows = [index.position(participant)
+                for participant in dirty if participant in index]
+
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)),
+                                  self.index(max(rows)))
+
+    def advance_round(self, initiative_rolls=None, pending=(),
+                      random_state=None):
+        """
+        Start a new round and reorder the rows accordingly.
+
+        :param dict initiative_rolls: see :meth:`participants_list.reshuffle`
+        :param pending: see :meth:`participants_list.reshuffle`
+        :param random_state: see :meth:`participants_list.reshuffle`
+
+        Only the rows that changed their relative position are moved, the
+        rows with new values are repainted by :meth:`on_flushed`. If more
+        than half of the rows move, the layout is changed at once instead.
+        """
+        index = self.participants.index
+        old_order = list(index)
+        self.participants.reshuffle(initiative_rolls, pending, random_state,
+                                    rebuild=False)
+
+        with metrics().timer("round.reshuffle.sort"):
+            keyed = index.sorted_keys()
+        new_order = [participant for key, participant in keyed]
+
+        root = QtCore.QModelIndex()
+        with metrics().timer("round.moves"):
+            moves = minimal_moves(old_order, new_order)
+            if len(moves) > len(new_order) // 2:
+                self.layoutAboutToBeChanged.emit()
+                index.set_order(keyed)
+                new_position = dict((participant, position)
+                                    for position, participant
+                                    in enumerate(new_order))
+                persistent = self.persistentIndexList()
+                self.changePersistentIndexList(
+                    persistent,
+                    [self.index(new_position[old_order[old.row()]])
+                     for old in persistent])
+                self.layoutChanged.emit()
+            else:
+                for source, destination in moves:
+                    if destination > source:
+                        self.beginMoveRows(root, source, source, root,
+                                           destination + 1)
+                    else:
+                        self.beginMoveRows(root, source, source, root,
+                                           destination)
+                    index.move(source, destination)
+                    self.endMoveRows()
+                index.set_order(keyed)
+
+    def submit_initiative(self, participant, initiative_roll):
+        """
+        Move a participant whose initiative roll arrived during the round.
+        """
+        index = self.participants.index
+        source = index.position(participant)
+        destination = index.rekey_position(
+            participant, participant.base_initiative + initiative_roll)
+
+        root = QtCore.QModelIndex()
+        if source == destination:
+            self.participants.submit_initiative(participant, initiative_roll)
+        else:
+            if destination > source:
+                self.beginMoveRows(root, source, source, root, destination + 1)
+            else:
+                self.beginMoveRows(root, source, source, root, destination)
+            self.participants.submit_initiative(participant, initiative_roll)
+            self.endMoveRows()
+
+        index = self.index(destination)
+        self.dataChanged.emit(index, index)
+
+
+class StateListModel(QtCore.QAbstractListModel):
+    """
+    Plain list of combatant states, e.g. the graveyard or search results.
+    """
+    def __init__(self, states=(), parent=None):
+        super(StateListModel, self).__init__(parent)
+
+        self.states = list(states)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.states)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
 
-    def reshuffle(self):
-        participants_new = []
+        state = self.states[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            if state.faction:
+                return "%s (%s)" % (state.name, state.faction)
+            return state.name
+        elif role == QtCore.Qt.ToolTipRole:
+            return repr(state)
 
-        for participant in self.flattened_list:
-            participant.next_round()
+        return None
 
-            participants_new.append(participant)
+    def set_states(self, states):
+        self.beginResetModel()
+        self.states = list(states)
+        self.endResetModel()
 
-        self.sort_participants(participants_new)
 
+class CombatantDelegate(QtGui.QStyledItemDelegate):
+    """
+    Paints a battle participant in a single row.
+
+    The layout looks like this:
+        NAME        INI     stance      DEFENSE     [HPS-----   ]
+
+    Editing a row opens the full character widget from :mod:`views`, so
+    only the row that is being edited owns child widgets.
+    """
+    columns = (0.3, 0.1, 0.2, 0.1, 0.3)
+
+    hp_color = QtGui.QColor(74, 35, 106)
+
+    def __init__(self, parent=None):
+        super(CombatantDelegate, self).__init__(parent)
+
+        self.row_height = 2 * QtGui.QFontMetrics(QtGui.QFont()).height() + 8
+
+    def _split(self, rect):
+        rects = []
+        left = rect.left()
+        for fraction in self.columns:
+            width = int(rect.width() * fraction)
+            rects.append(QtCore.QRect(left, rect.top(), width, rect.height()))
+            left += width
+
+        return rects
+
+    @timed("delegate.paint")
+    def paint(self, painter, option, index):
+        participant = index.model().participant(index)
+
+        painter.save()
+
+        if option.state & QtGui.QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+            painter.setPen(option.palette.highlightedText().color())
+
+        (name_rect, initiative_rect, stance_rect,
+         defense_rect, hp_rect) = self._split(option.rect.adjusted(4, 0, -4, 0))
+        align_left = QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter
+        align_center = QtCore.Qt.AlignCenter
+
+        font = QtGui.QFont(option.font)
+        font.setBold(True)
+        painter.setFont(font)
+        name = participant.name
+        if isinstance(participant, SquadState):
+            name = "%s (%i/%i)" % (name, len(participant.standing()),
+                                   participant.size)
+        painter.drawText(name_rect, align_left, name)
+        painter.setFont(option.font)
+
+        if participant in index.model().participants.pending:
+            initiative_text = "?"
+        else:
+            initiative_text = "%i" % participant.order
+        painter.drawText(initiative_rect,
+                         QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter,
+                         initiative_text)
+        stance_names = rules_table().stance_names
+        painter.drawText(stance_rect, align_center,
+                         stance_names[participant.current_stance])
+        painter.drawText(defense_rect, align_center,
+                         "%i" % participant.current_defense())
+
+        bar = hp_rect.adjusted(0, hp_rect.height() // 4,
+                               0, -hp_rect.height() // 4)
+        if participant.base_hps > 0:
+            fraction = (max(0, min(participant.hps, participant.base_hps)) /
+                        float(participant.base_hps))
+            filled = QtCore.QRect(bar.left(), bar.top(),
+                                  int(bar.width() * fraction), bar.height())
+            painter.fillRect(filled, self.hp_color)
+        painter.drawRect(bar)
+        painter.drawText(bar, align_center,
+                         "%i/%i" % (participant.hps, participant.base_hps))
+
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(option.rect.width(), self.row_height)
+
+    @timed("delegate.create_editor")
+    def createEditor(self, parent, option, index):
+        participant = index.model().participant(index)
+        if participant.player_controlled:
+            view_class = PC
+        else:
+            view_class = NPC
+
+        editor = view_class.from_state(participant, parent)
+        editor.layout().setContentsMargins(2, 0, 2, 0)
+        editor.setAutoFillBackground(True)
+
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.refresh()
+
+    def setModelData(self, editor, model, index):
+        # the editor modifies the state directly, the model is notified by
+        # the repaint scheduler
+        pass
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+
+class EffectDialog(QtGui.QDialog):
+    """
+    Dialog asking for a timed effect on a participant.
 
-class ordered_list(QtGui.QWidget):
+    :param participant: :class:`state.CombatantState` affected
     """
-    A QT widget capable of displaying widgets stored in a list.
+    def __init__(self, participant, parent=None):
+        super(EffectDialog, self).__init__(parent)
+        self.participant = participant
+
+        self.setWindowTitle("Effect on %s" % participant.name)
+        self.setupUI()
+
+    def setupUI(self):
+        layout = QtGui.QFormLayout()
+
+        self.name_edit = QtGui.QLineEdit()
+        layout.addRow("Effect", self.name_edit)
+
+        self.rounds_box = QtGui.QSpinBox()
+        self.rounds_box.setMinimum(1)
+        layout.addRow("Rounds", self.rounds_box)
+
+        self.defense_box = QtGui.QSpinBox()
+        self.goal_box = QtGui.QSpinBox()
+        self.damage_box = QtGui.QSpinBox()
+        for box in (self.defense_box, self.goal_box):
+            box.setMinimum(-30)
+        layout.addRow("Defense", self.defense_box)
+        layout.addRow("Goal numbers", self.goal_box)
+        layout.addRow("Damage per round", self.damage_box)
+
+        buttons = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok |
+                                         QtGui.QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+        self.setLayout(layout)
+
+    def effect(self):
+        return Effect(self.participant, self.name_edit.text(),
+                      self.defense_box.value(), self.goal_box.value(),
+                      self.damage_box.value())
 
-    :param list_object: List of displayable QT objects
 
-    The purpose of this class is to display widgets stored in a list according
-    to some order parameter.
-    It basically consists of a QVBoxLayout which one by one is filled with
-    the list's items.
+class GeneratorDialog(QtGui.QDialog):
     """
-    def __init__(self, list_object, parent=None):
-        super(ordered_list, self).__init__(parent)
+    Dialog asking for the archetype, number and seed of random NPCs.
+    """
+    def __init__(self, parent=None):
+        super(GeneratorDialog, self).__init__(parent)
+        self.archetypes = archetypes()
 
-        self.participants = list_object
+        self.setWindowTitle("Generate NPCs")
+        self.setupUI()
 
-        self.verticalLayout = QtGui.QVBoxLayout()
+    def setupUI(self):
+        layout = QtGui.QFormLayout()
+
+        self.archetype_box = QtGui.QComboBox()
+        self.archetype_box.addItems(sorted(self.archetypes))
+        layout.addRow("Archetype", self.archetype_box)
+
+        self.count_box = QtGui.QSpinBox()
+        self.count_box.setRange(1, 1000000)
+        self.count_box.setValue(10)
+        layout.addRow("Number", self.count_box)
 
-        for idx, entry in enumerate(self.participants):
-            self.verticalLayout.addWidget(entry)
+        # a seed of 0 draws different NPCs every time
+        self.seed_box = QtGui.QSpinBox()
+        self.seed_box.setRange(0, 2 ** 31 - 1)
+        self.seed_box.setSpecialValueText("random")
+        layout.addRow("Seed", self.seed_box)
 
-        self.setLayout(self.verticalLayout)
+        buttons = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok |
+                                         QtGui.QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+        self.setLayout(layout)
 
+    def states(self):
+        return generate(self.archetypes[self.archetype_box.currentText()],
+                        self.count_box.value(),
+                        self.seed_box.value() or None)
+
+
+class HitChanceWidget(QtGui.QWidget):
+    """
+    Readout of the chance to hit and the expected wounds of an attack.
+
+    The distributions are memoized in :mod:`dice`, so the readout follows
+    the spin boxes without delay.
+    """
+    def __init__(self, parent=None):
+        super(HitChanceWidget, self).__init__(parent)
+
+        self.setupUI()
+        self.update_readout()
+
+    def setupUI(self):
+        layout = QtGui.QFormLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.goal_box = QtGui.QSpinBox()
+        self.goal_box.setRange(0, 30)
+        self.goal_box.setValue(12)
+        self.modifier_box = QtGui.QSpinBox()
+        self.modifier_box.setRange(-30, 30)
+        self.damage_box = QtGui.QSpinBox()
+        self.damage_box.setValue(4)
+        self.armour_box = QtGui.QSpinBox()
+        layout.addRow("Goal", self.goal_box)
+        layout.addRow("Modifier", self.modifier_box)
+        layout.addRow("Damage dice", self.damage_box)
+        layout.addRow("Armour", self.armour_box)
+
+        for box in (self.goal_box, self.modifier_box, self.damage_box,
+                    self.armour_box):
+            box.valueChanged.connect(self.update_readout)
+
+        self.readout = QtGui.QLabel()
+        layout.addRow(self.readout)
+
+        self.setLayout(layout)
+
+    def update_readout(self):
+        goal = self.goal_box.value()
+        modifier = self.modifier_box.value()
+        self.readout.setText(
+            "Hit: %i%%, wounds: %.1f" %
+            (round(100 * chance_to_hit(goal, modifier)),
+             expected_wounds(goal, modifier, self.damage_box.value(),
+                             self.armour_box.value())))
+
+
+class RosterLoader(QtCore.QThread):
+    """
+    Read the states of a file in a worker thread.
+
+    :param str path: file in one of the formats of :mod:`rosterfile`
+    :param int chunk_size: number of states per :attr:`loaded` signal
+
+    :attr:`loaded` is emitted with lists of states, :attr:`progress` with
+    the number of states read and the total, which is 0 if it is unknown.
+    """
+    loaded = QtCore.Signal(object)
+    progress = QtCore.Signal(int, int)
+
+    def __init__(self, path, chunk_size=250, parent=None):
+        super(RosterLoader, self).__init__(parent)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.cancelled = False
+
+    def run(self):
+        total = rosterfile.count(self.path) or 0
+
+        chunk = []
+        done = 0
+        for state in rosterfile.stream(self.path):
+            if self.cancelled:
+                return
+
+            chunk.append(state)
+            done += 1
+            if len(chunk) == self.chunk_size:
+                self.loaded.emit(chunk)
+                self.progress.emit(done, total)
+                chunk = []
+
+        if chunk:
+            self.loaded.emit(chunk)
+        self.progress.emit(done, done)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class OddsSignals(QtCore.QObject):
+    computed = QtCore.Signal(int, object)
+
+
+class OddsTask(QtCore.QRunnable):
+    """
+    Compute the expected initiative ranks on a worker thread.
+
+    :param int generation: number identifying the request
+    :param odds: :class:`odds.InitiativeOdds`
+    """
+    def __init__(self, generation, odds):
+        super(OddsTask, self).__init__()
+        self.generation = generation
+        self.odds = odds
+        self.cancelled = False
+        self.signals = OddsSignals()
+
+    def run(self):
+        ranks = self.odds.compute(lambda: self.cancelled)
+        if ranks is not None:
+            self.signals.computed.emit(self.generation, ranks)
+
+
+class OddsPanel(QtGui.QWidget):
+    """
+    Odds of the initiative order of the next round.
+
+    :param participants: :class:`initiative.participants_list`
+
+    The expected ranks of all participants are computed on the global
+    thread pool, a new request cancels the running one. Participants that
+    join or leave the battle and changes of single participants are
+    applied incrementally.
+    """
+    # at most this many opponents are listed
+    MAX_OPPONENTS = 100
 
-class BattleWidget(QtGui.QScrollArea):
     def __init__(self, participants, parent=None):
+        super(OddsPanel, self).__init__(parent)
+        self.participants = participants
+
+        self.generation = 0
+        self.task = None
+        self.odds = None
+        self.states = []
+        self.rows = {}
+        self.current = None
+        self.pending = False
+
+        self.setupUI()
+
+    def setupUI(self):
+        layout = QtGui.QVBoxLayout()
+
+        self.rank_label = QtGui.QLabel()
+        layout.addWidget(self.rank_label)
+
+        self.table = QtGui.QTableWidget(0, 2)
+        self.table.setHorizontalHeaderLabels(["Opponent", "Acts before"])
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.setLayout(layout)
+
+    def tiebreak(self, state):
+        # higher dexterity wins, then the participant added first
+        return (state.dexterity * 2 ** 24 -
+                self.participants.index.sequence(state))
+
+    def schedule(self):
+        """
+        Recompute once the current event has been handled, so that many
+        inserted rows cause a single computation.
+        """
+        if not self.pending:
+            self.pending = True
+            QtCore.QTimer.singleShot(0, self.recompute)
+
+    def recompute(self):
+        self.pending = False
+        if self.task is not None:
+            self.task.cancelled = True
+
+        self.states = list(self.participants)
+        self.rows = dict((state, row) for row, state in enumerate(self.states))
+        self.odds = InitiativeOdds(
+            [state.base_initiative for state in self.states],
+            [self.tiebreak(state) for state in self.states])
+
+        self.generation += 1
+        self.task = OddsTask(self.generation, self.odds)
+        self.task.signals.computed.connect(self.on_computed)
+        QtCore.QThreadPool.globalInstance().start(self.task)
+
+    @QtCore.Slot(int, object)
+    def on_computed(self, generation, ranks):
+        if generation != self.generation:
+            return
+
+        self.task = None
+        self.show_participant(self.current)
+
+    def update_state(self, state):
+        """
+        Apply changed traits of a single participant.
+        """
+        if self.task is not None or state not in self.rows:
+            self.schedule()
+            return
+
+        self.odds.update(self.rows[state], state.base_initiative,
+                         self.tiebreak(state))
+        self.show_participant(self.current)
+
+    def on_rows_inserted(self, parent, first, last):
+        if self.task is not None or self.odds is None or self.pending:
+            self.schedule()
+            return
+
+        for position in range(first, last + 1):
+            state = self.participants[position]
+            self.rows[state] = self.odds.add(state.base_initiative,
+                                             self.tiebreak(state))
+            self.states.append(state)
+        self.show_participant(self.current)
+
+    def on_rows_about_to_be_removed(self, parent, first, last):
+        if self.task is not None or self.odds is None or self.pending:
+            self.schedule()
+            return
+
+        for position in range(first, last + 1):
+            state = self.participants[position]
+            row = self.rows.pop(state)
+            # the last participant takes the row, as in the odds
+            self.odds.remove(row)
+            moved = self.states.pop()
+            if moved is not state:
+                self.states[row] = moved
+                self.rows[moved] = row
+        if self.current in self.rows:
+            self.show_participant(self.current)
+        else:
+            self.show_participant(None)
+
+    def show_participant(self, state):
+        self.current = state
+        if state is None or state not in self.rows:
+            self.rank_label.setText("")
+            self.table.setRowCount(0)
+            return
+
+        row = self.rows[state]
+        if self.odds.ranks is not None and self.task is None:
+            self.rank_label.setText("%s: expected rank %.1f of %i" %
+                                    (state.name, self.odds.ranks[row],
+                                     len(self.states)))
+
+        before = self.odds.before(row)
+        # the most uncertain opponents first, only the listed ones are
+        # sorted
+        uncertainty = np.abs(before - 0.5)
+        uncertainty[row] = np.inf
+        count = min(self.MAX_OPPONENTS, len(self.states) - 1)
+        if count <= 0:
+            opponents = []
+        else:
+            opponents = np.argpartition(uncertainty, count - 1)[:count]
+            opponents = opponents[np.argsort(uncertainty[opponents],
+                                             kind="mergesort")].tolist()
+
+        self.table.setRowCount(len(opponents))
+        for table_row, other in enumerate(opponents):
+            self.table.setItem(table_row, 0, QtGui.QTableWidgetItem(
+                self.states[other].name))
+            self.table.setItem(table_row, 1, QtGui.QTableWidgetItem(
+                "%i%%" % round(100 * before[other])))
+
+
+class MetricsOverlay(QtGui.QLabel):
+    """
+    Debug overlay listing the timers and counters of :mod:`metrics`.
+
+    The stages of a round are listed right below the round, the slowest
+    first, so it is easy to see which one is responsible for a sluggish
+    round.
+    """
+    def __init__(self, parent=None):
+        super(MetricsOverlay, self).__init__(parent)
+
+        font = QtGui.QFont("Monospace")
+        font.setStyleHint(QtGui.QFont.TypeWriter)
+        self.setFont(font)
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QtGui.QPalette.Window, QtGui.QColor(0, 0, 0, 200))
+        palette.setColor(QtGui.QPalette.WindowText, QtCore.Qt.white)
+        self.setPalette(palette)
+        self.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.setInterval(500)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+        self.hide()
+
+    @QtCore.Slot()
+    def toggle(self):
+        if self.isVisible():
+            self.refresh_timer.stop()
+            self.hide()
+        else:
+            self.refresh()
+            self.refresh_timer.start()
+            self.show()
+            self.raise_()
+
+    @staticmethod
+    def _line(name, timer):
+        return "%-34s %7i %9.2f %9.2f %9.2f" % (
+            name, timer.count, 1000 * timer.last, 1000 * timer.mean,
+            1000 * timer.maximum)
+
+    @QtCore.Slot()
+    def refresh(self):
+        registry = metrics()
+        lines = ["%-34s %7s %9s %9s %9s" % ("timer", "calls", "last ms",
+                                            "mean ms", "max ms")]
+
+        if "round" in registry.timers:
+            lines.append(self._line("round", registry.timers["round"]))
+            for name, timer in registry.stages("round"):
+                lines.append(self._line("  " + name[len("round."):], timer))
+        for name, timer in sorted(registry.timers.items()):
+            if name != "round" and not name.startswith("round."):
+                lines.append(self._line(name, timer))
+
+        lines.append("")
+        for name, value in sorted(registry.counters.items()):
+            lines.append("%-34s %7i" % (name, value))
+
+        self.setText("\n".join(lines))
+        self.adjustSize()
+
+
+class LeakMonitor(QtCore.QObject):
+    """
+    Diagnostic mode counting the live objects after every round.
+
+    :param pool: :class:`pool.Pool` of the battle, all of its combatants
+        may have objects of their own
+
+    Besides the Python objects by class, the Qt widgets and the children of
+    all top level widgets are counted. Suspected leaks are reported on
+    stderr once per name.
+    """
+    def __init__(self, pool, parent=None):
+        super(LeakMonitor, self).__init__(parent)
+
+        self.pool = pool
+        self.detector = LeakDetector()
+        self.tracer = MemoryTracer()
+        self.reported = set()
+
+    @staticmethod
+    def qt_counts():
+        application = QtGui.QApplication.instance()
+        top_level = application.topLevelWidgets()
+
+        return {
+            "Qt widgets": len(application.allWidgets()),
+            "Qt objects": len(top_level) + sum(
+                len(widget.findChildren(QtCore.QObject))
+                for widget in top_level),
+        }
+
+    def sample(self, round):
+        sizes = collections.Counter()
+        counts = census(sizes)
+        counts.update(self.qt_counts())
+        self.tracer.record(sizes)
+        self.detector.record(round, len(self.pool.location), counts,
+                             self.tracer.current())
+
+        new = [growth for growth in self.detector.suspects()
+               if growth.name not in self.reported]
+        if not new:
+            return
+
+        self.reported.update(growth.name for growth in new)
+        lines = self.detector.report()
+        lines.extend(self.tracer.top_growth())
+        sys.stderr.write("Possible leak:\n%s\n" % "\n".join(lines))
+
+
+class BattleWidget(QtGui.QWidget):
+    """
+    The battle in initiative order with the controls of the GM.
+
+    :param participants: :class:`initiative.participants_list`
+    :param journal: :class:`journal.Journal` the battle is saved to
+    :param reserve: states that may join the battle later, see
+        :class:`pool.Pool`
+    :param effects: effects recovered by :func:`journal.recover`
+    """
+    def __init__(self, participants, parent=None, journal=None, reserve=(),
+                 effects=()):
         super(BattleWidget, self).__init__(parent)
         self.participants = participants
+        self.reserve = reserve
+        self.journal = journal
+        self.loaders = []
+        self.import_queue = []
+        if journal is not None:
+            for participant in participants:
+                journal.watch(participant)
+            journal.record_round(participants)
+        self.initiative_rolls = {}
+        self.effects = EffectScheduler()
+        self.effects.advance(participants.round)
+        for effect in effects:
+            self.effects.resume(effect)
+        if journal is not None:
+            journal.watch_effects(self.effects)
+        scheduler().flushed.connect(self.on_flushed)
 
         self.setupUI()
-        self.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOn)
-        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
-        print self.sizePolicy().expandingDirections()
 
         QtCore.QMetaObject.connectSlotsByName(self)
 
+        # the window is shown before the servers and computations start
+        QtCore.QTimer.singleShot(0, self.start_services)
+
     def setupUI(self):
-        inner_widget = QtGui.QWidget()
-        layout = QtGui.QGridLayout(inner_widget)
+        layout = QtGui.QGridLayout()
 
-        action_list = ordered_list(self.participants)
-        layout.addWidget(action_list, 0, 0, 6, 1)
+        self.model = BattleModel(self.participants, self)
+        self.pool = Pool(self.model, self.reserve)
+        # every event loop iteration with changes is one step of the log,
+        # including the combatants joining and leaving through the pool
+        self.log = CombatLog(self.participants, effects=self.effects,
+                             pool=self.pool)
+        if self.journal is not None:
+            self.pool.add_observer(self.on_pool_moved)
+
+        self.list_view = QtGui.QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setItemDelegate(CombatantDelegate(self.list_view))
+        # all rows have the same height, so the view does not need to ask
+        # the delegate for every row and only paints the visible ones
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setLayoutMode(QtGui.QListView.Batched)
+        self.list_view.setBatchSize(100)
+        self.list_view.setEditTriggers(
+            QtGui.QAbstractItemView.CurrentChanged |
+            QtGui.QAbstractItemView.DoubleClicked)
+        self.list_view.setVerticalScrollBarPolicy(
+            QtCore.Qt.ScrollBarAlwaysOn)
+        self.list_view.setHorizontalScrollBarPolicy(
+            QtCore.Qt.ScrollBarAlwaysOff)
+        self.list_view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.list_view.customContextMenuRequested.connect(self.on_context_menu)
+        layout.addWidget(self.list_view, 0, 0, 7, 1)
 
         button = QtGui.QPushButton("press me")
         button.setObjectName("button")
@@ -159,33 +988,355 @@ class BattleWidget(QtGui.QScrollArea):
 
         # graveyard
         layout.addWidget(QtGui.QLabel("Graveyard"), 0, 1)
-        layout.addWidget(QtGui.QLabel("Liste"), 1, 1)
+        self.graveyard_model = StateListModel(parent=self)
+        self.graveyard_view = QtGui.QListView()
+        self.graveyard_view.setModel(self.graveyard_model)
+        layout.addWidget(self.graveyard_view, 1, 1)
         button2 = QtGui.QPushButton("revive")
         button2.setObjectName("revive")
         layout.addWidget(button2, 2, 1)
 
         layout.addWidget(QtGui.QLabel("Pool"), 3, 1)
-        layout.addWidget(QtGui.QLabel("Liste"), 4, 1)
+        self.reserve_model = StateListModel(parent=self)
+        self.reserve_view = QtGui.QListView()
+        self.reserve_view.setModel(self.reserve_model)
+        self.reserve_view.setUniformItemSizes(True)
+        self.reserve_view.setSelectionMode(
+            QtGui.QAbstractItemView.ExtendedSelection)
+        layout.addWidget(self.reserve_view, 4, 1)
         button3 = QtGui.QPushButton("activate")
         button3.setObjectName("activate")
         layout.addWidget(button3, 5, 1)
+        self.refresh_pool()
+
+        # players submit their initiative rolls from their own devices
+        self.initiative_server = InitiativeServer(
+            self, serve_metrics=bool(os.environ.get(SERVE_METRICS)))
+        self.initiative_server.roll_received.connect(
+            self.model.submit_initiative)
+        self.server_label = QtGui.QLabel("Starting...")
+        layout.addWidget(self.server_label, 7, 0)
+
+        # the players' screen, see playerdisplay
+        self.display_server = DisplayServer(self.participants, self)
+        for signal in (self.model.rowsInserted, self.model.rowsRemoved,
+                       self.model.rowsMoved, self.model.layoutChanged,
+                       self.model.modelReset):
+            signal.connect(self.display_server.mark_order)
+
+        layout.addWidget(HitChanceWidget(), 7, 1)
+
+        self.odds_panel = OddsPanel(self.participants)
+        layout.addWidget(self.odds_panel, 0, 2, 8, 1)
+        self.model.rowsInserted.connect(self.odds_panel.on_rows_inserted)
+        self.model.rowsAboutToBeRemoved.connect(
+            self.odds_panel.on_rows_about_to_be_removed)
+        self.model.modelReset.connect(self.odds_panel.schedule)
+        self.list_view.selectionModel().currentChanged.connect(
+            self.on_current_changed)
+
+        history = QtGui.QHBoxLayout()
+        for name in ("undo", "redo", "jump"):
+            history_button = QtGui.QPushButton(name)
+            history_button.setObjectName(name)
+            history.addWidget(history_button)
+        self.round_box = QtGui.QSpinBox()
+        history.addWidget(self.round_box)
+        history.addStretch()
+        load_button = QtGui.QPushButton("load...")
+        load_button.setObjectName("load")
+        history.addWidget(load_button)
+        self.progress_bar = QtGui.QProgressBar()
+        self.progress_bar.hide()
+        history.addWidget(self.progress_bar)
+        layout.addLayout(history, 8, 0)
+
+        QtGui.QShortcut(QtGui.QKeySequence.Undo, self, self.on_undo_released)
+        QtGui.QShortcut(QtGui.QKeySequence.Redo, self, self.on_redo_released)
+
+        self.metrics_overlay = MetricsOverlay(self)
+
+        self.leak_monitor = None
+        if os.environ.get(LEAK_CHECK):
+            self.leak_monitor = LeakMonitor(self.pool, self)
+        QtGui.QShortcut(QtGui.QKeySequence("F12"), self,
+                        self.metrics_overlay.toggle)
+
+        layout.setColumnStretch(0, 1)
 
-        inner_widget.setMinimumWidth(1000)
-        self.setWidget(inner_widget)
+        self.setLayout(layout)
         self.setMinimumWidth(1000)
 
+    @QtCore.Slot()
+    @timed("startup.services")
+    def start_services(self):
+        """
+        Start what is not needed to show the battle.
+        """
+        if self.initiative_server.start():
+            server_text = ("Initiative rolls: %s" %
+                           self.initiative_server.url(
+                               QtNetwork.QHostInfo.localHostName()))
+        else:
+            server_text = "Initiative rolls are asked for in dialogs."
+        self.server_label.setText(server_text)
+
+        self.display_server.start()
+        self.odds_panel.recompute()
+        if self.journal is not None:
+            self.journal.compact()
+
+    def ask_initiative_rolls(self):
+        """
+        Collect the initiative rolls of all player characters.
+        """
+        initiative_rolls = {}
+        for participant in self.participants:
+            if participant.player_controlled:
+                initiative_rolls[participant] = ask_initiative_roll(
+                    self, participant.name,
+                    self.initiative_rolls.get(participant, 1))
+
+        self.initiative_rolls = initiative_rolls
+
+        return initiative_rolls
+
+    def on_context_menu(self, position):
+        index = self.list_view.indexAt(position)
+        if not index.isValid():
+            return
+
+        participant = self.model.participant(index)
+        menu = QtGui.QMenu(self)
+        add_effect = menu.addAction("Add effect...")
+        to_graveyard = menu.addAction("Move to graveyard")
+        to_reserve = menu.addAction("Move to pool")
+        enter_roll = None
+        if participant in self.participants.pending:
+            # players without a device tell the GM their roll
+            enter_roll = menu.addAction("Enter initiative roll...")
+        split = None
+        if isinstance(participant, SquadState) and participant.size > 1:
+            split = menu.addAction("Split off member...")
+
+        action = menu.exec_(self.list_view.viewport().mapToGlobal(position))
+        if action == add_effect:
+            dialog = EffectDialog(participant, self)
+            if dialog.exec_() == QtGui.QDialog.Accepted:
+                self.effects.add(dialog.effect(), dialog.rounds_box.value())
+        elif action == to_graveyard:
+            self.move(participant, GRAVEYARD)
+        elif action == to_reserve:
+            self.move(participant, RESERVE)
+        elif action is not None and action == enter_roll:
+            initiative_roll, accepted = QtGui.QInputDialog.getInteger(
+                self, "Dice roll",
+                "What is the result of %s's initiative roll?" %
+                participant.name, value=1, minValue=1, maxValue=6, step=1)
+            if accepted:
+                self.initiative_server.cancel(participant)
+                self.model.submit_initiative(participant, initiative_roll)
+        elif action is not None and action == split:
+            member, accepted = QtGui.QInputDialog.getItem(
+                self, "Split squad", "Member",
+                list(participant.member_names), 0, False)
+            if accepted:
+                self.split(participant,
+                           participant.member_names.index(member))
+
+    def split(self, squad, member):
+        """
+        Let a member of a squad act on its own.
+        """
+        state = squad.split(member)
+        self.pool.add(state, ACTIVE)
+
+    def refresh_pool(self):
+        self.graveyard_model.set_states(self.pool.find(location=GRAVEYARD))
+        self.reserve_model.set_states(self.pool.find(
+            location=RESERVE, limit=PoolWidget.MAX_RESULTS))
+
+    @QtCore.Slot(object, str)
+    def move(self, state, location):
+        """
+        Move a combatant between the battle, the graveyard and the pool.
+        """
+        # records of roster files get their state when they are used
+        state = self.pool.materialize(state)
+        if location == ACTIVE and self.pool.location[state] == GRAVEYARD:
+            self.pool.revive(state)
+        else:
+            self.pool.move(state, location)
+
+        self.refresh_pool()
+
+    def on_pool_moved(self, state, old_location, new_location):
+        # the journal holds the combatants in the battle
+        if new_location == ACTIVE:
+            self.journal.watch(state)
+        elif old_location == ACTIVE:
+            self.journal.forget(state)
+
+    def import_roster(self, path):
+        """
+        Let the combatants of a file join the battle.
+
+        The file is read in a worker thread and the rows are inserted one
+        chunk per event loop iteration, so the battle stays usable while a
+        large roster streams in.
+        """
+        loader = RosterLoader(path, parent=self)
+        loader.loaded.connect(self.on_roster_loaded)
+        loader.progress.connect(self.on_roster_progress)
+        loader.finished.connect(lambda: self.loaders.remove(loader))
+        self.loaders.append(loader)
+
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        loader.start()
+
+    @QtCore.Slot(object)
+    def on_roster_loaded(self, states):
+        self.import_queue.append(states)
+        if len(self.import_queue) == 1:
+            QtCore.QTimer.singleShot(0, self.insert_chunk)
+
+    def insert_chunk(self):
+        if not self.import_queue:
+            return
+
+        for state in self.import_queue.pop(0):
+            self.pool.add(state, ACTIVE)
+
+        if self.import_queue:
+            QtCore.QTimer.singleShot(0, self.insert_chunk)
+
+    @QtCore.Slot(int, int)
+    def on_roster_progress(self, done, total):
+        if done == total:
+            self.progress_bar.hide()
+        else:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(done)
+
+    @QtCore.Slot()
+    def on_load_released(self):
+        path, selected = QtGui.QFileDialog.getOpenFileName(
+            self, "Load roster", "", ROSTER_FILTER)
+        if path:
+            self.import_roster(path)
+
+    def stop_loading(self):
+        for loader in self.loaders:
+            loader.cancel()
+            loader.wait()
+
+    @QtCore.Slot()
+    def on_revive_released(self):
+        index = self.graveyard_view.currentIndex()
+        if index.isValid():
+            self.move(self.graveyard_model.states[index.row()], ACTIVE)
+
+    @QtCore.Slot()
+    def on_activate_released(self):
+        states = [self.reserve_model.states[index.row()]
+                  for index in self.reserve_view.selectedIndexes()]
+        for state in states:
+            self.move(state, ACTIVE)
+
+    @QtCore.Slot(object)
+    def on_flushed(self, dirty):
+        self.log.checkpoint()
+        self.display_server.mark(dirty)
+
+        for state, attributes in dirty.items():
+            if attributes & INITIATIVE_TRAITS:
+                self.odds_panel.update_state(state)
+
+    def on_current_changed(self, current, previous):
+        if current.isValid():
+            self.odds_panel.show_participant(self.model.participant(current))
+            self.display_server.set_active(self.model.participant(current))
+
+    def replay(self, function, *args):
+        """
+        Call a method of the log that may reorder all rows.
+        """
+        self.model.reset(function, *args)
+        self.refresh_pool()
+
+        if self.journal is not None:
+            self.journal.record_round(self.participants)
+
+    @QtCore.Slot()
+    def on_undo_released(self):
+        self.replay(self.log.undo)
+
+    @QtCore.Slot()
+    def on_redo_released(self):
+        self.replay(self.log.redo)
+
+    @QtCore.Slot()
+    def on_jump_released(self):
+        if self.round_box.value() in self.log.round_steps:
+            self.replay(self.log.jump_to_round, self.round_box.value())
+
     @QtCore.Slot()
     def on_button_released(self):
-        self.participants.reshuffle()
-        action_list = ordered_list(self.participants)
-        self.layout().addWidget(action_list, 0, 0)
+        if self.initiative_server.isListening():
+            # NPCs act right away, player characters are slotted in as
+            # soon as their rolls arrive
+            initiative_rolls = {}
+            pending = [participant for participant in self.participants
+                       if participant.player_controlled]
+        else:
+            initiative_rolls = self.ask_initiative_rolls()
+            pending = []
+
+        registry = metrics()
+        with registry.timer("round"):
+            self.list_view.setUpdatesEnabled(False)
+            self.log.next_round(initiative_rolls, pending,
+                                reshuffle=self.model.advance_round)
+            self.list_view.setUpdatesEnabled(True)
+            self.round_box.setMaximum(self.participants.round)
+            self.round_box.setValue(self.participants.round)
+            if self.journal is not None:
+                with registry.timer("round.journal"):
+                    self.journal.record_round(self.participants)
+
+            self.initiative_server.request_rolls(pending)
+
+            editor = self.list_view.indexWidget(
+                self.list_view.currentIndex())
+            if editor is not None:
+                editor.refresh()
+
+        if self.leak_monitor is not None:
+            self.leak_monitor.sample(self.participants.round)
+
         print "button released"
 
 
 class PoolWidget(QtGui.QWidget):
-    def __init__(self, participants, parent=None):
+    """
+    Search in the pool of all combatants.
+
+    :param pool: :class:`pool.Pool` to search
+
+    :attr:`move_requested` is emitted with the state and the location it
+    shall be moved to, see :meth:`BattleWidget.move`, :attr:`imported`
+    after states were added to the reserve.
+    """
+    move_requested = QtCore.Signal(object, str)
+    imported = QtCore.Signal()
+
+    # at most this many results are listed
+    MAX_RESULTS = 500
+
+    def __init__(self, pool, parent=None):
         super(PoolWidget, self).__init__(parent)
-        self.participants = participants
+        self.pool = pool
 
         self.setupUI()
 
@@ -194,21 +1345,147 @@ class PoolWidget(QtGui.QWidget):
     def setupUI(self):
         layout = QtGui.QGridLayout()
 
-        button = QtGui.QPushButton("press me")
-        button.setObjectName("button")
-        layout.addWidget(button, 1, 1)
+        filters = QtGui.QFormLayout()
+        self.name_edit = QtGui.QLineEdit()
+        filters.addRow("Name", self.name_edit)
+        self.faction_edit = QtGui.QLineEdit()
+        filters.addRow("Faction", self.faction_edit)
+        self.location_box = QtGui.QComboBox()
+        self.location_box.addItems(["any", ACTIVE, GRAVEYARD, RESERVE])
+        filters.addRow("Location", self.location_box)
+
+        self.range_boxes = {}
+        for trait, label in (("dexterity", "Dexterity"), ("wits", "Wits"),
+                             ("base_hps", "Hit points"),
+                             ("base_defense", "Defense")):
+            # a box at its minimum or maximum does not limit the search
+            low = QtGui.QSpinBox()
+            low.setRange(0, 9999)
+            low.setSpecialValueText("any")
+            high = QtGui.QSpinBox()
+            high.setRange(0, 9999)
+            high.setSpecialValueText("any")
+            high.setValue(high.maximum())
+            trait_layout = QtGui.QHBoxLayout()
+            trait_layout.addWidget(low)
+            trait_layout.addWidget(high)
+            filters.addRow(label, trait_layout)
+            self.range_boxes[trait] = (low, high)
+            low.valueChanged.connect(self.search)
+            high.valueChanged.connect(self.search)
+
+        self.name_edit.textChanged.connect(self.search)
+        self.faction_edit.textChanged.connect(self.search)
+        self.location_box.currentIndexChanged.connect(self.search)
+        layout.addLayout(filters, 0, 0)
+
+        self.results = StateListModel(parent=self)
+        self.result_view = QtGui.QListView()
+        self.result_view.setModel(self.results)
+        self.result_view.setUniformItemSizes(True)
+        self.result_view.setSelectionMode(
+            QtGui.QAbstractItemView.ExtendedSelection)
+        layout.addWidget(self.result_view, 0, 1, 2, 1)
+
+        buttons = QtGui.QHBoxLayout()
+        for name, location in (("activate", ACTIVE),
+                               ("graveyard", GRAVEYARD),
+                               ("reserve", RESERVE)):
+            button = QtGui.QPushButton(name)
+            button.clicked.connect(
+                lambda location=location: self.move_selected(location))
+            buttons.addWidget(button)
+        layout.addLayout(buttons, 1, 0)
+
+        files = QtGui.QHBoxLayout()
+        for name in ("import", "export", "generate"):
+            button = QtGui.QPushButton(name + "...")
+            button.setObjectName(name)
+            files.addWidget(button)
+        layout.addLayout(files, 2, 0)
+
+        layout.setColumnStretch(1, 1)
 
         self.setLayout(layout)
+        self.search()
+
+    def search(self):
+        location = self.location_box.currentText()
+        ranges = {}
+        for trait, (low, high) in self.range_boxes.items():
+            if low.value() > low.minimum() or high.value() < high.maximum():
+                ranges[trait] = (
+                    low.value() if low.value() > low.minimum() else None,
+                    high.value() if high.value() < high.maximum() else None)
+
+        states = self.pool.find(self.name_edit.text(),
+                                self.faction_edit.text() or None,
+                                location if location != "any" else None,
+                                limit=self.MAX_RESULTS, **ranges)
+        self.results.set_states(states)
+
+    def move_selected(self, location):
+        states = [self.results.states[index.row()]
+                  for index in self.result_view.selectedIndexes()]
+        for state in states:
+            self.move_requested.emit(state, location)
+        self.search()
 
     @QtCore.Slot()
-    def on_button_released(self):
-        print "button in PoolWidget released"
+    def on_import_released(self):
+        path, selected = QtGui.QFileDialog.getOpenFileName(
+            self, "Import characters", "", ROSTER_FILTER)
+        if not path:
+            return
+
+        if rosterfile.is_roster(path):
+            # the records are searched in the file, see Pool.attach
+            self.pool.attach(rosterfile.RosterFile(path))
+        else:
+            self.pool.extend(rosterfile.stream(path))
+        self.search()
+        self.imported.emit()
+
+    @QtCore.Slot()
+    def on_generate_released(self):
+        dialog = GeneratorDialog(self)
+        if dialog.exec_() != QtGui.QDialog.Accepted:
+            return
+
+        QtGui.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            self.pool.extend(dialog.states())
+        finally:
+            QtGui.QApplication.restoreOverrideCursor()
+        self.search()
+        self.imported.emit()
+
+    @QtCore.Slot()
+    def on_export_released(self):
+        path, selected = QtGui.QFileDialog.getSaveFileName(
+            self, "Export characters", "", ROSTER_FILTER)
+        if path:
+            rosterfile.save(path, (
+                state.state() if isinstance(state, RosterRecord) else state
+                for state in self.results.states))
 
 
 class TestWindow(QtGui.QWidget):
-    def __init__(self, participants, parent=None):
+    """
+    Main window with one tab per tool.
+
+    Only the battle is created right away, every other tab is created when
+    it is shown for the first time.
+    """
+    def __init__(self, participants, parent=None, journal=None, reserve=(),
+                 effects=()):
         super(TestWindow, self).__init__(parent)
         self.participants = participants
+        self.journal = journal
+        self.reserve = reserve
+        self.effects = effects
+        self.tab_factories = {}
+        self.pool_widget = None
 
         self.setupUI()
 
@@ -217,44 +1494,119 @@ class TestWindow(QtGui.QWidget):
     def setupUI(self):
         layout = QtGui.QGridLayout()
 
-        tab_widget = QtGui.QTabWidget()
-        layout.addWidget(tab_widget, 0, 0)
+        self.tab_widget = QtGui.QTabWidget()
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
+        layout.addWidget(self.tab_widget, 0, 0)
 
-        #pool_widget = PoolWidget(self.participants)
-        #tab_widget.addTab(pool_widget, "Pool")
+        self.battle_widget = BattleWidget(self.participants,
+                                          journal=self.journal,
+                                          reserve=self.reserve,
+                                          effects=self.effects)
+        self.tab_widget.addTab(self.battle_widget, "Battle")
 
-        battle_widget = BattleWidget(self.participants)
-        tab_widget.addTab(battle_widget, "Battle")
+        self.add_lazy_tab(self.create_pool_widget, "Pool")
 
         self.setLayout(layout)
 
-if __name__ == "__main__":
-    import sys
+    def add_lazy_tab(self, factory, title):
+        """
+        Add a tab whose widget is returned by ``factory`` when the tab is
+        shown for the first time.
+        """
+        placeholder = QtGui.QWidget()
+        self.tab_factories[placeholder] = factory
+
+        return self.tab_widget.addTab(placeholder, title)
+
+    def create_pool_widget(self):
+        self.pool_widget = PoolWidget(self.battle_widget.pool)
+        self.pool_widget.move_requested.connect(self.battle_widget.move)
+        self.pool_widget.imported.connect(self.battle_widget.refresh_pool)
+
+        return self.pool_widget
+
+    @QtCore.Slot(int)
+    def on_tab_changed(self, index):
+        placeholder = self.tab_widget.widget(index)
+        factory = self.tab_factories.pop(placeholder, None)
+        if factory is None:
+            return
+
+        with metrics().timer("startup.tab"):
+            widget = factory()
+
+        # replacing the tab must not activate and create its neighbours
+        self.tab_widget.blockSignals(True)
+        title = self.tab_widget.tabText(index)
+        self.tab_widget.removeTab(index)
+        self.tab_widget.insertTab(index, widget, title)
+        self.tab_widget.setCurrentIndex(index)
+        self.tab_widget.blockSignals(False)
+        placeholder.deleteLater()
 
+if __name__ == "__main__":
     app = QtGui.QApplication(sys.argv)
 
-    from rules import NPC
-    from rules import PC
+    if os.path.exists(HOUSE_RULES):
+        load_rules(HOUSE_RULES)
+
+    # continue the last battle if the application did not end properly
+    recovered = recover(JOURNAL)
 
     chars = [
-        PC("Nader", 3, 8, 9, 1),
-        PC("Tristan", 6, 5, 11, 1),
-        PC("Hieronymus", 7, 6, 8, 1),
-        PC("Frederik", 6, 9, 10, 1),
-        NPC("Ronnie", 8, 3, 11, 1),
-
-        NPC("Bob", 6, 4, 10, 1),
-        NPC("Alice", 6, 4, 10, 1),
-        NPC("Eve", 6, 4, 10, 1),
-        NPC("Chainy", 6, 4, 10, 1),
-        NPC("Yassyar", 6, 4, 10, 1),
-        NPC("Palok", 6, 4, 10, 1),
-        NPC("Pumpur", 6, 4, 10, 1),
+        PCState("Nader", 3, 8, 9, 1),
+        PCState("Tristan", 6, 5, 11, 1),
+        PCState("Hieronymus", 7, 6, 8, 1),
+        PCState("Frederik", 6, 9, 10, 1),
+        NPCState("Ronnie", 8, 3, 11, 1),
+
+        NPCState("Bob", 6, 4, 10, 1),
+        NPCState("Alice", 6, 4, 10, 1),
+        NPCState("Eve", 6, 4, 10, 1),
+        NPCState("Chainy", 6, 4, 10, 1),
+        NPCState("Yassyar", 6, 4, 10, 1),
+        NPCState("Palok", 6, 4, 10, 1),
+        NPCState("Pumpur", 6, 4, 10, 1),
     ]
 
+    # a saved encounter replaces the demo and streams in after the start
+    encounter = os.path.exists(ENCOUNTER) and recovered is None
+    if encounter:
+        chars = []
+
+    # identical NPCs act as one squad
+    chars = form_squads(chars)
+
+    # an optional number of additional mooks for testing mass battles
+    if len(sys.argv) > 1:
+        chars.extend(NPCState("Mook %i" % i, 6, 4, 10, 1)
+                     for i in range(int(sys.argv[1])))
+
+    # NPCs that may join the battle later
+    reserve = [NPCState("Guard %i" % i, 5, 4, 9, 2, faction="Decados")
+               for i in range(4)]
+    reserve.append(NPCState("Vorox", 9, 2, 14, 2, faction="Vorox"))
+
+    effects = ()
+    if recovered is not None:
+        chars, round, effects = recovered
     participants = participants_list(chars)
+    if recovered is not None:
+        participants.round = round
 
-    ol = BattleWidget(participants)
-    ol.show()
+    journal = Journal(JOURNAL)
 
-    sys.exit(app.exec_())
+    ol = TestWindow(participants, journal=journal, reserve=reserve,
+                    effects=effects)
+    ol.show()
+    app.aboutToQuit.connect(ol.battle_widget.stop_loading)
+    if encounter:
+        ol.battle_widget.import_roster(ENCOUNTER)
+
+    result = app.exec_()
+    journal.close()
+    metrics().dump(METRICS)
+    os.remove(JOURNAL)
+    if os.path.exists(journal.snapshot_path):
+        os.remove(journal.snapshot_path)
+    sys.exit(result)
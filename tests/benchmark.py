@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+Headless benchmarks of the battle organizer.
+
+Every roster size is measured in a separate process, so that the reported
+peak memory belongs to that size alone. The memory needed to build a
+roster is the peak of a fresh process building it minus the peak of a
+fresh process doing nothing but the same imports, small rosters stay
+within the noise of about 100 kB of that difference. The widget benchmarks
+need a display, e.g. ``xvfb-run ./benchmark.py`` on a headless machine,
+and are skipped if PySide or the display is not available.
+
+Usage: ./benchmark.py [--sizes 10 100 1000 10000] [--output benchmark.json]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, "../src")
+
+import argparse
+import json
+import resource
+import subprocess
+import timeit
+
+from state import NPCState, PCState
+
+SIZES = [10, 100, 1000, 10000]
+ROUNDS = 20
+# creating Char widgets is slow, larger rosters are not measured for them
+WIDGET_SIZE_LIMIT = 1000
+
+
+def make_roster(size):
+    """
+    Roster of mostly NPCs with one player character in ten.
+    """
+    chars = []
+    for idx in range(size):
+        if idx % 10 == 0:
+            chars.append(PCState("PC %i" % idx, 3 + idx % 5, 4, 10, 1))
+        else:
+            chars.append(NPCState("NPC %i" % idx, 2 + idx % 7, 3, 8, 1))
+
+    return chars
+
+
+def median_time(function, rounds=ROUNDS):
+    times = []
+    for idx in range(rounds):
+        start = timeit.default_timer()
+        function()
+        times.append(timeit.default_timer() - start)
+    times.sort()
+
+    return times[len(times) // 2]
+
+
+def peak_memory_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def construct(size):
+    """
+    Build a roster in this process and return the peak memory.
+    """
+    from initiative import participants_list
+
+    participants = participants_list(make_roster(size))
+
+    return peak_memory_kb(), len(participants)
+
+
+def run_single(option, size):
+    # measure in a fresh process, returns the JSON it writes
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), option, str(size)],
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    return json.loads(output)
+
+
+def measure_rules(size, result):
+    from initiative import participants_list
+
+    start = timeit.default_timer()
+    chars = make_roster(size)
+    participants = participants_list(chars)
+    result["construct_s"] = timeit.default_timer() - start
+
+    initiative_rolls = dict((char, 3) for char in chars
+                            if char.player_controlled)
+
+    result["reshuffle_s"] = median_time(
+        lambda: participants.reshuffle(initiative_rolls))
+    result["sort_participants_s"] = median_time(
+        lambda: participants.sort_participants(chars))
+
+    def next_round():
+        for char in chars:
+            char.next_round()
+    result["state_next_round_s"] = median_time(next_round)
+
+
+def measure_widgets(size, result):
+    try:
+        from PySide import QtGui
+    except ImportError:
+        result["widgets"] = "skipped, PySide not available"
+        return
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        result["widgets"] = "skipped, no display, try xvfb-run"
+        return
+
+    app = QtGui.QApplication.instance() or QtGui.QApplication(sys.argv)
+
+    from initiative import participants_list
+    from views import NPC
+    from widgets import BattleWidget
+
+    chars = make_roster(size)
+
+    if size <= WIDGET_SIZE_LIMIT:
+        start = timeit.default_timer()
+        views = [NPC.from_state(char) for char in chars]
+        result["char_construct_s"] = timeit.default_timer() - start
+
+        def next_round():
+            for view in views:
+                view.next_round()
+            view.scheduler.flush()
+        result["char_next_round_s"] = median_time(next_round)
+
+    start = timeit.default_timer()
+    battle = BattleWidget(participants_list(chars))
+    battle.show()
+    app.processEvents()
+    result["battle_construct_s"] = timeit.default_timer() - start
+
+    initiative_rolls = dict((char, 3) for char in chars
+                            if char.player_controlled)
+
+    def advance_round():
+        battle.model.advance_round(initiative_rolls)
+        app.processEvents()
+    result["battle_advance_round_s"] = median_time(advance_round)
+
+
+def measure(size):
+    result = {"size": size}
+
+    measure_rules(size, result)
+    measure_widgets(size, result)
+    result["peak_kb"] = peak_memory_kb()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--construct", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        json.dump(measure(args.single), sys.stdout)
+        return
+    if args.construct is not None:
+        json.dump(construct(args.construct), sys.stdout)
+        return
+
+    baseline = run_single("--construct", 0)[0]
+    results = []
+    for size in args.sizes:
+        result = run_single("--single", size)
+        result["construct_peak_kb"] = max(
+            run_single("--construct", size)[0] - baseline, 0)
+        results.append(result)
+
+        print("%6i combatants: reshuffle %.6f s, construction %.6f s, "
+              "peak %i kB" % (size, result["reshuffle_s"],
+                              result["construct_s"], result["peak_kb"]))
+
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+from combatlog import CombatLog
+from effects import Effect, EffectScheduler
+from initiative import participants_list
+from pool import ACTIVE, GRAVEYARD, Pool
+from state import NPCState, PCState
+
+
+def battle():
+    return participants_list([PCState("PC", 5, 4, 10, 2)] +
+                             [NPCState("NPC %i" % idx, 3 + idx, 3, 8, 1)
+                              for idx in range(5)])
+
+
+class TestCombatLog(unittest.TestCase):
+    def setUp(self):
+        self.participants = battle()
+        self.log = CombatLog(self.participants, snapshot_interval=2)
+        self.char = self.participants.roster.states[0]
+
+    def test_undo_redo(self):
+        self.char.reduce_hitpoints(3)
+        self.log.checkpoint()
+        self.char.choose_stance(1)
+        self.log.checkpoint()
+
+        self.assertTrue(self.log.undo())
+        self.assertEqual(self.char.current_stance, 0)
+        self.assertEqual(self.char.next_round_defense_modifier, 0)
+        self.assertEqual(self.char.hps, 7)
+
+        self.assertTrue(self.log.undo())
+        self.assertEqual(self.char.hps, 10)
+        self.assertFalse(self.log.undo())
+
+        self.assertTrue(self.log.redo())
+        self.assertEqual(self.char.hps, 7)
+
+        # a new action discards the steps undone
+        self.char.increase_defense()
+        self.assertFalse(self.log.redo())
+        self.assertEqual(self.char.current_stance, 0)
+
+    def test_rounds(self):
+        orders = []
+        for round in range(5):
+            self.log.next_round()
+            orders.append([state.order for state in self.participants])
+            self.participants.roster.states[1].reduce_hitpoints()
+
+        self.log.undo()
+        self.log.undo()
+        self.assertEqual(self.participants.round, 4)
+        self.assertEqual([state.order for state in self.participants],
+                         orders[3])
+
+        self.log.jump_to_round(2)
+        self.assertEqual(self.participants.round, 2)
+        self.assertEqual([state.order for state in self.participants],
+                         orders[1])
+        self.assertEqual(self.participants.roster.states[1].hps, 7)
+
+        self.log.jump_to_round(5)
+        self.assertEqual([state.order for state in self.participants],
+                         orders[4])
+
+        self.assertRaises(ValueError, self.log.jump_to_round, 9)
+
+    def test_reproduce(self):
+        rolls = {self.char: 6}
+        for round in range(3):
+            self.log.next_round(rolls)
+
+        participants = battle()
+        log = CombatLog(participants)
+        for seed in self.log.seeds:
+            log.next_round({participants.roster.states[0]: 6}, seed=seed)
+
+        self.assertEqual([state.order for state in self.participants],
+                         [state.order for state in participants])
+
+    def test_effects(self):
+        effects = EffectScheduler()
+        log = CombatLog(self.participants, snapshot_interval=2,
+                        effects=effects)
+        defense = self.char.current_defense()
+
+        effects.add(Effect(self.char, "Blessing", defense=3), 1)
+        log.checkpoint()
+        log.next_round()
+        self.assertEqual(self.char.effect_defense_modifier, 0)
+
+        # the effect is back and expires again in the repeated round
+        log.undo()
+        self.assertEqual(self.char.effect_defense_modifier, 3)
+        self.assertEqual(len(effects.effects), 1)
+        log.next_round()
+        self.assertEqual(self.char.effect_defense_modifier, 0)
+        self.assertEqual(len(effects.effects), 0)
+
+        for round in range(3):
+            log.next_round()
+        log.jump_to_round(0)
+        self.assertEqual(self.char.effect_defense_modifier, 0)
+        log.redo()
+        self.assertEqual(self.char.effect_defense_modifier, 3)
+        log.jump_to_round(3)
+        self.assertEqual(self.char.effect_defense_modifier, 0)
+        self.assertEqual(self.char.current_defense(), defense)
+
+    def test_join_leave(self):
+        newcomer = NPCState("Newcomer", 9, 9, 8, 1)
+        self.log.join(newcomer)
+        newcomer.reduce_hitpoints(2)
+        self.log.checkpoint()
+        self.log.leave(self.char)
+        self.log.checkpoint()
+
+        self.assertTrue(self.log.undo())
+        self.assertTrue(self.char in self.participants.index)
+        self.assertTrue(self.log.undo())
+        self.assertFalse(newcomer in self.participants.index)
+        self.assertEqual(newcomer.hps, 8)
+        self.assertEqual(len(self.participants.roster), 6)
+
+        self.log.redo()
+        self.log.redo()
+        self.assertEqual(list(self.participants)[0], newcomer)
+        self.assertEqual(newcomer.hps, 6)
+        self.assertFalse(self.char in self.participants.roster)
+
+    def test_pool(self):
+        pool = Pool(self.participants)
+        log = CombatLog(self.participants, snapshot_interval=1, pool=pool)
+        for round in range(2):
+            log.next_round()
+
+        # a state joining mid-round is recorded right away
+        newcomer = NPCState("Newcomer", 9, 9, 8, 1)
+        pool.add(newcomer, ACTIVE)
+        newcomer.reduce_hitpoints(3)
+        pool.kill(self.char)
+        log.checkpoint()
+        log.next_round()
+
+        log.undo()
+        self.assertEqual(newcomer.hps, 5)
+        log.undo()
+        self.assertFalse(newcomer in pool)
+        self.assertEqual(pool.location[self.char], ACTIVE)
+        self.assertEqual(len(self.participants), 6)
+
+        log.jump_to_round(3)
+        self.assertEqual(pool.location[newcomer], ACTIVE)
+        self.assertEqual(pool.location[self.char], GRAVEYARD)
+
+        # the snapshot of round 1 knows nothing of the newcomer
+        log.jump_to_round(1)
+        self.assertFalse(newcomer in pool)
+        self.assertFalse(newcomer in self.participants.index)
+        self.assertEqual(pool.location[self.char], ACTIVE)
+        log.jump_to_round(3)
+        self.assertEqual(newcomer.hps, 5)
+        self.assertEqual(self.participants.index.position(newcomer), 0)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCombatLog)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import random
+import unittest
+
+from delta import (HP_STEPS, DeltaEncoder, DisplayMirror, decode, encode,
+                   hp_level)
+from initiative import participants_list
+from state import NPCState, PCState
+
+
+class TestDelta(unittest.TestCase):
+    def setUp(self):
+        self.states = [PCState("Nader", 3, 8, 9, 1),
+                       PCState("Tristan", 6, 5, 11, 1),
+                       NPCState("Bob", 6, 4, 10, 1),
+                       NPCState("Alice", 6, 4, 10, 1)]
+        self.participants = participants_list(self.states)
+        self.encoder = DeltaEncoder()
+        self.mirror = DisplayMirror()
+
+    def sync(self, active=None):
+        messages = self.encoder.collect(self.participants, active)
+        self.mirror.apply(decode(encode(messages)))
+
+        return messages
+
+    def assertMirrored(self, active=None):
+        self.assertEqual([self.mirror.names[state_id]
+                          for state_id in self.mirror.order],
+                         [state.name for state in self.participants])
+        self.assertEqual([self.mirror.levels[state_id]
+                          for state_id in self.mirror.order],
+                         [hp_level(state) for state in self.participants])
+        if active is None:
+            self.assertEqual(self.mirror.active, None)
+        else:
+            self.assertEqual(self.mirror.names[self.mirror.active],
+                             active.name)
+
+    def test_initial(self):
+        self.sync()
+        self.assertMirrored()
+        self.assertEqual(self.sync(), [])
+
+    def test_hit_points(self):
+        self.sync()
+        state = self.states[2]
+        state.reduce_hitpoints(5)
+        self.encoder.mark([state])
+        messages = self.sync()
+        self.assertEqual(messages, [["hp", self.encoder.ids[state],
+                                     hp_level(state)]])
+        self.assertMirrored()
+
+        # changes below one step of the bar are not sent
+        state.reduce_hitpoints(0)
+        self.encoder.mark([state])
+        self.assertEqual(self.sync(), [])
+
+    def test_order(self):
+        self.sync()
+        for seed in range(10):
+            random.seed(seed)
+            self.participants.reshuffle()
+            self.encoder.mark_order()
+            self.sync()
+            self.assertMirrored()
+
+    def test_join_and_leave(self):
+        self.sync(self.states[1])
+        self.participants.remove(self.states[1])
+        newcomer = NPCState("Vorox", 9, 2, 14, 2)
+        self.participants.add(newcomer)
+        self.encoder.mark_order()
+        self.sync()
+        self.assertMirrored()
+        self.assertEqual(len(self.mirror.names), len(self.participants))
+
+        self.sync(newcomer)
+        self.assertMirrored(newcomer)
+
+    def test_coalesce(self):
+        self.sync()
+        state = self.states[0]
+        for amount in range(3):
+            state.reduce_hitpoints(2)
+            self.encoder.mark([state])
+        self.participants.reshuffle()
+        self.participants.reshuffle()
+        self.encoder.mark_order()
+
+        messages = self.sync()
+        self.assertEqual(len([message for message in messages
+                              if message[0] == "hp"]), 1)
+        self.assertMirrored()
+
+    def test_level(self):
+        state = NPCState("Bob", 6, 4, 10, 1)
+        self.assertEqual(hp_level(state), HP_STEPS)
+        state.reduce_hitpoints(100)
+        self.assertEqual(hp_level(state), 0)
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDelta)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+import numpy as np
+
+from dice import (DiceBuffer, Resolver, absorb, chance_to_hit,
+                  expected_wounds, outcome_distribution, victory_points,
+                  wound_distribution)
+
+
+class TestDistributions(unittest.TestCase):
+    def test_victory_points(self):
+        self.assertEqual(victory_points(13, 12), None)
+        self.assertEqual(victory_points(20, 25), None)
+        self.assertEqual(victory_points(7, 12), 2)
+        self.assertEqual(victory_points(12, 12), 8)
+
+    def test_chance_to_hit(self):
+        self.assertAlmostEqual(chance_to_hit(12), 0.6)
+        self.assertAlmostEqual(chance_to_hit(10, 4), 0.7)
+        self.assertAlmostEqual(chance_to_hit(30), 0.95)
+        self.assertAlmostEqual(chance_to_hit(2, -5), 0.)
+
+    def test_distributions_sum_up(self):
+        self.assertAlmostEqual(
+            sum(probability for points, probability
+                in outcome_distribution(12)), 1.)
+        self.assertAlmostEqual(
+            sum(probability for wounds, probability
+                in wound_distribution(12, 0, 4, 2, (5, 10), False)), 1.)
+
+    def test_expected_wounds(self):
+        # only the VP count without damage dice
+        expected = sum(victory_points(roll, 12) or 0
+                       for roll in range(1, 21)) / 20.
+        self.assertAlmostEqual(expected_wounds(12), expected)
+        self.assertAlmostEqual(expected_wounds(12, 0, 2),
+                               expected + 0.6 * 2 * 0.5)
+
+    def test_absorb(self):
+        self.assertEqual(absorb(6, 2, armour=1), 5)
+        # slipping under the shield by pulling VP
+        self.assertEqual(absorb(6, 2, shield=(5, 10)), 4)
+        self.assertEqual(absorb(6, 2, shield=(5, 10), pull_vp=False), 0)
+        self.assertEqual(absorb(14, 2, shield=(5, 10), pull_vp=False), 4)
+
+
+class TestResolver(unittest.TestCase):
+    def test_buffer(self):
+        buffer = DiceBuffer(6, size=10, random_state=np.random.RandomState(1))
+        results = [buffer.roll() for idx in range(25)]
+        self.assertTrue(all(1 <= result <= 6 for result in results))
+
+    def test_matches_distribution(self):
+        resolver = Resolver(np.random.RandomState(2))
+        wounds = resolver.attacks(np.full(100000, 12), 4, 1)
+        self.assertAlmostEqual(wounds.mean(), expected_wounds(12, 0, 4, 1),
+                               places=1)
+
+        wounds = [resolver.attack(12, 0, 4, 1) for idx in range(20000)]
+        self.assertAlmostEqual(np.mean(wounds), expected_wounds(12, 0, 4, 1),
+                               places=1)
+
+
+if __name__ == '__main__':
+
+    for test_case in (TestDistributions, TestResolver):
+        suite = unittest.TestLoader().loadTestsFromTestCase(test_case)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+from effects import Effect, EffectScheduler
+from state import NPCState
+
+
+class TestEffectScheduler(unittest.TestCase):
+    def setUp(self):
+        self.char = NPCState("NPC", 3, 3, 8, 1)
+        self.scheduler = EffectScheduler()
+
+    def test_modifiers(self):
+        self.scheduler.add(Effect(self.char, "Blessing", defense=2), 2)
+        self.scheduler.add(Effect(self.char, "Curse", defense=-1, goal=-2), 1)
+        self.assertEqual(self.char.current_defense(), 2)
+        self.assertEqual(self.char.goal_modifier(), -2)
+
+        self.assertEqual(self.scheduler.advance(1)[0].name, "Curse")
+        self.assertEqual(self.char.current_defense(), 3)
+
+        self.char.next_round()
+        self.assertEqual(self.char.current_defense(), 3)
+
+        self.scheduler.advance(2)
+        self.assertEqual(self.char.current_defense(), 1)
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_initiative(self):
+        self.scheduler.advance(1, 12)
+        self.scheduler.add(Effect(self.char, "Stun", defense=-4), 1)
+
+        self.assertEqual(self.scheduler.advance(2, 13), [])
+        self.assertEqual(len(self.scheduler.advance(2, 12)), 1)
+
+    def test_bleeding(self):
+        effect = self.scheduler.add(Effect(self.char, "Bleeding", damage=1),
+                                    3)
+        for round in range(1, 6):
+            self.scheduler.advance(round)
+        self.assertEqual(self.char.hps, 5)
+
+        self.scheduler.add(effect, 3)
+        self.scheduler.advance(6)
+        self.scheduler.remove(effect)
+        self.scheduler.advance(9)
+        self.assertEqual(self.char.hps, 4)
+
+    def test_readd(self):
+        # the queued expiry of the first activation must not end the second
+        effect = self.scheduler.add(Effect(self.char, "Blessing", defense=2),
+                                    1)
+        self.scheduler.remove(effect)
+        self.scheduler.add(effect, 3)
+        self.assertEqual(self.scheduler.advance(1), [])
+        self.assertEqual(self.char.current_defense(), 3)
+        self.assertEqual(self.scheduler.advance(3), [effect])
+        self.assertEqual(self.char.current_defense(), 1)
+
+        # adding an active effect again restarts it
+        self.scheduler.add(effect, 1)
+        self.scheduler.add(effect, 2)
+        self.assertEqual(self.char.current_defense(), 3)
+        self.assertEqual(self.scheduler.advance(4), [])
+        self.assertEqual(self.scheduler.advance(5), [effect])
+        self.assertEqual(self.char.current_defense(), 1)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestEffectScheduler)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+from generator import TRAIT_RANGE, Archetype, archetypes, generate
+from initiative import participants_list
+from pool import Pool
+
+
+class TestGenerator(unittest.TestCase):
+    def setUp(self):
+        self.archetype = archetypes()["Guard"]
+
+    def summary(self, states):
+        return [(state.name, state.dexterity, state.wits, state.hps,
+                 state.base_defense) for state in states]
+
+    def test_reproducible(self):
+        first = self.summary(generate(self.archetype, 500, seed=3,
+                                      batch_size=128))
+        second = self.summary(generate(self.archetype, 500, seed=3,
+                                       batch_size=128))
+        self.assertEqual(len(first), 500)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, self.summary(
+            generate(self.archetype, 500, seed=4, batch_size=128)))
+
+    def test_distributions(self):
+        states = list(generate(self.archetype, 20000, seed=1))
+        dexterity = [state.dexterity for state in states]
+        self.assertAlmostEqual(sum(dexterity) / 20000., 5, places=1)
+        self.assertTrue(min(dexterity) >= TRAIT_RANGE[0])
+        self.assertTrue(max(dexterity) <= TRAIT_RANGE[1])
+        self.assertEqual(set(state.base_defense for state in states),
+                         set([1, 2]))
+        self.assertTrue(all(state.hps >= 6 for state in states))
+        self.assertTrue(all(state.faction == "Guards" for state in states))
+
+    def test_into_pool(self):
+        pool = Pool(participants_list([]))
+        pool.extend(generate(self.archetype, 1000, seed=2))
+        self.assertEqual(len(pool), 1000)
+        self.assertTrue(len(pool.find(dexterity=(7, None))) > 0)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Archetype,
+                          {"name": "Broken", "dexterity": [5, 1],
+                           "wits": [5, 1], "hps": [5, 5, 1],
+                           "defense": [3, 1]})
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestGenerator)
+    unittest.TextTestRunner(verbosity=2).run(suite)
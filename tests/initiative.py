@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import collections
+import random
+import unittest
+
+from state import NPCState, PCState
+from initiative import InitiativeIndex, minimal_moves, participants_list
+
+
+class TestInitiativeIndex(unittest.TestCase):
+    def setUp(self):
+        self.chars = [NPCState("A", 3, 3, 8, 1),
+                      NPCState("B", 5, 1, 8, 1),
+                      NPCState("C", 3, 3, 8, 1),
+                      NPCState("D", 2, 2, 8, 1)]
+        for char in self.chars:
+            char.next_round(1)
+
+        self.index = InitiativeIndex(self.chars)
+
+    def names(self):
+        return "".join(char.name for char in self.index)
+
+    def test_tie_break(self):
+        self.assertEqual(self.names(), "BACD")
+
+    def test_unbounded(self):
+        self.chars[3].order = 50
+        self.chars[1].order = -20
+        self.index.rebuild()
+        self.assertEqual(self.names(), "DACB")
+
+    def test_insert_position(self):
+        char = NPCState("E", 3, 3, 8, 1)
+        char.next_round(1)
+        position = self.index.insert_position(char)
+        self.assertEqual(position, 3)
+        self.assertEqual(self.index.insert(char), position)
+
+    def test_incremental(self):
+        self.chars[3].order = 7
+        self.assertEqual(self.index.rekey(self.chars[3]), (3, 3))
+        self.chars[3].order = 8
+        self.assertEqual(self.index.rekey(self.chars[3]), (3, 0))
+        self.assertEqual(self.names(), "DBAC")
+
+        self.assertEqual(self.index.remove(self.chars[0]), 2)
+        self.assertEqual(self.names(), "DBC")
+
+        newcomer = NPCState("E", 9, 9, 8, 1)
+        self.assertEqual(self.index.insert(newcomer), 0)
+        self.assertEqual(self.index.position(self.chars[2]), 3)
+        self.assertEqual(self.names(), "EDBC")
+
+    def test_blocks(self):
+        # small blocks, so that they are split and emptied
+        class SmallBlocks(InitiativeIndex):
+            BLOCK_SIZE = 2
+
+        random_state = random.Random(8)
+        chars = [NPCState("N%i" % idx, random_state.randint(1, 5), 1, 8, 1)
+                 for idx in range(40)]
+        for char in chars:
+            char.next_round(random_state.randint(1, 6))
+        index = SmallBlocks()
+        inside = []
+        for repetition in range(400):
+            char = random_state.choice(chars)
+            if char in index and random_state.random() < 0.3:
+                position = index.remove(char)
+                inside.remove(char)
+            elif char in index and random_state.random() < 0.5:
+                char.order = random_state.randint(0, 12)
+                old_position, position = index.rekey(char)
+            elif char in index:
+                order = random_state.randint(0, 12)
+                position = index.rekey_position(char, order)
+                char.order = order
+                self.assertEqual(index.rekey(char)[1], position)
+            else:
+                self.assertEqual(index.insert_position(char),
+                                 index.insert(char))
+                position = index.position(char)
+                inside.append(char)
+
+            expected = [entry for key, entry in index.sorted_keys()]
+            self.assertEqual(list(index), expected)
+            self.assertEqual(len(index), len(inside))
+            if char in index:
+                self.assertEqual(index[position], char)
+                self.assertEqual(index[position - len(index)], char)
+            self.assertEqual([index.position(entry) for entry in expected],
+                             list(range(len(expected))))
+
+        for char in inside:
+            char.order = random_state.randint(0, 12)
+        old_order = list(index)
+        keyed = index.sorted_keys()
+        new_order = [char for key, char in keyed]
+        for source, destination in minimal_moves(old_order, new_order):
+            index.move(source, destination)
+            self.assertEqual([key for keys in index._key_blocks
+                              for key in keys],
+                             [index._key_of[entry] for entry in index])
+            self.assertEqual(index._maxes,
+                             [keys[-1] for keys in index._key_blocks])
+        self.assertEqual(list(index), new_order)
+        self.assertEqual([index[row] for row in range(len(index))],
+                         new_order)
+        index.set_order(keyed)
+        self.assertEqual([index.position(char) for char in new_order],
+                         list(range(len(new_order))))
+        self.assertEqual(index[3:5], new_order[3:5])
+
+    def test_empty(self):
+        index = InitiativeIndex()
+        self.assertRaises(IndexError, index.__getitem__, 0)
+        self.assertRaises(IndexError, index.move, 0, 0)
+
+        index.insert(self.chars[0])
+        index.move(0, 0)
+        self.assertEqual(list(index), [self.chars[0]])
+        self.assertEqual(index.position(self.chars[0]), 0)
+
+    def test_large(self):
+        chars = [NPCState("N%i" % idx, idx % 7, 1, 8, 1)
+                 for idx in range(100000)]
+        for idx, char in enumerate(chars):
+            char.order = idx % 1000
+        index = InitiativeIndex()
+        index.set_order(sorted((index._key(char, idx), char)
+                               for idx, char in enumerate(chars)))
+
+        for char in chars[:2000:7]:
+            position = index.remove(char)
+            self.assertEqual(index.insert(char), position)
+            self.assertEqual(index[position], char)
+        self.assertEqual(len(index), 100000)
+        self.assertEqual(list(index),
+                         [char for key, char in index.sorted_keys()])
+
+
+class TestMinimalMoves(unittest.TestCase):
+    def apply(self, old, moves):
+        result = list(old)
+        for source, destination in moves:
+            result.insert(destination, result.pop(source))
+
+        return result
+
+    def test_single_move(self):
+        moves = minimal_moves("ABCDE", "BCDEA")
+        self.assertEqual(moves, [(0, 4)])
+        self.assertEqual(self.apply("ABCDE", moves), list("BCDEA"))
+
+    def test_unchanged(self):
+        self.assertEqual(minimal_moves("ABCDE", "ABCDE"), [])
+
+    def test_reverse(self):
+        moves = minimal_moves("ABCDE", "EDCBA")
+        self.assertEqual(len(moves), 4)
+        self.assertEqual(self.apply("ABCDE", moves), list("EDCBA"))
+
+    def test_random(self):
+        random_state = random.Random(3)
+        for size in range(10):
+            for repetition in range(50):
+                new = list(range(size))
+                random_state.shuffle(new)
+                moves = minimal_moves(list(range(size)), new)
+                self.assertEqual(self.apply(range(size), moves), new)
+
+    def test_minimal(self):
+        # a breadth first search over all orderings finds the fewest moves
+        random_state = random.Random(4)
+        for size in range(1, 7):
+            old = tuple(range(size))
+            distances = {old: 0}
+            queue = collections.deque([old])
+            while queue:
+                ordering = queue.popleft()
+                for source in range(size):
+                    for destination in range(size):
+                        moved = list(ordering)
+                        moved.insert(destination, moved.pop(source))
+                        moved = tuple(moved)
+                        if moved not in distances:
+                            distances[moved] = distances[ordering] + 1
+                            queue.append(moved)
+
+            for repetition in range(20):
+                new = list(old)
+                random_state.shuffle(new)
+                moves = minimal_moves(list(old), new)
+                self.assertEqual(len(moves), distances[tuple(new)])
+                self.assertEqual(self.apply(old, moves), new)
+
+    def test_large(self):
+        # everything but a longest increasing subsequence of the new
+        # positions is moved, found by the quadratic reference
+        random_state = random.Random(5)
+        for size in (1000, 1001):
+            new = list(range(size))
+            random_state.shuffle(new)
+            for start in range(0, size, 50):
+                new[start:start + 40] = sorted(new[start:start + 40])
+
+            positions = [0] * size
+            for position, participant in enumerate(new):
+                positions[participant] = position
+            lengths = []
+            for idx, position in enumerate(positions):
+                lengths.append(1 + max([lengths[previous]
+                                        for previous in range(idx)
+                                        if positions[previous] < position] or
+                                       [0]))
+
+            moves = minimal_moves(list(range(size)), new)
+            self.assertEqual(len(moves), size - max(lengths))
+            self.assertEqual(self.apply(range(size), moves), new)
+
+
+class TestParticipantsList(unittest.TestCase):
+    def setUp(self):
+        self.pc = PCState("PC", 4, 4, 10, 1)
+        self.npcs = [NPCState("NPC %i" % i, 3, 3, 8, 1) for i in range(5)]
+        self.participants = participants_list([self.pc] + self.npcs)
+
+    def test_pending(self):
+        self.participants.reshuffle(pending=[self.pc])
+        self.assertEqual(self.pc.order, 9)
+        self.assertTrue(self.pc in self.participants.pending)
+
+        old_position = self.participants.index.position(self.pc)
+        self.assertEqual(self.participants.submit_initiative(self.pc, 6),
+                         (old_position, 0))
+        self.assertEqual(self.pc.order, 14)
+        self.assertFalse(self.participants.pending)
+
+    def test_add_remove(self):
+        newcomer = NPCState("Newcomer", 10, 10, 8, 1)
+        self.assertEqual(self.participants.add(newcomer), 0)
+        self.assertEqual(len(self.participants.roster), 7)
+
+        self.participants.remove(self.npcs[0])
+        self.assertFalse(self.npcs[0] in self.participants.index)
+        self.assertEqual(len(self.participants), 6)
+
+    def test_deferred_rebuild(self):
+        # a view moves the rows one by one before the order is applied
+        index = self.participants.index
+        old_order = list(index)
+        self.participants.reshuffle(rebuild=False)
+        self.assertEqual(list(index), old_order)
+
+        keyed = index.sorted_keys()
+        new_order = [participant for key, participant in keyed]
+        for source, destination in minimal_moves(old_order, new_order):
+            index.move(source, destination)
+        self.assertEqual(list(index), new_order)
+
+        index.set_order(keyed)
+        self.assertEqual([index.position(participant)
+                          for participant in new_order],
+                         list(range(len(new_order))))
+
+    def test_sorted_columns(self):
+        # the roster columns give the same keys as the participants
+        random_state = random.Random(3)
+        for idx in range(200):
+            npc = NPCState("Extra %i" % idx, random_state.randint(1, 4), 1,
+                           8, 1)
+            self.participants.add(npc)
+        self.participants.remove(self.npcs[2])
+        self.participants.reshuffle(rebuild=False)
+
+        index = self.participants.index
+        keyed = index.sorted_keys()
+        index.roster = None
+        self.assertEqual(keyed, index.sorted_keys())
+
+
+if __name__ == '__main__':
+
+    for test_case in (TestInitiativeIndex, TestMinimalMoves,
+                      TestParticipantsList):
+        suite = unittest.TestLoader().loadTestsFromTestCase(test_case)
+        unittest.TextTestRunner(verbosity=2).run(suite)
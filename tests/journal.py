@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from effects import Effect, EffectScheduler
+from initiative import participants_list
+from journal import Journal, recover
+from state import NPCState, PCState, SquadState
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "battle.journal")
+        self.participants = participants_list(
+            [PCState("PC", 5, 4, 10, 2)] +
+            [NPCState("NPC %i" % idx, 3 + idx, 3, 8, 1) for idx in range(5)] +
+            [SquadState("Mook", 6, 4, 10, 1, size=4)])
+
+        self.squad = self.participants.roster.states[-1]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def start(self, **kwargs):
+        journal = Journal(self.path, flush_interval=0.01, **kwargs)
+        for state in self.participants:
+            journal.watch(state)
+
+        return journal
+
+    def check_recovered(self):
+        states, round, effects = recover(self.path)
+        self.assertEqual(round, self.participants.round)
+
+        expected = sorted((state.name, state.hps, state.order,
+                           state.current_stance, state.player_controlled,
+                           type(state))
+                          for state in self.participants)
+        self.assertEqual(sorted((state.name, state.hps, state.order,
+                                 state.current_stance,
+                                 state.player_controlled, type(state))
+                                for state in states), expected)
+
+        squad = [state for state in states if state.name == "Mook"][0]
+        self.assertEqual(squad.member_hps, self.squad.member_hps)
+
+    def test_recover(self):
+        self.assertEqual(recover(self.path), None)
+
+        journal = self.start()
+        for round in range(3):
+            self.participants.reshuffle()
+            journal.record_round(self.participants)
+            self.participants[0].reduce_hitpoints()
+            self.participants[1].choose_stance(2)
+            self.squad.reduce_hitpoints(4)
+        journal.flush()
+
+        self.check_recovered()
+        journal.close()
+
+    def test_compaction(self):
+        journal = self.start(compact_every=7)
+        for round in range(20):
+            self.participants.reshuffle()
+            journal.record_round(self.participants)
+            self.participants[-1].reduce_hitpoints()
+        journal.flush()
+
+        self.assertTrue(os.path.exists(journal.snapshot_path))
+        with open(self.path) as journal_file:
+            self.assertTrue(len(journal_file.readlines()) < 7)
+        self.check_recovered()
+        journal.close()
+
+    def test_remove(self):
+        journal = self.start(compact_every=3)
+        state = self.participants.roster.states[1]
+        self.participants.remove(state)
+        journal.forget(state)
+        journal.flush()
+
+        self.check_recovered()
+
+        self.participants.add(state)
+        journal.watch(state)
+        state.reduce_hitpoints()
+        journal.flush()
+
+        self.check_recovered()
+        journal.close()
+
+    def test_cut_off_record(self):
+        journal = self.start()
+        self.participants[0].reduce_hitpoints()
+        journal.close()
+
+        with open(self.path, "a") as journal_file:
+            journal_file.write('{"n": 99, "set": [0, "hp')
+        self.check_recovered()
+
+    def test_effects(self):
+        journal = self.start(compact_every=4)
+        scheduler = EffectScheduler()
+        journal.watch_effects(scheduler)
+        target = self.participants.roster.states[1]
+        scheduler.add(Effect(target, "Stun", defense=-4), 2)
+        scheduler.add(Effect(target, "Bleeding", damage=1), 3)
+        scheduler.advance(1)
+        journal.flush()
+        journal.close()
+
+        states, round, effects = recover(self.path)
+        recovered = [state for state in states if state.name == target.name]
+        self.assertEqual(recovered[0].effect_defense_modifier, -4)
+        self.assertEqual(sorted(effect.name for effect in effects),
+                         ["Bleeding", "Stun"])
+        self.assertTrue(all(effect.target is recovered[0]
+                            for effect in effects))
+
+        # the recovered effects still expire and deal their damage
+        resumed = EffectScheduler()
+        resumed.advance(1)
+        for effect in effects:
+            resumed.resume(effect)
+        hps = recovered[0].hps
+        resumed.advance(2)
+        self.assertEqual(recovered[0].effect_defense_modifier, 0)
+        resumed.advance(3)
+        self.assertEqual(recovered[0].hps, hps - 2)
+        self.assertEqual(len(resumed.effects), 0)
+
+    def test_batches(self):
+        fsyncs = []
+        fsync = os.fsync
+
+        def counting_fsync(descriptor):
+            fsyncs.append(descriptor)
+            fsync(descriptor)
+
+        journal = Journal(self.path, flush_interval=0.2)
+        os.fsync = counting_fsync
+        try:
+            # 50 changes over half a second are written in about 3 batches
+            state = self.participants.roster.states[1]
+            journal.watch(state)
+            for idx in range(49):
+                state.reduce_hitpoints()
+                time.sleep(0.01)
+            journal.flush()
+        finally:
+            os.fsync = fsync
+        journal.close()
+
+        self.assertTrue(1 <= len(fsyncs) <= 5)
+        states, round, effects = recover(self.path)
+        self.assertEqual(states[0].hps, state.hps)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestJournal)
+    unittest.TextTestRunner(verbosity=2).run(suite)
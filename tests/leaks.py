@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import collections
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+from leaks import LeakDetector, MemoryTracer, census
+from state import NPCState
+
+
+class TestLeaks(unittest.TestCase):
+    def test_census(self):
+        states = [NPCState("NPC %i" % idx, 5, 3, 8, 1) for idx in range(7)]
+        self.assertTrue(census()["NPCState"] >= len(states))
+
+    def test_growth(self):
+        detector = LeakDetector(window=3, slack=5)
+        leaked = []
+        for round in range(6):
+            leaked.extend(object() for idx in range(20))
+            detector.record(round, 10, {"leaked": len(leaked),
+                                        "constant": 50})
+        self.assertEqual([growth.name for growth in detector.suspects()],
+                         ["leaked"])
+        self.assertEqual(len(detector.report()), 2)
+
+    def test_roster_growth(self):
+        # objects of combatants joining the battle are no leak
+        detector = LeakDetector(window=3, slack=5)
+        for round in range(6):
+            roster_size = 10 * (round + 1)
+            detector.record(round, roster_size, {"NPCState": roster_size})
+        self.assertEqual(detector.suspects(), [])
+
+    def test_short_growth(self):
+        detector = LeakDetector(window=3, slack=5)
+        for round, count in enumerate([10, 100, 100, 100, 200]):
+            detector.record(round, 10, {"cache": count})
+        self.assertEqual(detector.suspects(), [])
+
+    def test_memory(self):
+        tracer = MemoryTracer()
+        self.assertTrue(tracer.current() > 0)
+        self.assertEqual(tracer.top_growth(), [])
+
+        leaked = [[idx] * 100 for idx in range(1000)]
+        sizes = collections.Counter()
+        counts = census(sizes)
+        self.assertTrue(counts["list"] >= len(leaked))
+        tracer.record(sizes)
+        self.assertTrue(tracer.top_growth()[0].startswith("list: +"))
+        self.assertTrue(tracer.current() >
+                        sum(tracer.baseline.values()) + 100 * len(leaked))
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestLeaks)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from initiative import participants_list
+from metrics import Metrics, metrics, timed
+from state import NPCState
+
+
+class TestMetrics(unittest.TestCase):
+    def test_timer(self):
+        registry = Metrics()
+        for idx in range(3):
+            with registry.timer("round"):
+                with registry.timer("round.roll"):
+                    pass
+        registry.increment("rows", 5)
+        registry.increment("rows")
+
+        self.assertEqual(registry.timers["round"].count, 3)
+        self.assertTrue(registry.timers["round"].maximum >=
+                        registry.timers["round"].mean)
+        self.assertEqual([name for name, timer in registry.stages("round")],
+                         ["round.roll"])
+        self.assertEqual(registry.counters["rows"], 6)
+
+    def test_disabled(self):
+        registry = Metrics(enabled=False)
+        with registry.timer("round"):
+            pass
+        registry.increment("rows")
+
+        self.assertEqual(registry.timers, {})
+        self.assertEqual(registry.counters, {})
+
+    def test_decorator(self):
+        @timed("test.add")
+        def add(a, b):
+            return a + b
+
+        count = (metrics().timers["test.add"].count
+                 if "test.add" in metrics().timers else 0)
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(metrics().timers["test.add"].count, count + 1)
+
+    def test_reshuffle_stages(self):
+        participants = participants_list(
+            [NPCState("NPC %i" % idx, 3 + idx, 3, 8, 1) for idx in range(5)])
+        participants.reshuffle()
+
+        stages = dict(metrics().stages("round.reshuffle"))
+        for stage in ("roll", "push", "sort"):
+            self.assertTrue("round.reshuffle." + stage in stages)
+
+    def test_dump(self):
+        registry = Metrics()
+        with registry.timer("round.reshuffle"):
+            pass
+        registry.increment("render.dirty_states", 2)
+
+        text = registry.to_prometheus()
+        self.assertTrue("fsga_round_reshuffle_seconds_count 1\n" in text)
+        self.assertTrue("fsga_render_dirty_states_total 2\n" in text)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "metrics.json")
+            registry.dump(path)
+            with open(path) as dump_file:
+                values = json.load(dump_file)
+            self.assertEqual(values["timers"]["round.reshuffle"]["count"], 1)
+            self.assertEqual(values["counters"]["render.dirty_states"], 2)
+
+            path = os.path.join(directory, "metrics.prom")
+            registry.dump(path)
+            with open(path) as dump_file:
+                self.assertEqual(dump_file.read(), text)
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMetrics)
+    unittest.TextTestRunner(verbosity=2).run(suite)
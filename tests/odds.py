@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import itertools
+import unittest
+
+import numpy as np
+
+from odds import InitiativeOdds, act_before
+
+
+def enumerate_ranks(bases, tiebreaks):
+    """
+    Expected ranks by enumerating all combinations of rolls.
+    """
+    ranks = np.zeros(len(bases))
+    combinations = 0
+    for rolls in itertools.product(range(1, 7), repeat=len(bases)):
+        keys = sorted(((-(base + roll), -tiebreak, idx)
+                       for idx, (base, roll, tiebreak)
+                       in enumerate(zip(bases, rolls, tiebreaks))))
+        for rank, key in enumerate(keys, 1):
+            ranks[key[2]] += rank
+        combinations += 1
+
+    return ranks / combinations
+
+
+class TestOdds(unittest.TestCase):
+    def test_act_before(self):
+        probabilities = act_before(9, 1, [9, 9, 3, 15, 20, 8], [0, 2, 0, 0,
+                                                                0, 0])
+        self.assertAlmostEqual(probabilities[0], 21 / 36.)
+        self.assertAlmostEqual(probabilities[1], 15 / 36.)
+        self.assertAlmostEqual(probabilities[2], 1.)
+        self.assertAlmostEqual(probabilities[3], 0.)
+        self.assertAlmostEqual(probabilities[4], 0.)
+        self.assertAlmostEqual(probabilities[5], 26 / 36.)
+
+    def test_ranks(self):
+        bases = [9, 11, 9, 4, 13]
+        tiebreaks = [5, 3, 4, 7, 1]
+        odds = InitiativeOdds(bases, tiebreaks)
+        ranks = odds.compute(block_size=2)
+        expected = enumerate_ranks(bases, tiebreaks)
+        for rank, expected_rank in zip(ranks, expected):
+            self.assertAlmostEqual(rank, expected_rank)
+
+        odds.update(3, 12, 7)
+        bases[3] = 12
+        expected = enumerate_ranks(bases, tiebreaks)
+        for rank, expected_rank in zip(odds.ranks, expected):
+            self.assertAlmostEqual(rank, expected_rank)
+
+    def test_add_remove(self):
+        bases = [9, 11, 9, 4]
+        tiebreaks = [5, 3, 4, 7]
+        odds = InitiativeOdds(bases, tiebreaks)
+        odds.compute()
+
+        self.assertEqual(odds.add(13, 1), 4)
+        expected = enumerate_ranks(bases + [13], tiebreaks + [1])
+        for rank, expected_rank in zip(odds.ranks, expected):
+            self.assertAlmostEqual(rank, expected_rank)
+
+        # the last combatant takes the place of the removed one
+        odds.remove(1)
+        bases = [9, 13, 9, 4]
+        tiebreaks = [5, 1, 4, 7]
+        self.assertEqual(odds.bases.tolist(), bases)
+        self.assertEqual(odds.tiebreaks.tolist(), tiebreaks)
+        expected = enumerate_ranks(bases, tiebreaks)
+        for rank, expected_rank in zip(odds.ranks, expected):
+            self.assertAlmostEqual(rank, expected_rank)
+
+        odds.remove(3)
+        self.assertEqual(len(odds), 3)
+        for rank, expected_rank in zip(
+                odds.ranks, enumerate_ranks(bases[:3], tiebreaks[:3])):
+            self.assertAlmostEqual(rank, expected_rank)
+
+    def test_cancel(self):
+        odds = InitiativeOdds(range(1000), range(1000))
+        self.assertEqual(odds.compute(lambda: True), None)
+        self.assertEqual(odds.ranks, None)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestOdds)
+    unittest.TextTestRunner(verbosity=2).run(suite)
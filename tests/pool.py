@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import sys
+
+sys.path.insert(0, "../src")
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from initiative import participants_list
+from pool import ACTIVE, GRAVEYARD, RESERVE, Pool, RosterRecord, ValueIndex
+from rosterfile import RosterFile, write_roster
+from state import NPCState, PCState, SquadState
+
+
+class TestValueIndex(unittest.TestCase):
+    def test_range(self):
+        index = ValueIndex()
+        for value in (3, 5, 5, 8, 1):
+            index.add(value, "o%i" % value)
+        index.add(5, "other")
+
+        self.assertEqual(index.range(3, 5), set(["o3", "o5", "other"]))
+        self.assertEqual(index.range(high=2), set(["o1"]))
+        self.assertEqual(index.range(6), set(["o8"]))
+
+        index.discard(5, "o5")
+        index.discard(5, "other")
+        self.assertEqual(index.values, [1, 3, 8])
+
+    def test_prefix(self):
+        index = ValueIndex()
+        for name in ("Guard 1", "Guard 2", "Gunner", "Vorox"):
+            index.add(name, name)
+
+        self.assertEqual(index.prefix("Gua"), set(["Guard 1", "Guard 2"]))
+        self.assertEqual(index.prefix("X"), set())
+
+    def test_add_array(self):
+        index = ValueIndex()
+        index.add(4, "other")
+        index.add_array(np.array([5, 2, 5, 4, 9], dtype=np.uint16))
+
+        self.assertEqual(index.values, [2, 4, 5, 9])
+        self.assertEqual(index.range(4, 5), set([0, 2, 3, "other"]))
+        self.assertEqual(index.get(9), set([4]))
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        self.pc = PCState("PC", 5, 4, 10, 2)
+        self.battle = participants_list(
+            [self.pc, NPCState("Bandit", 4, 3, 8, 1, faction="Bandits")])
+        self.reserve = [NPCState("Guard %i" % idx, 3 + idx % 5, 4, 9, 2,
+                                 faction="Decados")
+                        for idx in range(100)]
+        self.pool = Pool(self.battle, self.reserve)
+
+    def test_moves(self):
+        guard = self.reserve[7]
+        self.pool.activate(guard)
+        self.assertEqual(self.pool.location[guard], ACTIVE)
+        self.assertEqual(len(self.battle), 3)
+        self.assertTrue(guard in self.battle.index)
+        orders = [state.order for state in self.battle]
+        self.assertEqual(orders, sorted(orders, reverse=True))
+
+        self.pool.kill(guard)
+        self.assertEqual(len(self.battle), 2)
+        self.assertTrue(guard in self.pool.sets[GRAVEYARD])
+
+        guard.reduce_hitpoints(12)
+        self.pool.revive(guard)
+        self.assertEqual(guard.hps, 1)
+        self.assertEqual(len(self.battle), 3)
+
+        self.pool.retreat(self.pc)
+        self.assertEqual(self.pool.location[self.pc], RESERVE)
+        self.assertFalse(self.pc in self.battle.index)
+
+    def test_find(self):
+        self.assertEqual(len(self.pool.find()), 102)
+        self.assertEqual(len(self.pool.find(faction="Decados")), 100)
+        self.assertEqual(len(self.pool.find("Guard 1")), 11)
+
+        found = self.pool.find(faction="Decados", dexterity=(6, None))
+        self.assertEqual(len(found), 40)
+        self.assertTrue(all(state.dexterity >= 6 for state in found))
+
+        self.assertEqual(self.pool.find(location=ACTIVE, base_hps=(9, 9)),
+                         [])
+        self.pool.activate(self.reserve[0])
+        self.assertEqual(self.pool.find(location=ACTIVE, base_hps=(9, 9)),
+                         [self.reserve[0]])
+
+    def test_limit(self):
+        everybody = self.pool.find()
+        for kwargs in ({}, {"faction": "Decados"}, {"name": "Guard"},
+                       {"location": RESERVE, "dexterity": (6, None)},
+                       {"dexterity": (None, None)}):
+            expected = [state.name for state in self.pool.find(**kwargs)]
+            for limit in (1, 5, 200):
+                found = self.pool.find(limit=limit, **kwargs)
+                self.assertEqual([state.name for state in found],
+                                 expected[:limit])
+        self.assertEqual(len(self.pool.find(dexterity=(None, None))),
+                         len(everybody))
+
+    def test_discard(self):
+        self.pool.discard(self.pc)
+        self.assertEqual(self.pool.find("PC"), [])
+        self.assertEqual(len(self.battle), 1)
+        self.assertRaises(ValueError, self.pool.add, self.reserve[0])
+        self.assertEqual(self.pc.observers, ())
+
+    def test_squad_split(self):
+        squad = SquadState("Militia", 4, 3, 6, 1, size=3)
+        self.pool.add(squad, ACTIVE)
+        self.assertEqual(self.pool.find(base_hps=(18, 18)), [squad])
+
+        member = squad.split(0)
+        self.pool.add(member, ACTIVE)
+        self.assertEqual(self.pool.find(base_hps=(12, 12)), [squad])
+        self.assertEqual(self.pool.find(base_hps=(18, 18)), [])
+        self.assertEqual(self.pool.find(name="Militia", base_hps=(None, 6)),
+                         [member])
+
+
+class TestAttachedRoster(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, "guards.fsga")
+        states = [NPCState("Guard %i" % idx, 3 + idx % 5, 4, 9 + idx % 3,
+                           2, faction=("Decados", "Hazat")[idx % 2])
+                  for idx in range(300)]
+        states.append(NPCState(u"G\xe4rtner", 6, 4, 10, 1, 2, "Decados"))
+        write_roster(path, states)
+        self.roster_file = RosterFile(path)
+
+        self.reserve = [NPCState("Guard %i b" % idx, 4, 4, 9, 2,
+                                 faction="Decados") for idx in range(20)]
+        self.pool = Pool(participants_list([PCState("PC", 5, 4, 10, 2)]),
+                         self.reserve)
+        self.pool.attach(self.roster_file)
+        # the same combatants without the file
+        self.loaded = Pool(participants_list([PCState("PC", 5, 4, 10, 2)]),
+                           self.reserve + list(RosterFile(path)))
+
+    def tearDown(self):
+        self.roster_file.close()
+        shutil.rmtree(self.directory)
+
+    def test_find(self):
+        for kwargs in ({}, {"name": "Guard 1"}, {"name": u"G\xe4"},
+                       {"faction": "Hazat"}, {"faction": "Nobody"},
+                       {"location": RESERVE, "base_hps": (10, None)},
+                       {"name": "Guard", "dexterity": (None, 4),
+                        "faction": "Decados"}):
+            expected = [state.name for state in self.loaded.find(**kwargs)]
+            for limit in (None, 1, 30):
+                found = self.pool.find(limit=limit, **kwargs)
+                self.assertEqual([obj.name for obj in found],
+                                 expected[:limit])
+
+        self.assertEqual(self.pool.find(location=ACTIVE),
+                         self.pool.find(location=ACTIVE, limit=5))
+        self.assertEqual(len(self.pool), 322)
+        # searching creates no states
+        self.assertEqual(self.roster_file._states, {})
+
+    def test_activate(self):
+        record = self.pool.find(name="Guard 12", limit=1)[0]
+        self.assertTrue(isinstance(record, RosterRecord))
+        self.assertTrue(record in self.pool)
+
+        self.pool.activate(record)
+        state = self.roster_file[record.index]
+        self.assertEqual(state.name, "Guard 12")
+        self.assertEqual(self.pool.location[state], ACTIVE)
+        self.assertTrue(state in self.pool.battle.index)
+        self.assertFalse(record in self.pool)
+        self.assertEqual(len(self.roster_file._states), 1)
+        self.assertEqual(len(self.pool), 322)
+
+        # the record is found as its state from now on
+        self.assertEqual(self.pool.find(name="Guard 12", limit=1), [state])
+        self.assertTrue(self.pool.materialize(record) is state)
+        self.pool.retreat(state)
+        self.assertEqual(self.pool.find(name="Guard 12", location=RESERVE,
+                                        limit=1), [state])
+
+    def test_discard(self):
+        record = self.pool.find(name="Guard 12", limit=1)[0]
+        activated = self.pool.find(name="Guard 120", limit=1)[0]
+        self.pool.activate(activated)
+        self.pool.discard(record)
+        self.pool.discard(activated)
+
+        self.assertFalse(record in self.pool)
+        for found in (self.pool.find(name="Guard 12"),
+                      self.pool.find(name="Guard 12", dexterity=(3, 7))):
+            self.assertEqual([obj.name for obj in found],
+                             ["Guard 12 b"] +
+                             ["Guard %i" % idx for idx in range(121, 130)])
+        self.assertEqual(len(self.pool.battle), 1)
+        self.assertEqual(len(self.pool), 320)
+
+
+if __name__ == '__main__':
+
+    for test_case in (TestValueIndex, TestPool, TestAttachedRoster):
+        suite = unittest.TestLoader().loadTestsFromTestCase(test_case)
+        unittest.TextTestRunner(verbosity=2).run(suite)
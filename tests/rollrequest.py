@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+from rollrequest import (is_authorized, is_metrics_request, new_token, page,
+                         parse_roll_request, response)
+
+
+class TestRollRequest(unittest.TestCase):
+    def test_parse_roll_request(self):
+        self.assertEqual(
+            parse_roll_request("GET /roll?id=3&value=4 HTTP/1.1"), (3, 4))
+        self.assertEqual(parse_roll_request("GET /roll?value=4&id=12"),
+                         (12, 4))
+        for line in ("", "GET", "POST /roll?id=3&value=4 HTTP/1.1",
+                     "GET /other?id=3&value=4 HTTP/1.1",
+                     "GET /roll?id=3 HTTP/1.1",
+                     "GET /roll?id=Nader&value=4 HTTP/1.1",
+                     "GET /roll?id=3&value=four HTTP/1.1"):
+            self.assertEqual(parse_roll_request(line), None)
+
+    def test_is_metrics_request(self):
+        self.assertTrue(is_metrics_request("GET /metrics HTTP/1.1"))
+        self.assertTrue(is_metrics_request("GET /metrics?x=1 HTTP/1.0"))
+        self.assertFalse(is_metrics_request("POST /metrics HTTP/1.1"))
+        self.assertFalse(is_metrics_request("GET /roll HTTP/1.1"))
+        self.assertFalse(is_metrics_request("GET"))
+
+    def test_is_authorized(self):
+        token = new_token()
+        self.assertNotEqual(token, new_token())
+        self.assertTrue(is_authorized("GET /?token=%s HTTP/1.1" % token,
+                                      token))
+        self.assertTrue(is_authorized(
+            "GET /roll?id=3&value=4&token=%s HTTP/1.1" % token, token))
+        for line in ("GET / HTTP/1.1", "GET /?token= HTTP/1.1",
+                     "GET /?token=%s0 HTTP/1.1" % token,
+                     "POST /?token=%s HTTP/1.1" % token, ""):
+            self.assertFalse(is_authorized(line, token))
+
+    def test_page(self):
+        body = page("G\xc3\xa4rtner rolled 4.",
+                    [(1, u"G\xe4rtner"), (2, "<Bob>")], u"0123abcd")
+        text = body.decode("utf-8")
+        self.assertTrue(u"G\xe4rtner rolled 4." in text)
+        self.assertTrue(u'<option value="1">G\xe4rtner</option>' in text)
+        self.assertTrue(u'<option value="2">&lt;Bob&gt;</option>' in text)
+        self.assertTrue(u'name="token" type="hidden" value="0123abcd"' in text)
+
+        data = response(body, b"text/html; charset=utf-8")
+        header, content = data.split(b"\r\n\r\n", 1)
+        self.assertEqual(content, body)
+        self.assertTrue(b"Content-Length: %i" % len(body) in header)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRollRequest)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+import numpy as np
+
+from state import NPCState, PCState
+from roster import Roster
+
+
+class TestRoster(unittest.TestCase):
+    def setUp(self):
+        self.states = [NPCState("NPC %i" % i, 3, i, 8, 1) for i in range(20)]
+        self.pc = PCState("PC", 5, 5, 10, 2)
+        self.states.append(self.pc)
+
+        self.roster = Roster(self.states)
+
+    def test_columns(self):
+        self.assertEqual(len(self.roster), 21)
+        self.assertEqual(self.roster.wits.tolist()[:3], [0, 1, 2])
+        self.assertEqual(self.roster.player_controlled.sum(), 1)
+
+    def test_next_round(self):
+        self.pc.choose_stance(3)
+        self.roster.pull("current_stance")
+
+        rolls = self.roster.next_round({self.pc: 6},
+                                       np.random.RandomState(42))
+        self.assertTrue(np.all((rolls >= 1) & (rolls <= 6)))
+        self.assertTrue(np.all(self.roster.order ==
+                               self.roster.base_initiative + rolls))
+
+        self.roster.push("order", "temporary_defense_modifier")
+        self.assertEqual(self.pc.order, 16)
+        self.assertEqual(self.pc.current_defense(), 6)
+        self.assertEqual(self.roster.current_defense()[-1], 6)
+
+    def test_observed(self):
+        changes = []
+        self.pc.add_observer(lambda *change: changes.append(change))
+
+        self.pc.choose_stance(3)
+        self.pc.reduce_hitpoints(4)
+        self.pc.set_defense_modifier(2)
+        self.assertEqual(self.roster.current_stance[-1], 3)
+        self.assertEqual(self.roster.hps[-1], 6)
+        self.assertEqual(self.roster.current_defense()[-1],
+                         self.pc.current_defense())
+
+        self.pc.set_initiative_roll(1)
+        del changes[:]
+        self.roster.next_round({self.pc: 6}, np.random.RandomState(42))
+        self.roster.push("order", "temporary_defense_modifier")
+        self.assertEqual(changes, [
+            (self.pc, "order", 11, 16),
+            (self.pc, "temporary_defense_modifier", 0, 4)])
+
+        self.roster.remove(self.pc)
+        self.pc.reduce_hitpoints(1)
+        self.assertEqual(self.roster.hps.tolist(), [8] * 20)
+
+    def test_push_changed(self):
+        changes = []
+        for state in self.states:
+            state.add_observer(lambda *change: changes.append(change))
+
+        self.roster.order[3] += 1
+        self.roster.push("order", "temporary_defense_modifier")
+        self.assertEqual(changes, [(self.states[3], "order",
+                                    self.states[3].order - 1,
+                                    self.states[3].order)])
+
+        del changes[:]
+        self.roster.push("order")
+        self.assertEqual(changes, [])
+
+    def test_remove(self):
+        self.roster.remove(self.states[0])
+        self.assertEqual(len(self.roster), 20)
+        self.assertEqual(self.roster.states[0], self.pc)
+        self.assertEqual(self.roster.rows[self.pc], 0)
+        self.assertEqual(self.roster.base_initiative[0], 10)
+
+        self.roster.append(self.states[0])
+        self.assertEqual(self.roster.rows[self.states[0]], 20)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRoster)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rosterfile import (RosterFile, count, export_csv, export_json,
+                        import_csv, import_json, load, save, stream,
+                        write_roster)
+from state import NPCState, PCState
+
+
+def summary(state):
+    return (type(state), state.name, state.faction, state.notes,
+            state.dexterity, state.wits, state.hps, state.base_hps,
+            state.base_defense, state.defense_modifier)
+
+
+class TestRosterFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.states = [PCState("Nader", 3, 8, 9, 1, notes="Hawkwood"),
+                       NPCState(u"Gärtner", 6, 4, 10, 1, 2, "Decados")]
+        self.states.extend(NPCState("Guard %i" % idx, 3 + idx % 5, 4, 9, 2,
+                                    faction="Decados")
+                           for idx in range(1000))
+        self.states[1].reduce_hitpoints(3)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_binary(self):
+        path = self.path("library.fsr")
+        self.assertEqual(write_roster(path, iter(self.states)), 1002)
+
+        roster_file = RosterFile(path)
+        self.assertEqual(len(roster_file), 1002)
+        self.assertEqual(roster_file.name(1), u"Gärtner")
+        self.assertEqual(summary(roster_file[1]), summary(self.states[1]))
+        self.assertTrue(roster_file[1] is roster_file[1])
+        self.assertEqual(len(roster_file._states), 1)
+
+        strong = (roster_file.records["dexterity"] >= 6).sum()
+        self.assertEqual(strong,
+                         sum(state.dexterity >= 6 for state in self.states))
+
+        self.assertEqual([summary(state) for state in roster_file],
+                         [summary(state) for state in self.states])
+        roster_file.close()
+
+    def test_search(self):
+        path = self.path("library.fsr")
+        write_roster(path, self.states)
+        roster_file = RosterFile(path)
+
+        names = [roster_file.name(index)
+                 for index in roster_file.by_name(u"Guard 99")]
+        self.assertEqual(names, sorted(u"Guard 99%s" % suffix for suffix in
+                                       [""] + list(range(10))))
+        self.assertEqual(list(roster_file.by_name(u"G\xe4")), [1])
+        self.assertEqual(len(roster_file.by_name(u"X")), 0)
+        self.assertEqual(len(roster_file.by_name()), 1002)
+
+        self.assertEqual(roster_file.with_faction(u"Decados").sum(), 1001)
+        self.assertEqual(roster_file.with_faction(u"Hazat").sum(), 0)
+        self.assertEqual(roster_file._states, {})
+        roster_file.close()
+
+    def test_interchange(self):
+        with open(self.path("pool.csv"), "wb") as output:
+            export_csv(self.states, output)
+        with open(self.path("pool.csv"), "rb") as input:
+            states = list(import_csv(input))
+        self.assertEqual([summary(state) for state in states],
+                         [summary(state) for state in self.states])
+
+        with open(self.path("pool.jsonl"), "w") as output:
+            export_json(self.states, output)
+        with open(self.path("pool.jsonl")) as input:
+            states = list(import_json(input))
+        self.assertEqual([summary(state) for state in states],
+                         [summary(state) for state in self.states])
+
+    def test_by_extension(self):
+        for name in ("pool.fsr", "pool.csv", "pool.jsonl"):
+            save(self.path(name), self.states[:3])
+            self.assertEqual([summary(state)
+                              for state in load(self.path(name))],
+                             [summary(state) for state in self.states[:3]])
+
+    def test_stream(self):
+        save(self.path("pool.fsr"), self.states)
+        save(self.path("pool.jsonl"), self.states)
+        self.assertEqual(count(self.path("pool.fsr")), 1002)
+        self.assertEqual(count(self.path("pool.jsonl")), None)
+
+        for name in ("pool.fsr", "pool.jsonl"):
+            states = stream(self.path(name))
+            self.assertEqual(summary(next(states)), summary(self.states[0]))
+            self.assertEqual(len(list(states)), 1001)
+
+    def test_not_a_roster(self):
+        with open(self.path("other.fsr"), "wb") as output:
+            output.write(b"something else entirely")
+        self.assertRaises(ValueError, RosterFile, self.path("other.fsr"))
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRosterFile)
+    unittest.TextTestRunner(verbosity=2).run(suite)
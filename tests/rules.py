@@ -4,25 +4,30 @@ import sys
 
 sys.path.insert(0, "../src")
 
+import subprocess
 import unittest
 
-from rules import NPC
+# modules that have to work without a user interface
+HEADLESS = ["rules", "state", "initiative", "roster", "ruletable", "dice",
+            "combatlog", "journal", "pool", "rosterfile", "generator",
+            "odds", "delta", "metrics", "leaks", "simulator"]
 
 
-class TestMultiMap(unittest.TestCase):
-    def setUp(self):
-        char = NPC("NPC", 3, 3, 8, 1)
+class TestHeadless(unittest.TestCase):
+    def test_no_qt(self):
+        code = ("import sys; sys.path.insert(0, '../src'); import %s; "
+                "print('PySide' in sys.modules)" % ", ".join(HEADLESS))
+        output = subprocess.check_output([sys.executable, "-c", code])
+        self.assertEqual(output.strip(), b"False")
 
-    def test_get1(self):
-        self.assertTrue(np.all(
-            self.data.get("day", bird=1) ==
-            np.array([np.float(x + 1) for x in range(10)])))
-        self.assertTrue(np.all(
-            self.data.get("day", bird=2) ==
-            np.array([np.float(x + 1) for x in range(10) if x != 1])))
+    def test_rules(self):
+        from rules import NPCState, participants_list
 
+        participants = participants_list([NPCState("Bob", 6, 4, 10, 1)])
+        participants.reshuffle()
+        self.assertEqual(participants.round, 1)
 
 if __name__ == '__main__':
 
-    suite = unittest.TestLoader().loadTestsFromTestCase(TestMultiMap)
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestHeadless)
     unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from ruletable import (DEFAULT_RULES, RulesTable, load_rules, rules_table,
+                       set_rules_table)
+from state import NPCState
+
+
+class TestRulesTable(unittest.TestCase):
+    def setUp(self):
+        self.rules = {
+            "stances": [{"name": "neutral"},
+                        {"name": "careful", "defense": 1, "goal": -1}],
+            "conditions": [{"name": "prone", "defense": 2, "goal": -2},
+                           {"name": "blinded", "goal": -6}],
+        }
+
+    def tearDown(self):
+        set_rules_table(RulesTable(DEFAULT_RULES))
+
+    def test_default(self):
+        table = rules_table()
+        self.assertEqual(table.defense, (0, -2, 2, 4, -2))
+        self.assertEqual(table.stance_index("total defense"), 3)
+        self.assertFalse(table.attack[3])
+
+    def test_conditions(self):
+        table = RulesTable(self.rules)
+        both = table.condition_bit("prone") | table.condition_bit("blinded")
+        self.assertEqual(table.condition_goal[both], -8)
+        self.assertEqual(table.condition_defense[both], 2)
+
+        defense, goal = table.round_modifiers(np.array([0, 1, 1]),
+                                              np.array([0, 1, both]))
+        self.assertEqual(defense.tolist(), [0, 1, 1])
+        self.assertEqual(goal.tolist(), [0, -3, -9])
+
+    def test_house_rules(self):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w") as rules_file:
+            json.dump(self.rules, rules_file)
+
+        try:
+            load_rules(path)
+        finally:
+            os.remove(path)
+
+        char = NPCState("NPC", 3, 3, 8, 1)
+        char.choose_stance(1)
+        char.set_condition("prone")
+        char.next_round()
+        self.assertEqual(char.current_defense(), 4)
+        self.assertEqual(char.goal_modifier(), -3)
+
+        char.set_condition("prone", False)
+        self.assertEqual(char.current_defense(), 2)
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRulesTable)
+    unittest.TextTestRunner(verbosity=2).run(suite)
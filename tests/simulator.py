@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+from state import NPCState, PCState, SquadState
+from simulator import combatant_stats, simulate
+
+
+class TestSimulator(unittest.TestCase):
+    def setUp(self):
+        self.party = [PCState("PC %i" % i, 8, 8, 20, 2) for i in range(4)]
+        self.npcs = [NPCState("NPC %i" % i, 3, 3, 4, 0) for i in range(3)]
+
+    def test_reproducible(self):
+        first = simulate(self.party, self.npcs, 300, seed=7, processes=1,
+                         chunk_size=50)
+        second = simulate(self.party, self.npcs, 300, seed=7, processes=2,
+                          chunk_size=50)
+        self.assertEqual(first, second)
+
+    def test_result(self):
+        result = simulate(self.party, self.npcs, 200, seed=1, processes=1)
+        self.assertEqual(result.battles, 200)
+        self.assertTrue(result.win_probability > 0.95)
+        self.assertTrue(result.expected_rounds >= 1)
+        self.assertTrue(result.expected_pc_hp_loss >= 0)
+
+    def test_total_defense(self):
+        for pc in self.party:
+            pc.choose_stance(3)
+
+        result = simulate(self.party, self.npcs, 50, seed=1, processes=1,
+                          max_rounds=5)
+        self.assertEqual(result.win_probability, 0)
+
+    def test_defense(self):
+        npc = self.npcs[0]
+        npc.add_effect_modifiers(3, -2)
+        stats = combatant_stats(npc)
+        self.assertEqual(stats[3], npc.current_defense())
+        self.assertEqual(stats[3], 3)
+        self.assertEqual(stats[4], 6 + npc.goal_modifier())
+
+        # the modifiers of the current round end with the round
+        npc.reduce_defense(1)
+        self.assertEqual(combatant_stats(npc)[3], 3)
+
+        # the party cannot hit a defense above its goal numbers
+        for npc in self.npcs:
+            npc.add_effect_modifiers(20, 0)
+        result = simulate(self.party, self.npcs, 20, seed=1, processes=1,
+                          max_rounds=5)
+        self.assertEqual(result.win_probability, 0)
+
+    def test_stance(self):
+        npc = self.npcs[0]
+        npc.choose_stance(3)
+        stats = combatant_stats(npc)
+        self.assertEqual(stats[3], 4)
+        self.assertFalse(stats[5])
+
+        npc.choose_stance(4)
+        stats = combatant_stats(npc, damage_dice=1)
+        self.assertEqual(stats[3], -2)
+        self.assertEqual(stats[6], 3)
+        self.assertFalse(stats[7])
+
+    def test_squad(self):
+        squad = SquadState("NPC", 3, 3, 4, 0, size=4)
+        squad.reduce_member_hitpoints(1, 4)
+        self.assertEqual(
+            simulate(self.party, [squad], 100, seed=3, processes=1),
+            simulate(self.party, self.npcs, 100, seed=3, processes=1))
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSimulator)
+    unittest.TextTestRunner(verbosity=2).run(suite)
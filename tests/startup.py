@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Report of the startup time of the battle organizer.
+
+Every module is imported in a fresh process, so the reported time includes
+everything it imports. Modules that load Qt are marked. The cold start
+measures the time until the main window is shown, it needs a display,
+e.g. ``xvfb-run ./startup.py`` on a headless machine, and is skipped if
+PySide or the display is not available.
+
+Usage: ./startup.py [--budget 0.3] [--output startup.json]
+"""
+
+import os
+import sys
+
+import argparse
+import ast
+import glob
+import json
+import subprocess
+
+SOURCE = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src"))
+
+IMPORT = """
+import sys, timeit
+sys.path.insert(0, %r)
+start = timeit.default_timer()
+try:
+    __import__(%r)
+    error = None
+except ImportError as exception:
+    error = str(exception)
+print(repr((timeit.default_timer() - start, "PySide" in sys.modules, error)))
+"""
+
+HAS_PYSIDE = """
+try:
+    import PySide
+except ImportError:
+    print(False)
+else:
+    print(True)
+"""
+
+COLD_START = """
+import sys, timeit
+start = timeit.default_timer()
+sys.path.insert(0, %r)
+from PySide import QtCore, QtGui
+app = QtGui.QApplication(sys.argv)
+from initiative import participants_list
+from state import NPCState
+from widgets import TestWindow
+window = TestWindow(participants_list(
+    [NPCState("NPC %%i" %% idx, 5, 3, 8, 1) for idx in range(20)]))
+window.show()
+app.processEvents()
+shown = timeit.default_timer() - start
+QtCore.QTimer.singleShot(0, app.quit)
+app.exec_()
+print(repr((shown, timeit.default_timer() - start)))
+"""
+
+
+def run(code):
+    output = subprocess.check_output([sys.executable, "-c", code],
+                                     cwd=SOURCE)
+
+    return ast.literal_eval(output.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--budget", type=float, default=0.3,
+                        help="seconds until the window is shown")
+    parser.add_argument("--output", default="startup.json")
+    args = parser.parse_args()
+
+    modules = sorted(os.path.splitext(os.path.basename(path))[0]
+                     for path in glob.glob(os.path.join(SOURCE, "*.py")))
+
+    imports = {}
+    for module in modules:
+        seconds, qt, error = run(IMPORT % (SOURCE, module))
+        imports[module] = {"seconds": seconds, "qt": qt, "error": error}
+
+    for module in sorted(modules, key=lambda module: -imports[module]
+                         ["seconds"]):
+        result = imports[module]
+        if result["error"] is not None:
+            print("%-14s  not importable: %s" % (module, result["error"]))
+        else:
+            print("%-14s %8.3f s%s" % (module, result["seconds"],
+                                       "  Qt" if result["qt"] else ""))
+
+    report = {"imports": imports}
+    if not run(HAS_PYSIDE):
+        print("cold start skipped, PySide not available")
+    elif sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        print("cold start skipped, no display, try xvfb-run")
+    else:
+        try:
+            shown, first_iteration = run(COLD_START % SOURCE)
+        except subprocess.CalledProcessError as error:
+            print("cold start failed with exit status %i" % error.returncode)
+            sys.exit(1)
+
+        report["window_shown_s"] = shown
+        report["first_iteration_s"] = first_iteration
+        print("window shown after %.3f s, services started after %.3f s" %
+              (shown, first_iteration))
+
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if report.get("window_shown_s", 0) > args.budget:
+        print("startup exceeds the budget of %.3f s" % args.budget)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
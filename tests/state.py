@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+from state import NPCState, PCState, SquadState, form_squads, hp_bar
+
+
+class TestCombatantState(unittest.TestCase):
+    def setUp(self):
+        self.char = NPCState("NPC", 3, 3, 8, 1)
+
+    def test_initiative(self):
+        self.assertEqual(self.char.base_initiative, 6)
+        self.assertTrue(7 <= self.char.order <= 12)
+
+        self.char.next_round(4)
+        self.assertEqual(self.char.order, 10)
+
+    def test_stance(self):
+        self.char.choose_stance(3)
+        self.assertEqual(self.char.current_defense(), 1)
+
+        self.char.next_round()
+        self.assertEqual(self.char.current_defense(), 5)
+
+        self.char.choose_stance(1)
+        self.char.next_round()
+        self.assertEqual(self.char.current_defense(), -1)
+
+    def test_hitpoints(self):
+        self.char.reduce_hitpoints(3)
+        self.char.increase_hitpoints()
+        self.assertEqual(self.char.hps, 6)
+        self.assertEqual(self.char.base_hps, 8)
+
+    def test_hp_bar(self):
+        self.assertEqual(hp_bar(3, 5), "ooo__")
+        self.assertEqual(hp_bar(-1, 2), "__")
+        self.assertEqual(hp_bar(4, 2), "oooo")
+        self.assertTrue(hp_bar(3, 5) is hp_bar(3, 5))
+
+    def test_observers(self):
+        changes = []
+        self.char.add_observer(
+            lambda state, attribute, old, new: changes.append(attribute))
+
+        self.char.reduce_hitpoints(2)
+        self.char.choose_stance(0)
+        self.char.choose_stance(2)
+        self.assertEqual(changes, ["hps", "current_stance",
+                                   "next_round_defense_modifier"])
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.char, "__dict__"))
+        self.assertTrue(PCState("PC", 3, 3, 8, 1).player_controlled)
+        self.assertFalse(self.char.player_controlled)
+
+
+class TestSquadState(unittest.TestCase):
+    def setUp(self):
+        self.squad = SquadState("Mook", 6, 4, 10, 1, size=3)
+
+    def test_hitpoints(self):
+        self.assertEqual(self.squad.member_names,
+                         ("Mook 1", "Mook 2", "Mook 3"))
+        self.assertEqual((self.squad.hps, self.squad.base_hps), (30, 30))
+
+        self.squad.reduce_hitpoints(12)
+        self.squad.reduce_hitpoints(3)
+        self.assertEqual(list(self.squad.member_hps), [-2, 7, 10])
+        self.assertEqual(self.squad.hps, 17)
+        self.assertEqual(self.squad.standing(), [1, 2])
+
+        self.squad.increase_hitpoints(4)
+        self.assertEqual(list(self.squad.member_hps), [2, 7, 10])
+
+    def test_observers(self):
+        changes = []
+        self.squad.add_observer(
+            lambda state, attribute, old, new: changes.append(attribute))
+        self.squad.reduce_member_hitpoints(2)
+        self.assertEqual(changes, ["member_hps", "hps"])
+
+    def test_split(self):
+        self.squad.choose_stance(2)
+        self.squad.next_round(3)
+        self.squad.reduce_member_hitpoints(1, 4)
+
+        member = self.squad.split(1)
+        self.assertEqual(member.name, "Mook 2")
+        self.assertEqual((member.hps, member.base_hps), (6, 10))
+        self.assertEqual(member.order, self.squad.order)
+        self.assertEqual(member.current_defense(),
+                         self.squad.current_defense())
+        self.assertEqual(self.squad.size, 2)
+        self.assertEqual((self.squad.hps, self.squad.base_hps), (20, 20))
+
+    def test_form_squads(self):
+        states = [PCState("PC", 6, 4, 10, 1),
+                  NPCState("Bob", 6, 4, 10, 1),
+                  NPCState("Ronnie", 8, 3, 11, 1),
+                  NPCState("Alice", 6, 4, 10, 1)]
+        states[3].reduce_hitpoints(2)
+
+        squads = form_squads(states)
+        self.assertEqual(len(squads), 3)
+        self.assertTrue(squads[0] is states[0])
+        self.assertEqual(squads[1].member_names, ("Bob", "Alice"))
+        self.assertEqual(list(squads[1].member_hps), [10, 8])
+        self.assertEqual([member.hps for member in squads[1].expand()],
+                         [10, 8])
+
+
+if __name__ == '__main__':
+
+    for test_case in (TestCombatantState, TestSquadState):
+        suite = unittest.TestLoader().loadTestsFromTestCase(test_case)
+        unittest.TextTestRunner(verbosity=2).run(suite)
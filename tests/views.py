@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+import sys
+
+sys.path.insert(0, "../src")
+
+import unittest
+
+from PySide import QtCore, QtGui
+
+from views import NPC
+
+app = QtGui.QApplication.instance() or QtGui.QApplication(sys.argv)
+
+
+class TestChar(unittest.TestCase):
+    def setUp(self):
+        self.char = NPC("NPC", 3, 3, 8, 1)
+
+    def test_state(self):
+        self.assertEqual(self.char.state.name, "NPC")
+        self.assertEqual(self.char.base_initiative, 6)
+
+        self.char.next_round(4)
+        self.assertEqual(self.char.state.order, 10)
+
+    def test_labels(self):
+        self.char.reduce_hitpoints(2)
+        self.char.choose_stance(3)
+        self.char.next_round(1)
+        self.char.scheduler.flush()
+
+        self.assertEqual(self.char.hp_label.text(), "oooooo__")
+        self.assertEqual(self.char.def_label.text(), "5")
+        self.assertEqual(self.char.initiativeLabel.text(), "7")
+
+    def test_destroyed(self):
+        # only the views of dirty states are called, deleted views never
+        other = NPC("Other", 3, 3, 8, 1)
+        scheduler = self.char.scheduler
+        self.assertEqual(scheduler.callbacks[self.char.state],
+                         [self.char.on_flushed])
+
+        state = other.state
+        other.deleteLater()
+        QtCore.QCoreApplication.sendPostedEvents(None,
+                                                 QtCore.QEvent.DeferredDelete)
+        self.assertFalse(state in scheduler.callbacks)
+        state.reduce_hitpoints(1)
+        scheduler.flush()
+
+
+if __name__ == '__main__':
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestChar)
+    unittest.TextTestRunner(verbosity=2).run(suite)